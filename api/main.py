@@ -1,26 +1,203 @@
 # FastAPI app - health + chat endpoint
 
+import asyncio
+import base64
+import contextlib
+import functools
+import hashlib
+import json
 import logging
+import secrets
 from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 import config
-from api.schemas import ChatRequest, ChatResponse, HealthResponse
-from model.inference import RecipeInferenceEngine
+from api.schemas import (
+    BatchChatItem,
+    BatchChatRequest,
+    CacheStatsResponse,
+    CatalogDelta,
+    CatalogResponse,
+    ChatRequest,
+    ChatResponse,
+    HealthResponse,
+    RecipeMatch,
+    RecipeSearchResponse,
+    SessionResponse,
+)
+from dataset.loader import RecipeIndex, RecipeLoader
+from model import metrics
+from model.cache import ResponseCache
+from model.circuit import CLOSED, CircuitBreaker
+from model.inference import RecipeInferenceEngine, Suggestion
+from model.limiter import (
+    PRIORITIES,
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    InferenceBusyError,
+    InferenceLimiter,
+    priority_name,
+)
+from model.local_llm import local_client
+from model.pool import BackendPool
+from model.ratelimit import ClientRateLimiter
+from model.sessions import Session, SessionStore
 
 logger = logging.getLogger(__name__)
 
 engine: RecipeInferenceEngine | None = None
+# liveness is "the process answers"; readiness waits for the index and model warm-up
+ready = asyncio.Event()
+rate_limiter = ClientRateLimiter(config.RATE_LIMIT_PER_MINUTE, config.RATE_LIMIT_BURST)
+# rendered /recipes/search pages by ETag; the catalog version is part of the ETag, so nothing goes stale
+search_pages = ResponseCache(max_entries=config.SEARCH_CACHE_ENTRIES, ttl=0)
+
+
+def _build_cache() -> ResponseCache | None:
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+        ttl=config.RESPONSE_CACHE_TTL,
+        path=config.RESPONSE_CACHE_PATH or None,
+    )
+
+
+def _build_pool() -> BackendPool | None:
+    if config.LLM_BACKEND == "local":
+        factory = functools.partial(
+            local_client,
+            base_model=config.LOCAL_BASE_MODEL or None,
+            device=config.LOCAL_DEVICE,
+            max_batch=config.LOCAL_MAX_BATCH,
+            max_new_tokens=config.LOCAL_MAX_NEW_TOKENS,
+            temperature=config.LOCAL_TEMPERATURE,
+        )
+        return BackendPool([config.LOCAL_MODEL_PATH], client_factory=factory)
+    if config.LLM_BACKEND != "ollama":
+        raise ValueError(f"Unknown LLM_BACKEND {config.LLM_BACKEND!r} (expected ollama or local)")
+    if not config.OLLAMA_HOSTS:
+        return None
+    return BackendPool(
+        config.OLLAMA_HOSTS,
+        failure_threshold=config.OLLAMA_BACKEND_FAILURES,
+        eject_seconds=config.OLLAMA_EJECT_SECONDS,
+        model_affinity=config.OLLAMA_MODEL_AFFINITY,
+    )
+
+
+async def _probe_ollama(engine: RecipeInferenceEngine) -> None:
+    # only probes while the breaker is tripped, a host is ejected or a host's models are still
+    # unknown (model affinity), so healthy backends cost nothing
+    while True:
+        await asyncio.sleep(config.OLLAMA_PROBE_INTERVAL)
+        if engine.breaker.state == CLOSED and not engine.pool.needs_check():
+            continue
+        if await asyncio.to_thread(engine.probe):
+            logger.info("Ollama reachable again, circuit closed")
+
+
+async def _warm_up(engine: RecipeInferenceEngine) -> None:
+    try:
+        warmed = await asyncio.wait_for(
+            asyncio.to_thread(engine.warm_up), config.WARMUP_TIMEOUT
+        )
+        if not warmed:
+            logger.warning("Warm-up generation failed; serving dataset answers until Ollama is up")
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up did not finish within %ss", config.WARMUP_TIMEOUT)
+    except Exception:
+        logger.exception("Warm-up failed")
+    # ready either way: a cold or missing model still gets answers from the dataset
+    ready.set()
+
+
+async def _keep_warm(engine: RecipeInferenceEngine) -> None:
+    while True:
+        await asyncio.sleep(config.KEEP_ALIVE_PING_INTERVAL)
+        if engine.breaker.state == CLOSED:
+            await asyncio.to_thread(engine.keep_warm)
+
+
+async def _watch_catalog(engine: RecipeInferenceEngine) -> None:
+    while True:
+        await asyncio.sleep(config.DATASET_WATCH_INTERVAL)
+        try:
+            if not await asyncio.to_thread(engine.loader.is_stale):
+                continue
+            index = await asyncio.to_thread(engine.reload_catalog)
+            logger.info("Recipe catalog reloaded (version=%s, %d recipes)", index.version, len(index.recipes))
+        except Exception:
+            # a half-written or invalid file; keep serving the old catalog and try again next tick
+            logger.exception("Recipe catalog reload failed")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global engine
-    engine = RecipeInferenceEngine(model_name=config.OLLAMA_MODEL)
-    logger.info("Recipe inference engine ready (model=%s)", config.OLLAMA_MODEL)
+    engine = RecipeInferenceEngine(
+        model_name=config.LLM_MODEL,
+        recipe_loader=RecipeLoader(ranking=config.RANKING_MODE),
+        limiter=InferenceLimiter(
+            max_concurrency=config.INFERENCE_CONCURRENCY,
+            max_queue=config.INFERENCE_MAX_QUEUE,
+            queue_timeout=config.INFERENCE_QUEUE_TIMEOUT,
+        ),
+        cache=_build_cache(),
+        breaker=CircuitBreaker(
+            failure_threshold=config.OLLAMA_FAILURE_THRESHOLD,
+            reset_timeout=config.OLLAMA_RESET_TIMEOUT,
+        ),
+        deadline_ms=config.DEADLINE_MS,
+        complete_in_background=config.DEADLINE_COMPLETE_IN_BACKGROUND,
+        max_background=config.DEADLINE_MAX_BACKGROUND,
+        fuzzy_matching=config.FUZZY_MATCHING,
+        prompt_token_budget=config.PROMPT_TOKEN_BUDGET,
+        sessions=SessionStore(
+            max_sessions=config.SESSION_MAX_COUNT,
+            max_bytes=config.SESSION_MAX_BYTES,
+            ttl=config.SESSION_TTL,
+            max_turns=config.SESSION_MAX_TURNS,
+        ),
+        keep_alive=config.OLLAMA_KEEP_ALIVE or None,
+        pool=_build_pool(),
+    )
+    metrics.enable(config.METRICS_ENABLED)
+    metrics.QUEUE_WAITING.set_function(lambda: engine.limiter.waiting)
+    metrics.QUEUE_RUNNING.set_function(lambda: engine.limiter.running)
+    metrics.QUEUE_DEPTH.set_function(lambda: engine.limiter.depth())
+    ready.clear()
+    # the index is small enough to build before accepting connections; the model load is not
+    await asyncio.to_thread(engine.preload)
+    # model affinity routes on each host's model list, which only a health check fills in
+    await asyncio.to_thread(engine.pool.check)
+    logger.info("Recipe inference engine ready (model=%s)", config.LLM_MODEL)
+    tasks = [asyncio.create_task(_probe_ollama(engine))]
+    if config.WARMUP_ENABLED:
+        tasks.append(asyncio.create_task(_warm_up(engine)))
+    else:
+        ready.set()
+    if config.KEEP_ALIVE_PING_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_keep_warm(engine)))
+    if config.DATASET_WATCH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_watch_catalog(engine)))
     yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    ready.clear()
+    metrics.QUEUE_WAITING.set_function(None)
+    metrics.QUEUE_RUNNING.set_function(None)
+    metrics.QUEUE_DEPTH.set_function(None)
+    engine.close()
     engine = None
 
 
@@ -42,18 +219,345 @@ app.add_middleware(
 )
 
 
+def _sse(data: dict[str, Any], event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _busy(e: InferenceBusyError) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": e.retry_after_header},
+    )
+
+
+def _admit(http_request: Request, default: int, cost: int = 1) -> int:
+    """Apply the caller's rate limit and return its priority class."""
+    api_key = http_request.headers.get("x-api-key")
+    priority = PRIORITIES.get(config.API_KEY_PRIORITIES.get(api_key or "", ""))
+    if priority is None:
+        # unmapped callers may only lower their priority (higher number = later), never raise it
+        requested = PRIORITIES.get(http_request.headers.get("x-priority", "").lower(), default)
+        priority = max(default, requested)
+    client = f"key:{api_key}" if api_key else (http_request.client.host if http_request.client else "-")
+    try:
+        rate_limiter.check(client, cost)
+    except InferenceBusyError as e:
+        metrics.SHED.inc("rate_limited", priority_name(priority))
+        raise _busy(e) from e
+    return priority
+
+
+def _require_admin(token: str | None) -> None:
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if token is None or not secrets.compare_digest(token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def _session(session_id: str | None) -> Session | None:
+    if session_id is None:
+        return None
+    session = engine.sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return session
+
+
+def _batch_item(index: int, result: Suggestion | Exception) -> BatchChatItem:
+    if isinstance(result, Exception):
+        metrics.ERRORS.inc("batch_item")
+        return BatchChatItem(index=index, error=str(result) or type(result).__name__)
+    metrics.REQUESTS.inc(result.source)
+    return BatchChatItem(index=index, response=result.text, source=result.source)
+
+
+def _ingredient_list(values: list[str]) -> list[str]:
+    # repeated parameters and comma-separated values both work; sorted so equal queries look equal
+    items = {v.strip().lower() for value in values for v in value.split(",")}
+    return sorted(i for i in items if i)
+
+
+def _encode_cursor(version: str, score: float, name_rank: int, rid: int) -> str:
+    raw = json.dumps([version, score, name_rank, rid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, version: str) -> tuple[float, int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_version, score, name_rank, rid = json.loads(raw)
+        after = (float(score), int(name_rank), int(rid))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    if cursor_version != version:
+        # positions from another catalog would skip or repeat recipes
+        raise HTTPException(
+            status_code=410, detail="The catalog changed since this cursor was issued; search again"
+        )
+    return after
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _search_page(
+    index: RecipeIndex,
+    ingredients: list[str],
+    include: list[str],
+    exclude: list[str],
+    limit: int,
+    min_matches: int,
+    after: tuple[float, int, int] | None,
+) -> str:
+    hits, more = engine.search(ingredients, include, exclude, limit, min_matches, after, index)
+    next_cursor = None
+    if more:
+        rid, score, _ = hits[-1]
+        next_cursor = _encode_cursor(index.version, score, index.name_rank[rid], rid)
+    page = RecipeSearchResponse(
+        results=[
+            RecipeMatch(
+                name=index.recipes[rid].get("name", ""),
+                ingredients=index.recipes[rid].get("ingredients", []),
+                instructions=index.recipes[rid].get("instructions", ""),
+                score=score,
+                matched=matched,
+            )
+            for rid, score, matched in hits
+        ],
+        next_cursor=next_cursor,
+        version=index.version,
+    )
+    return page.model_dump_json()
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health() -> HealthResponse:
-    return HealthResponse(status="ok", model=config.OLLAMA_MODEL)
+    return HealthResponse(
+        status="ok",
+        ready=ready.is_set(),
+        model=config.LLM_MODEL,
+        ollama=engine.breaker.state if engine is not None else None,
+        backends=engine.pool.snapshot() if engine is not None and config.OLLAMA_HOSTS else None,
+    )
+
+
+@app.get("/ready", response_model=HealthResponse)
+async def readiness(response: Response) -> HealthResponse:
+    """503 until warm-up has finished, so a load balancer only sends traffic to warm instances."""
+    if not ready.is_set():
+        response.status_code = 503
+    return await health()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats() -> CacheStatsResponse:
+    if engine is None or engine.cache is None:
+        return CacheStatsResponse(enabled=False)
+    return CacheStatsResponse(enabled=True, **engine.cache.stats())
+
+
+@app.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session() -> SessionResponse:
+    """Start a conversation; follow-up turns only send the new message to the model."""
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    return SessionResponse(session_id=engine.sessions.create().id)
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> Response:
+    if engine is None or not engine.sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return Response(status_code=204)
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(request: ChatRequest, http_request: Request) -> ChatResponse:
     if engine is None:
         raise HTTPException(status_code=503, detail="Inference engine not ready")
+    priority = _admit(http_request, PRIORITY_INTERACTIVE)
+    session = _session(request.session_id)
     try:
-        response_text = engine.suggest_recipe(request.message)
-        return ChatResponse(response=response_text)
+        suggestion = await engine.suggest_async(
+            request.message, request.deadline_ms, session, priority
+        )
+        metrics.REQUESTS.inc(suggestion.source)
+        return ChatResponse(
+            response=suggestion.text,
+            source=suggestion.source,
+            session_id=request.session_id,
+        )
+    except InferenceBusyError as e:
+        raise _busy(e) from e
     except RuntimeError as e:
         logger.exception("Inference error")
         raise HTTPException(status_code=503, detail=str(e)) from e
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request) -> Response:
+    """Same as /chat but sends tokens as Server-Sent Events while they are generated."""
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    priority = _admit(http_request, PRIORITY_INTERACTIVE)
+    session = _session(request.session_id)
+    try:
+        tokens = await engine.stream_recipe_async(request.message, session, priority)
+    except InferenceBusyError as e:
+        raise _busy(e) from e
+    if await http_request.is_disconnected():
+        # gave up while queued for the slot; nobody will read the body
+        tokens.cancel()
+        return Response(status_code=499)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for token in tokens:
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected, cancelling generation")
+                    return
+                yield _sse({"token": token})
+            yield _sse({}, event="done")
+        except RuntimeError as e:
+            logger.exception("Inference error while streaming")
+            yield _sse({"detail": str(e)}, event="error")
+        finally:
+            tokens.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # also runs when the client leaves before events() is first iterated, so its finally never does
+        background=BackgroundTask(tokens.cancel),
+    )
+
+
+@app.post("/chat/batch", response_model=list[BatchChatItem])
+async def chat_batch(
+    request: BatchChatRequest, http_request: Request, stream: bool = False
+):
+    """Answer many chat requests at once; stream=true sends one NDJSON line per item, in order."""
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    if any(r.session_id for r in request.requests):
+        raise HTTPException(status_code=400, detail="Sessions are not supported in batches")
+    # each item costs a token, capped at the burst so a big batch is slowed rather than refused forever
+    priority = _admit(http_request, PRIORITY_BULK, cost=len(request.requests))
+    results = engine.suggest_batch_async(
+        [r.message for r in request.requests],
+        deadlines_ms=[r.deadline_ms for r in request.requests],
+        concurrency=config.BATCH_CONCURRENCY,
+        priority=priority,
+    )
+    if not stream:
+        return [_batch_item(i, result) async for i, result in results]
+
+    async def lines() -> AsyncIterator[str]:
+        try:
+            async for i, result in results:
+                yield _batch_item(i, result).model_dump_json() + "\n"
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/recipes/search", response_model=RecipeSearchResponse)
+async def search_recipes(
+    http_request: Request,
+    ingredients: list[str] = Query([], description="Ingredients to rank by (repeat the parameter or comma-separate)"),
+    include: list[str] = Query([], description="Every result must use all of these"),
+    exclude: list[str] = Query([], description="No result may use any of these"),
+    min_matches: int = Query(1, ge=1, le=50, description="Least number of ranking ingredients a result must use"),
+    limit: int = Query(20, ge=1, le=config.SEARCH_MAX_LIMIT),
+    cursor: str | None = Query(None, max_length=512, description="next_cursor of the previous page"),
+) -> Response:
+    """Ranked recipe matches straight from the index: no prompt, no model, cacheable by ETag."""
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    ingredients, include, exclude = (_ingredient_list(v) for v in (ingredients, include, exclude))
+    if not ingredients and not include:
+        raise HTTPException(status_code=400, detail="Give ingredients to rank by or include filters")
+    if len(ingredients) + len(include) + len(exclude) > 100:
+        raise HTTPException(status_code=400, detail="Too many ingredients (at most 100)")
+    # one catalog snapshot for the cursor, the ETag and the search, even if a reload swaps it meanwhile
+    index = engine.loader.index
+    after = _decode_cursor(cursor, index.version) if cursor else None
+    # same catalog + same normalized query = same page, so the ETag needs no search to compute
+    material = [
+        index.version,
+        engine.loader.ranking,
+        engine.fuzzy_matching,
+        ingredients,
+        include,
+        exclude,
+        min_matches,
+        limit,
+        cursor,
+    ]
+    etag = '"' + hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={config.SEARCH_MAX_AGE}"}
+    if _etag_matches(http_request.headers.get("if-none-match"), etag):
+        metrics.SEARCHES.inc("not_modified")
+        return Response(status_code=304, headers=headers)
+    body = search_pages.get(etag)
+    metrics.SEARCHES.inc("ok" if body is None else "cached")
+    if body is None:
+        # scoring a large catalog takes a while; off the event loop so other requests keep flowing
+        body = await asyncio.to_thread(
+            _search_page, index, ingredients, include, exclude, limit, min_matches, after
+        )
+        search_pages.set(etag, body)
+    # already serialized, so it goes out as is instead of through response_model validation again
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/admin/reload", response_model=CatalogResponse)
+async def reload_catalog(
+    x_admin_token: str | None = Header(None),
+) -> CatalogResponse:
+    """Re-read dataset/recipes.json, build the new index off the request path and swap it in."""
+    _require_admin(x_admin_token)
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    try:
+        index = await asyncio.to_thread(engine.reload_catalog)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Could not load recipes: {e}") from e
+    return CatalogResponse(version=index.version, recipes=len(index.recipes))
+
+
+@app.post("/admin/recipes", response_model=CatalogResponse)
+async def apply_catalog_delta(
+    delta: CatalogDelta,
+    persist: bool = False,
+    x_admin_token: str | None = Header(None),
+) -> CatalogResponse:
+    """Add/remove recipes without a full rebuild; persist=true also writes recipes.json."""
+    _require_admin(x_admin_token)
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Inference engine not ready")
+    index = await asyncio.to_thread(
+        engine.reload_catalog,
+        [r.model_dump() for r in delta.add],
+        delta.remove,
+        persist,
+    )
+    return CatalogResponse(version=index.version, recipes=len(index.recipes))
@@ -1,7 +1,11 @@
 # request/response shapes for the API
 
+from typing import Any
+
 from pydantic import BaseModel, Field
 
+import config
+
 
 class ChatRequest(BaseModel):
     message: str = Field(
@@ -10,12 +14,97 @@ class ChatRequest(BaseModel):
         min_length=1,
         max_length=2000,
     )
+    deadline_ms: int | None = Field(
+        None,
+        description="Answer from the dataset if the model takes longer than this (0 disables; default from DEADLINE_MS)",
+        ge=0,
+        le=600_000,
+    )
+    session_id: str | None = Field(
+        None,
+        description="Continue a conversation started with POST /sessions (not used by /chat/batch)",
+        max_length=64,
+    )
 
 
 class ChatResponse(BaseModel):
     response: str = Field(..., description="Recipe suggestion or reply")
+    source: str | None = Field(
+        None, description="What answered: llm, cache, fallback or deadline"
+    )
+    session_id: str | None = Field(None)
+
+
+class SessionResponse(BaseModel):
+    session_id: str = Field(..., description="Pass this as session_id on /chat for follow-up turns")
+
+
+class BatchChatRequest(BaseModel):
+    requests: list[ChatRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=config.BATCH_MAX_ITEMS,
+        description="Chat requests answered independently, results come back in the same order",
+    )
+
+
+class BatchChatItem(BaseModel):
+    index: int = Field(..., description="Position of the request in the batch")
+    response: str | None = Field(None)
+    source: str | None = Field(None)
+    error: str | None = Field(None, description="Set instead of response when this item failed")
 
 
 class HealthResponse(BaseModel):
     status: str = Field(...)
+    ready: bool = Field(False, description="Index loaded and model warm-up finished")
     model: str = Field(...)
+    ollama: str | None = Field(
+        None, description="Circuit breaker state: closed, open or half_open"
+    )
+    backends: list[dict[str, Any]] | None = Field(
+        None, description="Per-host routing state when OLLAMA_HOSTS lists several hosts"
+    )
+
+
+class CacheStatsResponse(BaseModel):
+    enabled: bool = Field(...)
+    entries: int = Field(0)
+    bytes: int = Field(0, description="Approximate size of cached responses")
+    hits: int = Field(0)
+    misses: int = Field(0)
+    evictions: int = Field(0)
+    hit_rate: float = Field(0.0)
+
+
+class Recipe(BaseModel):
+    name: str = Field(..., min_length=1)
+    ingredients: list[str] = Field(..., min_length=1)
+    instructions: str = Field("")
+
+
+class RecipeMatch(Recipe):
+    score: float = Field(
+        ..., description="Shared ingredient count, or the bm25 score with RANKING_MODE=bm25"
+    )
+    matched: int = Field(..., description="How many of the query ingredients the recipe uses")
+
+
+class RecipeSearchResponse(BaseModel):
+    results: list[RecipeMatch] = Field(..., description="Best match first")
+    next_cursor: str | None = Field(
+        None, description="Pass as cursor to get the next page; null on the last page"
+    )
+    version: str = Field(..., description="Catalog version the results come from")
+
+
+class CatalogDelta(BaseModel):
+    add: list[Recipe] = Field(
+        default_factory=list, description="New recipes; one with an existing name replaces it"
+    )
+    remove: list[str] = Field(default_factory=list, description="Names of recipes to drop")
+
+
+class CatalogResponse(BaseModel):
+    version: str = Field(..., description="Content hash of the catalog now being served")
+    recipes: int = Field(...)
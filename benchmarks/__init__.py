@@ -0,0 +1 @@
+# load test harness (api + stub ollama) and retrieval/prompt microbenchmarks
@@ -0,0 +1,180 @@
+# end-to-end load test: runs api.main:app against the stub ollama and reports latency percentiles
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.stub_ollama import StubSettings, start_stub
+from dataset.loader import load_recipes
+
+
+def percentile(values: list[float], pct: float) -> float:
+    # nearest-rank, good enough for benchmark reports
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[rank]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def _messages(n: int, seed: int) -> list[str]:
+    vocab = sorted({i for r in load_recipes() for i in r.get("ingredients", [])})
+    rng = random.Random(seed)
+    return [", ".join(rng.sample(vocab, rng.randint(1, 4))) for _ in range(n)]
+
+
+async def _one_chat(client: httpx.AsyncClient, message: str) -> dict:
+    started = time.perf_counter()
+    r = await client.post("/chat", json={"message": message})
+    return {"ok": r.status_code == 200, "status": r.status_code, "latency": time.perf_counter() - started}
+
+
+async def _one_stream(client: httpx.AsyncClient, message: str) -> dict:
+    started = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", "/chat/stream", json={"message": message}) as r:
+        if r.status_code != 200:
+            await r.aread()
+            return {"ok": False, "status": r.status_code, "latency": time.perf_counter() - started}
+        async for line in r.aiter_lines():
+            if ttft is None and line.startswith("data: ") and '"token"' in line:
+                ttft = time.perf_counter() - started
+    return {"ok": True, "status": 200, "latency": time.perf_counter() - started, "ttft": ttft}
+
+
+async def drive(
+    base_url: str, messages: list[str], concurrency: int, stream: bool
+) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for m in messages:
+        queue.put_nowait(m)
+    results: list[dict] = []
+    one = _one_stream if stream else _one_chat
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                message = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                results.append(await one(client, message))
+            except httpx.HTTPError as e:
+                results.append({"ok": False, "status": type(e).__name__, "latency": 0.0})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    report = {
+        "endpoint": "/chat/stream" if stream else "/chat",
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize([r["latency"] for r in ok]),
+    }
+    ttfts = [r["ttft"] for r in ok if r.get("ttft") is not None]
+    if ttfts:
+        report["ttft"] = summarize(ttfts)
+    statuses: dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    if statuses:
+        report["error_statuses"] = statuses
+    return report
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if httpx.get(base_url + "/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not become ready in time")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the recipe API against a stub Ollama")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="Hit /chat/stream and report TTFT")
+    parser.add_argument("--unique", type=int, default=0, help="Distinct messages (0 = every request unique)")
+    parser.add_argument("--prefill-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765, help="Port for the API under test")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    stub = start_stub(settings=StubSettings(args.prefill_ms, args.tokens_per_sec, args.completion_tokens))
+    env = dict(
+        os.environ,
+        OLLAMA_HOST=f"http://127.0.0.1:{stub.server_port}",
+        RESPONSE_CACHE_ENABLED="1" if args.cache else "0",
+        API_PORT=str(args.port),
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    try:
+        _wait_ready(base_url, proc)
+        pool = _messages(args.unique or args.requests, args.seed)
+        messages = [pool[i % len(pool)] for i in range(args.requests)]
+        report = asyncio.run(drive(base_url, messages, args.concurrency, args.stream))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        stub.shutdown()
+
+    report["stub"] = {
+        "prefill_ms": args.prefill_ms,
+        "tokens_per_sec": args.tokens_per_sec,
+        "completion_tokens": args.completion_tokens,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# microbenchmarks for retrieval, parsing and prompt building over synthetic catalogs
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dataset.fuzzy import FuzzyResolver
+from dataset.loader import RecipeLoader, load_recipes
+from model.inference import RecipeInferenceEngine
+from model.prompt_builder import build_recipe_prompt
+
+
+def synthetic_catalog(size: int, vocab_size: int = 5000, seed: int = 0) -> list[dict[str, Any]]:
+    """Recipes drawn from the real vocabulary plus synthetic ingredients, zipf-ish popularity."""
+    rng = random.Random(seed)
+    real = sorted({i for r in load_recipes() for i in r.get("ingredients", [])})
+    vocab = real + [f"ingredient {i}" for i in range(max(0, vocab_size - len(real)))]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    recipes = []
+    for i in range(size):
+        ingredients = list(dict.fromkeys(rng.choices(vocab, weights=weights, k=rng.randint(4, 12))))
+        recipes.append({
+            "name": f"Recipe {i:07d}",
+            "ingredients": ingredients,
+            "instructions": " ".join(rng.choice(vocab) for _ in range(rng.randint(20, 80))),
+        })
+    return recipes
+
+
+def synthetic_words(size: int, seed: int = 0) -> list[str]:
+    """Pronounceable made-up words, so trigram lists overlap the way real vocabularies do."""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"] + ["ch", "sh", "th", "st", "er", "an", "on", "in"]
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))))
+    return sorted(words)
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    # one random substitution, insertion or deletion
+    i = rng.randrange(len(word))
+    c = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return rng.choice([word[:i] + c + word[i + 1:], word[:i] + c + word[i:], word[:i] + word[i + 1:]])
+
+
+def _typos(words: list[str], n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [_typo(word, rng) for word in rng.sample(words, n)]
+
+
+def _queries(n: int, seed: int) -> list[str]:
+    # chat-style messages over the real vocabulary, some words misspelled so the resolver has work
+    rng = random.Random(seed)
+    vocab = sorted({i for r in load_recipes() for i in r.get("ingredients", [])})
+    messages = []
+    for _ in range(n):
+        picked = [
+            " ".join(_typo(w, rng) if len(w) > 4 and rng.random() < 0.2 else w for w in i.split())
+            for i in rng.sample(vocab, rng.randint(1, 5))
+        ]
+        messages.append("I have " + ", ".join(picked) + ". What can I make?")
+    return messages
+
+
+def bench(fn: Callable[[Any], Any], inputs: list[Any], min_time: float) -> dict[str, float]:
+    # repeats the input list until min_time has passed, reports per-call timings
+    samples: list[float] = []
+    started = time.perf_counter()
+    while not samples or time.perf_counter() - started < min_time:
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            samples.append(time.perf_counter() - t0)
+    samples.sort()
+    n = len(samples)
+    return {
+        "calls": n,
+        "mean_us": round(sum(samples) / n * 1e6, 2),
+        "p50_us": round(samples[n // 2] * 1e6, 2),
+        "p99_us": round(samples[min(n - 1, int(n * 0.99))] * 1e6, 2),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: list[int], queries: int, min_time: float, seed: int, fuzzy_vocab: int = 50000
+) -> dict[str, Any]:
+    messages = _queries(queries, seed)
+    report: dict[str, Any] = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "catalogs": [],
+    }
+    if fuzzy_vocab:
+        rng = random.Random(seed)
+        words = synthetic_words(fuzzy_vocab, seed)
+        resolver = FuzzyResolver((w, rng.randint(1, 100)) for w in words)
+        typos = [t for t in _typos(words, min(queries * 5, len(words)), seed) if t not in resolver.known]
+        # _resolve skips the memo, so every call pays for the candidate search
+        report["fuzzy_resolve"] = {"vocabulary": fuzzy_vocab, **bench(resolver._resolve, typos, min_time)}
+    for size in sizes:
+        recipes = synthetic_catalog(size, seed=seed)
+        loader = RecipeLoader(recipes)
+        t0 = time.perf_counter()
+        loader.index
+        build_s = time.perf_counter() - t0
+        # the engine's own parse path: phrase matcher and typo resolver over this catalog's vocabulary
+        engine = RecipeInferenceEngine(recipe_loader=loader)
+        t0 = time.perf_counter()
+        engine.preload()
+        preload_s = time.perf_counter() - t0
+        parsed = [engine._parse(m) for m in messages]
+        matches = [loader.find_by_ingredients(p) for p in parsed]
+        pairs = list(zip(messages, matches))
+        report["catalogs"].append({
+            "recipes": size,
+            "index_build_s": round(build_s, 3),
+            "preload_s": round(preload_s, 3),
+            "parse": bench(engine._parse, messages, min_time),
+            "find_by_ingredients": bench(loader.find_by_ingredients, parsed, min_time),
+            "build_recipe_prompt": bench(
+                lambda pair: build_recipe_prompt(pair[0], matching_recipes=pair[1]),
+                pairs,
+                min_time,
+            ),
+        })
+        engine.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retrieval/prompt microbenchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds per measurement")
+    parser.add_argument("--fuzzy-vocab", type=int, default=50000, help="Words in the typo-resolution case (0 = skip)")
+    parser.add_argument(
+        "--fuzzy-max-us", type=float, default=1000.0,
+        help="Fail if typo resolution's p99 goes above this many microseconds (0 = don't check)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the JSON report here as well")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run(sizes, args.queries, args.min_time, args.seed, args.fuzzy_vocab)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    fuzzy = report.get("fuzzy_resolve")
+    if fuzzy and args.fuzzy_max_us and fuzzy["p99_us"] > args.fuzzy_max_us:
+        sys.exit(f"fuzzy_resolve p99 {fuzzy['p99_us']}us is over the {args.fuzzy_max_us:g}us budget")
+
+
+if __name__ == "__main__":
+    main()
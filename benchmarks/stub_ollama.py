@@ -0,0 +1,164 @@
+# fake ollama server for benchmarks - speaks /api/chat with configurable latency and token rate
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "Try the Scrambled Eggs with Onion: dice the onion, melt butter, "
+    "cook gently and season with salt and pepper before serving warm."
+).split()
+
+
+class StubSettings:
+    def __init__(
+        self,
+        prefill_ms: float = 200.0,
+        tokens_per_sec: float = 50.0,
+        completion_tokens: int = 64,
+    ) -> None:
+        self.prefill_ms = prefill_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = StubSettings()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": "stub", "model": "stub"}]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-stub"})
+        else:
+            self._json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self._json({"error": "not found"}, status=404)
+            return
+        settings = self.settings
+        model = request.get("model", "stub")
+        if not request.get("messages"):
+            # like ollama: no messages just loads the model (and resets keep_alive)
+            self._json({
+                "model": model,
+                "created_at": _now(),
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "load",
+            })
+            return
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        n = settings.completion_tokens
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            n = min(n, num_predict)
+        interval = 1.0 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0.0
+        started = time.perf_counter_ns()
+        time.sleep(settings.prefill_ms / 1000)
+        prefill_ns = time.perf_counter_ns() - started
+        final = {
+            "model": model,
+            "created_at": _now(),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": prefill_ns,
+            "eval_count": n,
+        }
+        tokens = [WORDS[i % len(WORDS)] + " " for i in range(n)]
+
+        if request.get("stream", True) is False:
+            time.sleep(interval * n)
+            final["message"]["content"] = "".join(tokens)
+            final["eval_duration"] = int(interval * n * 1e9)
+            final["total_duration"] = time.perf_counter_ns() - started
+            self._json(final)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                chunk = {
+                    "model": model,
+                    "created_at": _now(),
+                    "message": {"role": "assistant", "content": token},
+                    "done": False,
+                }
+                self._chunk(json.dumps(chunk) + "\n")
+                time.sleep(interval)
+            final["eval_duration"] = int(interval * n * 1e9)
+            final["total_duration"] = time.perf_counter_ns() - started
+            self._chunk(json.dumps(final) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # client cancelled the generation
+            pass
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub(
+    host: str = "127.0.0.1", port: int = 0, settings: StubSettings | None = None
+) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; port=0 picks a free port (see server.server_port)."""
+    handler = type("StubHandler", (_Handler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--prefill-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    args = parser.parse_args()
+    server = start_stub(
+        args.host,
+        args.port,
+        StubSettings(args.prefill_ms, args.tokens_per_sec, args.completion_tokens),
+    )
+    print(f"Stub Ollama listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
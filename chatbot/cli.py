@@ -1,6 +1,7 @@
 # terminal chatbot - talks to the API, prints back
 
 import argparse
+import json
 import sys
 
 import httpx
@@ -8,9 +9,34 @@ import httpx
 import config
 
 
-def chat_loop(api_base_url: str, timeout: float = 60.0) -> None:
+def _stream_reply(client: httpx.Client, stream_url: str, message: str) -> None:
+    # prints tokens from the SSE stream as they arrive
+    with client.stream("POST", stream_url, json={"message": message}) as response:
+        if response.status_code >= 400:
+            response.read()
+            response.raise_for_status()
+        print("Bot: ", end="", flush=True)
+        event = "message"
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                payload = json.loads(line[len("data: "):])
+                if event == "error":
+                    print()
+                    raise RuntimeError(payload.get("detail", "generation failed"))
+                if event == "done":
+                    break
+                print(payload.get("token", ""), end="", flush=True)
+            elif not line:
+                event = "message"
+        print()
+
+
+def chat_loop(api_base_url: str, timeout: float = 60.0, stream: bool = True) -> None:
     health_url = api_base_url.rstrip("/") + "/health"
     chat_url = api_base_url.rstrip("/") + "/chat"
+    stream_url = api_base_url.rstrip("/") + "/chat/stream"
 
     print("Recipe Chatbot (CLI)")
     print("Enter ingredients or a recipe question (e.g. 'Egg, Onion'). Type 'quit' or 'exit' to stop.\n")
@@ -35,13 +61,16 @@ def chat_loop(api_base_url: str, timeout: float = 60.0) -> None:
                     break
 
                 try:
-                    response = client.post(
-                        chat_url,
-                        json={"message": user_input},
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                    print("Bot:", data.get("response", ""))
+                    if stream:
+                        _stream_reply(client, stream_url, user_input)
+                    else:
+                        response = client.post(
+                            chat_url,
+                            json={"message": user_input},
+                        )
+                        response.raise_for_status()
+                        data = response.json()
+                        print("Bot:", data.get("response", ""))
                 except httpx.HTTPStatusError as e:
                     print(f"Bot: [Error] API returned {e.response.status_code}: {e.response.text}", file=sys.stderr)
                 except Exception as e:
@@ -57,8 +86,9 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Recipe Chatbot CLI")
     parser.add_argument("--api-url", default=config.API_BASE_URL, help="API base URL")
     parser.add_argument("--timeout", type=float, default=60.0, help="Request timeout (seconds)")
+    parser.add_argument("--no-stream", action="store_true", help="Wait for the full reply instead of streaming tokens")
     args = parser.parse_args()
-    chat_loop(api_base_url=args.api_url, timeout=args.timeout)
+    chat_loop(api_base_url=args.api_url, timeout=args.timeout, stream=not args.no_stream)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,99 @@ import os
 
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:1b")
 
+# which model answers: "ollama", or "local" for the fine-tuned adapter (training/train.py output) run
+# in-process with transformers; concurrent requests share a batch, so keep INFERENCE_CONCURRENCY >= LOCAL_MAX_BATCH
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+LOCAL_MODEL_PATH = os.environ.get(
+    "LOCAL_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipe_model")
+)
+# base model under the adapter; empty = the one recorded in its adapter_config.json
+LOCAL_BASE_MODEL = os.environ.get("LOCAL_BASE_MODEL", "")
+LOCAL_DEVICE = os.environ.get("LOCAL_DEVICE", "cpu")
+LOCAL_MAX_BATCH = int(os.environ.get("LOCAL_MAX_BATCH", "4"))
+LOCAL_MAX_NEW_TOKENS = int(os.environ.get("LOCAL_MAX_NEW_TOKENS", "256"))
+LOCAL_TEMPERATURE = float(os.environ.get("LOCAL_TEMPERATURE", "0.7"))
+# name used in cache keys and /health, so answers from the two backends are never mixed up
+LLM_MODEL = OLLAMA_MODEL if LLM_BACKEND == "ollama" else f"local:{LOCAL_MODEL_PATH}"
+
+# recipe ranking: "overlap" (shared ingredient count) or "bm25" (idf-weighted, needs numpy + scipy)
+RANKING_MODE = os.environ.get("RANKING_MODE", "overlap")
+FUZZY_MATCHING = os.environ.get("FUZZY_MATCHING", "1") == "1"
+# approximate prompt cap in tokens; off by default so upgrades keep sending every matched recipe
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "0"))
+
+# how many generations run at once, and how long extra requests may queue for a slot
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", "2"))
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "32"))
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "10"))
+# priority classes: X-API-Key values mapped to "interactive" or "bulk" ("key1:bulk,key2:interactive");
+# without a known key the X-Priority header decides, else /chat is interactive and /chat/batch bulk
+API_KEY_PRIORITIES = dict(
+    item.strip().split(":", 1)
+    for item in os.environ.get("API_KEY_PRIORITIES", "").split(",")
+    if ":" in item
+)
+# per-client token bucket (client = API key, else IP); 0 turns rate limiting off
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "10"))
+
+# /chat/batch: items per request and how many of them generate at once
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "2"))
+
+# circuit breaker: after this many failures skip ollama and answer from the dataset
+OLLAMA_FAILURE_THRESHOLD = int(os.environ.get("OLLAMA_FAILURE_THRESHOLD", "3"))
+OLLAMA_RESET_TIMEOUT = float(os.environ.get("OLLAMA_RESET_TIMEOUT", "15"))
+OLLAMA_PROBE_INTERVAL = float(os.environ.get("OLLAMA_PROBE_INTERVAL", "5"))
+
+# several ollama hosts, comma separated (empty = the single OLLAMA_HOST default)
+OLLAMA_HOSTS = [h.strip() for h in os.environ.get("OLLAMA_HOSTS", "").split(",") if h.strip()]
+# a host is taken out of rotation for OLLAMA_EJECT_SECONDS after this many failures in a row
+OLLAMA_BACKEND_FAILURES = int(os.environ.get("OLLAMA_BACKEND_FAILURES", "2"))
+OLLAMA_EJECT_SECONDS = float(os.environ.get("OLLAMA_EJECT_SECONDS", "10"))
+# only route to hosts whose model list includes OLLAMA_MODEL
+OLLAMA_MODEL_AFFINITY = os.environ.get("OLLAMA_MODEL_AFFINITY", "0") == "1"
+
+# latency budget for /chat: past this many ms answer from the dataset (0 = no deadline)
+DEADLINE_MS = int(os.environ.get("DEADLINE_MS", "0"))
+# keep generating after the deadline so the answer lands in the response cache
+DEADLINE_COMPLETE_IN_BACKGROUND = os.environ.get("DEADLINE_COMPLETE_IN_BACKGROUND", "1") == "1"
+# at most this many of those at once; later ones are cancelled at the deadline
+DEADLINE_MAX_BACKGROUND = int(os.environ.get("DEADLINE_MAX_BACKGROUND", str(INFERENCE_CONCURRENCY)))
+
+# per-stage latency histograms and counters on /metrics; off makes instrumentation a no-op
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# response cache; set RESPONSE_CACHE_PATH to a .sqlite file to keep it across restarts
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", "")
+
+# multi-turn sessions (POST /sessions); history is resent unchanged so ollama can reuse its prefix cache
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", "1000"))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "1800"))
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", "20"))
+# how long ollama keeps the model loaded after a request ("" = ollama's default)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# load the model at startup (/ready answers 503 until then) and ping it every N seconds (0 = no ping)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "120"))
+KEEP_ALIVE_PING_INTERVAL = float(os.environ.get("KEEP_ALIVE_PING_INTERVAL", "300"))
+
+# /recipes/search: largest page size, and how long clients/CDNs may reuse a page (its ETag is the real check)
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+SEARCH_MAX_AGE = int(os.environ.get("SEARCH_MAX_AGE", "60"))
+# rendered search pages kept in memory, so a repeated query skips the search and serialization
+SEARCH_CACHE_ENTRIES = int(os.environ.get("SEARCH_CACHE_ENTRIES", "4096"))
+
+# admin endpoints (/admin/...) need this in X-Admin-Token; empty disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# reload the catalog when dataset/recipes.json changes, checked every N seconds (0 = only on demand)
+DATASET_WATCH_INTERVAL = float(os.environ.get("DATASET_WATCH_INTERVAL", "0"))
+
 API_HOST = os.environ.get("API_HOST", "127.0.0.1")
 API_PORT = int(os.environ.get("API_PORT", "8000"))
 
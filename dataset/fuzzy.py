@@ -0,0 +1,155 @@
+# typo-tolerant ingredient lookup: trigram candidates + bounded edit distance, memoized
+
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Iterable
+
+# chat filler that would otherwise get "corrected" into some ingredient
+STOPWORDS = frozenset("""
+about also any anything been breakfast can could cook cooking dinner dish easy for from fridge
+give got have having help idea ideas just left leftover like lunch make making meal might need
+only please quick recipe recipes some something suggest that the then there these this tonight
+use using want what which with without would your
+""".split())
+
+
+def _trigrams(word: str) -> list[str]:
+    padded = f"##{word}#"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def max_edits(word: str) -> int:
+    n = len(word)
+    if n < 4:
+        return 0
+    return 1 if n < 8 else 2
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (transpositions count as one), or limit + 1 if above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if limit <= 2:
+        # all the resolver needs; string compares instead of filling the table
+        return _few_edits(a, b, limit)
+    prev2: list[int] | None = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                value = min(value, prev2[j - 2] + 1)
+            cur[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+def _few_edits(a: str, b: str, limit: int) -> int:
+    # past the shared prefix, the first mismatch takes one of the four edits; the rest recurses
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    if i == len(a) and i == len(b):
+        return 0
+    if limit == 0:
+        return 1
+    rests = [(a[i + 1:], b[i + 1:]), (a[i + 1:], b[i:]), (a[i:], b[i + 1:])]
+    if i + 1 < n and a[i] == b[i + 1] and a[i + 1] == b[i]:
+        rests.append((a[i + 2:], b[i + 2:]))
+    best = limit + 1
+    for x, y in rests:
+        # only a strictly better rest is worth looking for
+        rest_limit = best - 2
+        if rest_limit < 0:
+            break
+        if abs(len(x) - len(y)) <= rest_limit:
+            best = min(best, 1 + _few_edits(x, y, rest_limit))
+    return best
+
+
+class FuzzyResolver:
+    """Maps an unknown token to the closest vocabulary word within a small edit distance."""
+
+    def __init__(
+        self, words: Iterable[tuple[str, int]], cache_size: int = 65536
+    ) -> None:
+        # words are (word, weight) pairs; weight (e.g. document frequency) breaks distance ties
+        self.words: list[str] = []
+        self.weights: list[int] = []
+        seen: dict[str, int] = {}
+        for word, weight in words:
+            wid = seen.get(word)
+            if wid is None:
+                seen[word] = len(self.words)
+                self.words.append(word)
+                self.weights.append(weight)
+            else:
+                self.weights[wid] += weight
+        self.known = frozenset(self.words)
+        # trigram -> word length -> ascending word ids, so only plausible lengths are scanned
+        self._grams: dict[str, dict[int, list[int]]] = {}
+        for wid, word in enumerate(self.words):
+            for gram in set(_trigrams(word)):
+                self._grams.setdefault(gram, {}).setdefault(len(word), []).append(wid)
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, token: str) -> str:
+        if token in self.known or token in STOPWORDS or not token.isalpha():
+            return token
+        limit = max_edits(token)
+        if limit == 0:
+            return token
+        # an adjacent swap ("onoin") is one edit but breaks up to 4 trigrams; check those directly
+        for i in range(len(token) - 1):
+            swapped = token[:i] + token[i + 1] + token[i] + token[i + 2:]
+            if swapped in self.known:
+                return swapped
+        grams = set(_trigrams(token))
+        by_len = [self._grams[gram] for gram in grams if gram in self._grams]
+        best: tuple[int, int, str] | None = None
+        # nearest lengths first; once a match is found only words at least as close can win,
+        # which tightens the trigram bound for the rest
+        size = len(token)
+        for n in sorted(range(size - limit, size + limit + 1), key=lambda n: abs(n - size)):
+            if abs(n - size) > limit:
+                continue
+            # q-gram lemma: each insert/delete/substitution breaks at most 3 padded trigrams
+            need = max(size, n) + 1 - 3 * limit
+            lists = sorted((ids for ids in (g.get(n) for g in by_len) if ids), key=len)
+            # a word missing from the rarest len(lists) - need + 1 lists can't share need grams,
+            # so only words from those become candidates; the common lists just add to their
+            # counts, via set intersection rather than a Python loop per word
+            prefix = len(lists) - max(need, 1) + 1
+            shared = Counter(chain.from_iterable(lists[:prefix]))
+            seen = set(shared)
+            for ids in lists[prefix:]:
+                shared.update(seen.intersection(ids))
+            for wid, count in shared.items():
+                if count < need:
+                    continue
+                word = self.words[wid]
+                d = bounded_distance(token, word, limit)
+                if d > limit:
+                    continue
+                key = (d, -self.weights[wid], word)
+                if best is None or key < best:
+                    best = key
+                    limit = d
+        return best[2] if best is not None else token
+
+    def resolve_all(self, tokens: list[str]) -> list[str]:
+        return [self.resolve(t) for t in tokens]
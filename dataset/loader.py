@@ -1,14 +1,29 @@
 # load recipes and search by ingredients
 
+import hashlib
+import heapq
 import json
+import os
+from collections import Counter
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Sequence
+
+from dataset.fuzzy import FuzzyResolver
+from dataset.matcher import IngredientMatcher
 
 
 def _get_recipes_path() -> Path:
     return Path(__file__).resolve().parent / "recipes.json"
 
 
+def catalog_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
 def load_recipes() -> list[dict[str, Any]]:
     path = _get_recipes_path()
     with open(path, encoding="utf-8") as f:
@@ -30,6 +45,11 @@ def _expand_for_match(ingredient: str) -> set[str]:
     return out
 
 
+def canonical_ingredients(ingredients: list[str]) -> tuple[str, ...]:
+    # order/case/plural-insensitive form of an ingredient list, for cache keys
+    return tuple(sorted({"|".join(sorted(_expand_for_match(i))) for i in ingredients}))
+
+
 def _ingredients_match(recipe_ingredients: list[str], user_ingredients: list[str]) -> tuple[bool, int]:
     recipe_set = {_normalize(i) for i in recipe_ingredients}
     user_expanded = set()
@@ -39,37 +59,385 @@ def _ingredients_match(recipe_ingredients: list[str], user_ingredients: list[str
     return len(overlap) > 0, len(overlap)
 
 
+def _match_keys(term: str) -> set[str]:
+    # every normalized user ingredient whose expansion contains this recipe term
+    candidates = {term, term + "s"}
+    if term.endswith("s"):
+        candidates.add(term[:-1])
+    return {k for k in candidates if term in _expand_for_match(k)}
+
+
+class RecipeIndex:
+    """Ingredient -> recipe id posting lists, built once per recipe list."""
+
+    def __init__(
+        self,
+        recipes: Sequence[dict[str, Any]],
+        terms: Sequence[str] | None = None,
+        postings: Sequence[Sequence[int]] | None = None,
+        name_rank: Sequence[int] | None = None,
+        recipe_terms: Sequence[Sequence[int]] | None = None,
+        version: str | None = None,
+        buffer: Any = None,
+    ) -> None:
+        # the prebuilt parts come from a compiled store (see dataset.store); buffer keeps its mmap alive
+        self.recipes = recipes
+        self._version = version
+        self._buffer = buffer
+        self._matcher: IngredientMatcher | None = None
+        self._ranker = None
+        self._fuzzy: FuzzyResolver | None = None
+        # (size, mtime_ns) of recipes.json this index was read from; None if it didn't come from disk
+        self.source_signature: tuple[int, int] | None = None
+        if postings is None:
+            terms, postings, recipe_terms = self._build_postings(recipes)
+        if name_rank is None:
+            name_rank = self._build_name_rank(recipes)
+        self.terms = terms
+        self.postings = postings
+        # interned term ids of each recipe's ingredients
+        self.recipe_terms = recipe_terms
+        # position of each recipe in (name, id) order, so ties compare ints not strings
+        self.name_rank = name_rank
+        self.term_ids: dict[str, int] = {term: tid for tid, term in enumerate(terms)}
+        # singular/plural variants resolved here so queries are plain dict lookups
+        self.variants: dict[str, list[int]] = {}
+        for term, tid in self.term_ids.items():
+            for key in _match_keys(term):
+                self.variants.setdefault(key, []).append(tid)
+
+    @staticmethod
+    def _build_postings(
+        recipes: Sequence[dict[str, Any]],
+    ) -> tuple[list[str], list[list[int]], list[list[int]]]:
+        term_ids: dict[str, int] = {}
+        postings: list[list[int]] = []
+        recipe_terms: list[list[int]] = []
+        for rid, recipe in enumerate(recipes):
+            tids = []
+            for term in {_normalize(i) for i in recipe.get("ingredients", [])}:
+                tid = term_ids.get(term)
+                if tid is None:
+                    tid = term_ids[term] = len(postings)
+                    postings.append([])
+                postings[tid].append(rid)
+                tids.append(tid)
+            recipe_terms.append(sorted(tids))
+        return list(term_ids), postings, recipe_terms
+
+    def with_changes(
+        self, add: Sequence[dict[str, Any]] = (), remove: Iterable[str] = ()
+    ) -> "RecipeIndex":
+        """New index with recipes removed by name and others appended; unchanged ones aren't re-tokenized."""
+        # a recipe added under an existing name replaces it
+        removed = set(remove) | {r.get("name", "") for r in add}
+        keep = [rid for rid, r in enumerate(self.recipes) if r.get("name", "") not in removed]
+        remap = [-1] * len(self.recipes)
+        for new_rid, rid in enumerate(keep):
+            remap[rid] = new_rid
+        recipes = [self.recipes[rid] for rid in keep] + list(add)
+        # remap keeps posting lists sorted since kept ids keep their order
+        postings = [[remap[rid] for rid in posting if remap[rid] >= 0] for posting in self.postings]
+        recipe_terms = [list(self.recipe_terms[rid]) for rid in keep]
+        term_ids = dict(self.term_ids)
+        terms = list(self.terms)
+        for rid, recipe in enumerate(add, start=len(keep)):
+            tids = []
+            for term in {_normalize(i) for i in recipe.get("ingredients", [])}:
+                tid = term_ids.get(term)
+                if tid is None:
+                    tid = term_ids[term] = len(terms)
+                    terms.append(term)
+                    postings.append([])
+                postings[tid].append(rid)
+                tids.append(tid)
+            recipe_terms.append(sorted(tids))
+        # drop terms no recipe uses anymore so they stop matching (and stop being typo targets)
+        live = [tid for tid, posting in enumerate(postings) if posting]
+        if len(live) < len(postings):
+            renumber = {tid: new_tid for new_tid, tid in enumerate(live)}
+            terms = [terms[tid] for tid in live]
+            postings = [postings[tid] for tid in live]
+            recipe_terms = [sorted(renumber[tid] for tid in tids) for tids in recipe_terms]
+        return RecipeIndex(recipes, terms, postings, recipe_terms=recipe_terms)
+
+    @staticmethod
+    def _build_name_rank(recipes: Sequence[dict[str, Any]]) -> list[int]:
+        order = sorted(range(len(recipes)), key=lambda rid: (recipes[rid].get("name", ""), rid))
+        rank = [0] * len(order)
+        for position, rid in enumerate(order):
+            rank[rid] = position
+        return rank
+
+    @property
+    def mapped(self) -> bool:
+        """True if backed by a memory-mapped compiled store."""
+        return self._buffer is not None
+
+    @property
+    def matcher(self) -> IngredientMatcher:
+        # built from the same variant keys as the index, so plural forms match too
+        if self._matcher is None:
+            self._matcher = IngredientMatcher(self.variants)
+        return self._matcher
+
+    @property
+    def ranker(self):
+        """WeightedRanker over this index, built on first use (needs numpy + scipy)."""
+        if self._ranker is None:
+            from dataset.ranking import WeightedRanker
+
+            self._ranker = WeightedRanker(self)
+        return self._ranker
+
+    @property
+    def fuzzy(self) -> FuzzyResolver:
+        # vocabulary is every word of each term and its singular/plural, weighted by how many
+        # recipes use it; _match_keys also yields forms like "eggss" that are no typo target
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyResolver(
+                (word, len(self.postings[tid]))
+                for term, tid in self.term_ids.items()
+                for key in _expand_for_match(term)
+                for word in key.split()
+            )
+        return self._fuzzy
+
+    @property
+    def version(self) -> str:
+        # content hash of the catalog; changes whenever the recipes do
+        if self._version is None:
+            payload = json.dumps(self.recipes, sort_keys=True, ensure_ascii=False)
+            self._version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+        return self._version
+
+    def lookup(self, ingredients: list[str]) -> set[int]:
+        tids: set[int] = set()
+        for ingredient in ingredients:
+            tids.update(self.variants.get(_normalize(ingredient), ()))
+        return tids
+
+    def score(self, ingredients: list[str]) -> Counter:
+        counts: Counter = Counter()
+        for tid in self.lookup(ingredients):
+            counts.update(self.postings[tid])
+        return counts
+
+    def containing(self, ingredient: str) -> set[int]:
+        """Ids of recipes that use the ingredient (any singular/plural form)."""
+        rids: set[int] = set()
+        for tid in self.lookup([ingredient]):
+            rids.update(self.postings[tid])
+        return rids
+
+    def score_many(self, queries: list[list[str]]) -> list[Counter]:
+        # group queries by term so each posting list is walked once for the whole batch
+        by_term: dict[int, list[int]] = {}
+        for qi, ingredients in enumerate(queries):
+            for tid in self.lookup(ingredients):
+                by_term.setdefault(tid, []).append(qi)
+        counts = [Counter() for _ in queries]
+        for tid, query_ids in by_term.items():
+            posting = self.postings[tid]
+            for qi in query_ids:
+                counts[qi].update(posting)
+        return counts
+
+    def top_k(
+        self, counts: Counter, max_results: int, min_matches: int = 1
+    ) -> list[tuple[int, int]]:
+        # (-count, name rank) keeps the old stable sort order on ties
+        name_rank = self.name_rank
+        best = heapq.nsmallest(
+            max_results,
+            (
+                (-count, name_rank[rid], rid)
+                for rid, count in counts.items()
+                if count >= min_matches
+            ),
+        )
+        return [(rid, -neg) for neg, _, rid in best]
+
+
+RANKING_MODES = ("overlap", "bm25")
+
+
 class RecipeLoader:
-    def __init__(self) -> None:
-        self._recipes: list[dict[str, Any]] | None = None
+    def __init__(
+        self,
+        recipes: list[dict[str, Any]] | None = None,
+        store_path: Path | None = None,
+        ranking: str = "overlap",
+    ) -> None:
+        # recipes=None loads on first use: the compiled store if it is fresh, else recipes.json
+        self._recipes: Sequence[dict[str, Any]] | None = recipes
+        self._index: RecipeIndex | None = None
+        self.store_path = store_path
+        if ranking not in RANKING_MODES:
+            raise ValueError(f"Unknown ranking mode {ranking!r}, expected one of {RANKING_MODES}")
+        # "overlap" counts shared ingredients; "bm25" weights rare ones higher (dataset.ranking)
+        self.ranking = ranking
+
+    def _load(self) -> RecipeIndex:
+        if self._recipes is not None:
+            return RecipeIndex(self._recipes)
+        return self.build()
+
+    def build(self) -> RecipeIndex:
+        """Fresh index from disk (compiled store if fresh, else recipes.json); doesn't replace the current one."""
+        from dataset.store import _get_store_path, is_fresh, open_store
+
+        source = _get_recipes_path()
+        signature = catalog_signature(source)
+        store_path = self.store_path or _get_store_path()
+        if is_fresh(store_path, source):
+            index = open_store(store_path)
+        else:
+            index = RecipeIndex(load_recipes())
+        index.source_signature = signature
+        return index
+
+    def build_delta(
+        self, add: Sequence[dict[str, Any]] = (), remove: Iterable[str] = ()
+    ) -> RecipeIndex:
+        base = self.index
+        index = base.with_changes(add, remove)
+        if base.mapped:
+            # recompiled so a store-backed catalog stays on shared mmap pages instead of in the heap
+            from dataset.store import _get_store_path, compile_store, delta_store_path, open_store
+
+            path = delta_store_path(self.store_path or _get_store_path())
+            index = open_store(compile_store(index.recipes, path, index=index))
+        # still describes the file on disk, which a delta doesn't touch
+        index.source_signature = base.source_signature
+        return index
+
+    def swap(self, index: RecipeIndex) -> RecipeIndex:
+        """Make index current and return the old one; queries already running keep the one they started with."""
+        old = self.index
+        self._index = index
+        self._recipes = index.recipes
+        return old
+
+    def save(self, path: Path | None = None) -> None:
+        """Write the current catalog as JSON (atomically) and remember it as the loaded source."""
+        path = path or _get_recipes_path()
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(list(self.recipes), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, path)
+        if path == _get_recipes_path():
+            self.index.source_signature = catalog_signature(path)
+
+    def is_stale(self) -> bool:
+        """True if recipes.json changed since the current index was read from it."""
+        index = self.index
+        if index.source_signature is None:
+            return False
+        return catalog_signature(_get_recipes_path()) != index.source_signature
 
     @property
-    def recipes(self) -> list[dict[str, Any]]:
-        if self._recipes is None:
-            self._recipes = load_recipes()
-        return self._recipes
+    def recipes(self) -> Sequence[dict[str, Any]]:
+        return self.index.recipes
+
+    @property
+    def index(self) -> RecipeIndex:
+        if self._index is None:
+            self._index = self._load()
+            self._recipes = self._index.recipes
+        return self._index
+
+    @property
+    def version(self) -> str:
+        return self.index.version
 
     def find_by_ingredients(
         self,
         ingredients: list[str],
         max_results: int = 5,
         min_matches: int = 1,
+        index: RecipeIndex | None = None,
     ) -> list[dict[str, Any]]:
         # returns recipes that have at least one of the ingredients, sorted by match count
         if not ingredients:
             return []
+        index = index or self.index
+        if self.ranking == "bm25":
+            return [
+                index.recipes[rid]
+                for rid, _ in index.ranker.rank(ingredients, max_results, min_matches)
+            ]
+        counts = index.score(ingredients)
+        return [
+            index.recipes[rid]
+            for rid, _ in index.top_k(counts, max_results, max(min_matches, 1))
+        ]
 
-        scored: list[tuple[int, dict[str, Any]]] = []
-        for recipe in self.recipes:
-            has_match, count = _ingredients_match(
-                recipe.get("ingredients", []),
-                ingredients,
-            )
-            if has_match and count >= min_matches:
-                scored.append((count, recipe))
+    def find_by_ingredients_many(
+        self,
+        queries: list[list[str]],
+        max_results: int = 5,
+        min_matches: int = 1,
+        index: RecipeIndex | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """find_by_ingredients for many ingredient lists in one pass over the index."""
+        index = index or self.index
+        if self.ranking == "bm25":
+            ranked = index.ranker.rank_many(queries, max_results, min_matches)
+            return [[index.recipes[rid] for rid, _ in hits] for hits in ranked]
+        results = []
+        for ingredients, counts in zip(queries, index.score_many(queries)):
+            if not ingredients:
+                results.append([])
+                continue
+            results.append([
+                index.recipes[rid]
+                for rid, _ in index.top_k(counts, max_results, max(min_matches, 1))
+            ])
+        return results
+
+    def search(
+        self,
+        ingredients: list[str],
+        include: list[str] = (),
+        exclude: list[str] = (),
+        limit: int = 20,
+        min_matches: int = 1,
+        after: tuple[float, int, int] | None = None,
+        index: RecipeIndex | None = None,
+    ) -> tuple[list[tuple[int, float, int]], bool]:
+        """One page of (recipe id, score, matched ingredients), best first, and whether more follow.
 
-        scored.sort(key=lambda x: (-x[0], x[1]["name"]))
-        return [r for _, r in scored[:max_results]]
+        Every include ingredient must be in a result and no exclude one; after is the
+        (score, name rank, id) of the last hit of the previous page. Ids refer to index
+        (default: the current one), so pass the same index to resolve them.
+        """
+        index = index or self.index
+        counts = index.score(ingredients) if ingredients else Counter()
+        if self.ranking == "bm25" and ingredients:
+            scores = dict(index.ranker.rank(ingredients, len(index.recipes), min_matches))
+        else:
+            scores = {rid: count for rid, count in counts.items() if count >= min_matches}
+        if include:
+            required = set.intersection(*(index.containing(i) for i in include))
+            # include alone (no ingredients to rank by) lists every recipe that has them, by name
+            scores = (
+                {rid: score for rid, score in scores.items() if rid in required}
+                if ingredients
+                else dict.fromkeys(required, 0)
+            )
+        for ingredient in exclude:
+            for rid in index.containing(ingredient):
+                scores.pop(rid, None)
+        name_rank = index.name_rank
+        keys = ((-score, name_rank[rid], rid) for rid, score in scores.items())
+        if after is not None:
+            last = (-after[0], after[1], after[2])
+            keys = (key for key in keys if key > last)
+        page = heapq.nsmallest(limit + 1, keys)
+        hits = [(rid, -neg, counts.get(rid, 0)) for neg, _, rid in page[:limit]]
+        return hits, len(page) > limit
 
     def get_all(self) -> list[dict[str, Any]]:
         return list(self.recipes)
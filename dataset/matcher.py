@@ -0,0 +1,51 @@
+# phrase-aware ingredient matching: token trie over the catalog vocabulary, longest match wins
+
+from typing import Iterable
+
+_END = ""  # marks a complete phrase; real tokens are never empty
+
+
+class IngredientMatcher:
+    """Finds known (possibly multi-word) ingredients in a token list in one left-to-right pass."""
+
+    def __init__(self, phrases: Iterable[str]) -> None:
+        self._root: dict = {}
+        self.size = 0
+        for phrase in phrases:
+            tokens = phrase.split()
+            if not tokens:
+                continue
+            node = self._root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            if _END not in node:
+                self.size += 1
+            # store the phrase as indexed so lookups hit the same key
+            node[_END] = phrase
+
+    def __contains__(self, token: str) -> bool:
+        node = self._root.get(token)
+        return node is not None and _END in node
+
+    def scan(self, tokens: list[str]) -> list[str]:
+        out: list[str] = []
+        i, n = 0, len(tokens)
+        while i < n:
+            node = self._root
+            best: str | None = None
+            best_end = i
+            j = i
+            while j < n:
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if _END in node:
+                    best, best_end = node[_END], j
+            if best is None:
+                out.append(tokens[i])
+                i += 1
+            else:
+                out.append(best)
+                i = best_end
+        return out
@@ -1,8 +1,22 @@
-# turns recipes.json into training_data.jsonl for fine-tuning (instruction -> recipe output)
+# turns recipes.json into training_data.jsonl for fine-tuning (instruction -> recipe output);
+# streams recipes through a process pool so memory stays bounded however many examples come out
 
+import gzip
+import hashlib
+import itertools
 import json
+import random
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import IO, Any, Iterable, Iterator
+
+# recipes handed to a worker at a time
+BATCH_SIZE = 256
+_READ_CHUNK = 1 << 16
+# whitespace and separators between records
+_SKIP = re.compile(r"[\s,]*")
 
 
 def _get_recipes_path() -> Path:
@@ -13,6 +27,34 @@ def _get_output_path() -> Path:
     return Path(__file__).resolve().parent / "training_data.jsonl"
 
 
+def iter_recipes(path: Path) -> Iterator[dict[str, Any]]:
+    """Recipes one at a time from a JSON array or a JSONL file, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = f.read(_READ_CHUNK)
+        pos = _SKIP.match(buf).end()
+        in_array = buf.startswith("[", pos)
+        if in_array:
+            pos += 1
+        while True:
+            # decode in place; the consumed prefix is only dropped when the buffer is refilled
+            pos = _SKIP.match(buf, pos).end()
+            if in_array and buf.startswith("]", pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    if pos < len(buf):
+                        raise ValueError(f"Truncated recipe file: {path}")
+                    return
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+
 def _format_recipe_response(recipe: dict[str, Any]) -> str:
     name = recipe.get("name", "Unknown")
     ingredients = recipe.get("ingredients", [])
@@ -30,56 +72,262 @@ def _instruction_for_ingredients(ingredients: list[str]) -> str:
     return "I have " + ", ".join(ingredients) + ". Suggest a recipe I can make."
 
 
-def build_training_examples(recipes: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    examples = []
-    for recipe in recipes:
-        ingredients = recipe.get("ingredients", [])
-        output = _format_recipe_response(recipe)
-        instruction = _instruction_for_ingredients(ingredients)
-        examples.append({
-            "instruction": instruction,
+def _ingredient_variants(ingredients: list[str], variants: int, seed: int) -> Iterator[list[str]]:
+    # random subsets (at least two ingredients) and reorderings; seeded per recipe so reruns match
+    rng = random.Random(seed)
+    for _ in range(variants):
+        if len(ingredients) > 2 and rng.random() < 0.5:
+            subset = rng.sample(ingredients, rng.randint(2, len(ingredients) - 1))
+        else:
+            subset = list(ingredients)
+            rng.shuffle(subset)
+        yield subset
+
+
+def recipe_examples(recipe: dict[str, Any], variants: int = 0, seed: int = 0) -> Iterator[dict[str, Any]]:
+    ingredients = recipe.get("ingredients", [])
+    output = _format_recipe_response(recipe)
+    subsets = [ingredients]
+    if len(ingredients) >= 2:
+        subsets.append(ingredients[:2])
+    if variants and len(ingredients) >= 2:
+        name_seed = int.from_bytes(hashlib.blake2b(output.encode("utf-8"), digest_size=8).digest(), "big")
+        subsets.extend(_ingredient_variants(ingredients, variants, seed ^ name_seed))
+    for subset in subsets:
+        yield {
+            "instruction": _instruction_for_ingredients(subset),
             "input": "",
             "output": output,
-        })
-        if len(ingredients) >= 2:
-            subset = ingredients[:2]
-            instruction_sub = _instruction_for_ingredients(subset)
-            examples.append({
-                "instruction": instruction_sub,
-                "input": "",
-                "output": output,
-            })
-    return examples
+        }
+
+
+def build_training_examples(recipes: Iterable[dict[str, Any]], variants: int = 0, seed: int = 0) -> list[dict[str, Any]]:
+    return [ex for recipe in recipes for ex in recipe_examples(recipe, variants, seed)]
+
+
+def _chat_example(ex: dict[str, Any]) -> dict[str, Any]:
+    user = ex["instruction"]
+    if ex.get("input"):
+        user = user + "\n" + ex["input"]
+    return {
+        "messages": [
+            {"role": "user", "content": user},
+            {"role": "assistant", "content": ex["output"]},
+        ]
+    }
 
 
 def build_chat_format(examples: list[dict[str, Any]]) -> list[dict[str, Any]]:
     # user/assistant messages for HF style training
-    out = []
-    for ex in examples:
-        user = ex["instruction"]
-        if ex.get("input"):
-            user = user + "\n" + ex["input"]
-        out.append({
-            "messages": [
-                {"role": "user", "content": user},
-                {"role": "assistant", "content": ex["output"]},
-            ]
-        })
-    return out
-
-
-def main() -> Path:
-    with open(_get_recipes_path(), encoding="utf-8") as f:
-        recipes = json.load(f)
-    examples = build_training_examples(recipes)
-    chat_examples = build_chat_format(examples)
-    output_path = _get_output_path()
-    with open(output_path, "w", encoding="utf-8") as f:
-        for item in chat_examples:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
-    return output_path
+    return [_chat_example(ex) for ex in examples]
+
+
+def _render_batch(recipes: list[dict[str, Any]], variants: int, seed: int) -> list[str]:
+    # runs in a worker: one serialized JSONL line per example
+    return [
+        json.dumps(_chat_example(ex), ensure_ascii=False)
+        for recipe in recipes
+        for ex in recipe_examples(recipe, variants, seed)
+    ]
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    it = iter(items)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def iter_example_lines(
+    recipes: Iterable[dict[str, Any]], variants: int = 0, seed: int = 0, workers: int = 1
+) -> Iterator[str]:
+    """Serialized examples in recipe order; with workers > 1 batches render in a process pool."""
+    if workers <= 1:
+        for batch in _batches(recipes, BATCH_SIZE):
+            yield from _render_batch(batch, variants, seed)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # a bounded window of batches in flight keeps memory flat (Executor.map would read everything)
+        pending: deque[Future] = deque()
+        for batch in _batches(recipes, BATCH_SIZE):
+            pending.append(pool.submit(_render_batch, batch, variants, seed))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ShardWriter:
+    """Writes lines into numbered shards of shard_size lines each (0 = one file), then a manifest."""
+
+    def __init__(self, output: Path, shard_size: int = 0, compress: bool = False) -> None:
+        self.output = output
+        self.shard_size = shard_size
+        self.compress = compress
+        self.shards: list[dict[str, Any]] = []
+        self._file: IO[bytes] | None = None
+        self._digest: Any = None
+        self._count = 0
+        if shard_size > 0:
+            output.mkdir(parents=True, exist_ok=True)
+        else:
+            output.parent.mkdir(parents=True, exist_ok=True)
+
+    def _shard_path(self) -> Path:
+        if self.shard_size <= 0:
+            return self.output.with_name(self.output.name + ".gz") if self.compress else self.output
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        return self.output / f"train-{len(self.shards):05d}{suffix}"
+
+    def _open(self) -> None:
+        path = self._shard_path()
+        # mtime=0 keeps gzip output byte-identical across runs
+        self._file = gzip.GzipFile(path, "wb", mtime=0) if self.compress else open(path, "wb")
+        self._digest = hashlib.sha256()
+        self._count = 0
+        self.shards.append({"path": path.name, "examples": 0})
+
+    def _close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        shard = self.shards[-1]
+        shard["examples"] = self._count
+        shard["sha256"] = self._digest.hexdigest()
+        self._file = None
+
+    def write(self, line: str) -> None:
+        if self._file is None:
+            self._open()
+        data = (line + "\n").encode("utf-8")
+        self._file.write(data)
+        self._digest.update(data)
+        self._count += 1
+        if self.shard_size > 0 and self._count >= self.shard_size:
+            self._close()
+
+    def close(self, **info: Any) -> Path:
+        """Finish the last shard; sharded output also gets a manifest.json, whose path is returned."""
+        if not self.shards:
+            self._open()
+        self._close()
+        if self.shard_size <= 0:
+            return self.output.parent / self.shards[0]["path"]
+        manifest = {
+            "format": "chat-jsonl",
+            "compression": "gzip" if self.compress else None,
+            "examples": sum(s["examples"] for s in self.shards),
+            "shards": self.shards,
+            **info,
+        }
+        path = self.output / "manifest.json"
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+
+class SeenLines:
+    """Digests of the lines written so far, in at most max_bytes of memory.
+
+    Exact (a set of 16-byte digests, ~100 bytes each) until that would pass max_bytes, then a
+    Bloom filter of max_bytes: memory stays flat, but a false positive drops a unique line.
+    At the 128MB default that is about one line in a million once 20M examples are in.
+    """
+
+    _HASHES = 7
+
+    def __init__(self, max_bytes: int = 128 << 20) -> None:
+        self.max_bytes = max_bytes
+        self._exact: set[bytes] | None = set()
+        self._bits: bytearray | None = None
+
+    @property
+    def exact(self) -> bool:
+        return self._exact is not None
+
+    def _positions(self, digest: bytes) -> list[int]:
+        # double hashing over the two halves of the digest
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = len(self._bits) * 8
+        return [(h1 + i * h2) % size for i in range(self._HASHES)]
+
+    def _set_bits(self, digest: bytes) -> bool:
+        new = False
+        for p in self._positions(digest):
+            byte, bit = divmod(p, 8)
+            if not self._bits[byte] >> bit & 1:
+                self._bits[byte] |= 1 << bit
+                new = True
+        return new
+
+    def add(self, digest: bytes) -> bool:
+        """Record digest; False if it was (probably, once in Bloom mode) seen before."""
+        if self._exact is None:
+            return self._set_bits(digest)
+        if digest in self._exact:
+            return False
+        self._exact.add(digest)
+        if len(self._exact) * 100 > self.max_bytes:
+            self._bits = bytearray(max(self.max_bytes, 8))
+            for d in self._exact:
+                self._set_bits(d)
+            self._exact = None
+        return True
+
+
+def main(
+    recipes_path: Path | None = None,
+    output: Path | None = None,
+    variants: int = 0,
+    workers: int = 1,
+    shard_size: int = 0,
+    compress: bool = False,
+    seed: int = 0,
+    dedup_bytes: int = 128 << 20,
+) -> Path:
+    """Write the examples (duplicates dropped, see SeenLines for the memory bound) and return the path."""
+    recipes_path = recipes_path or _get_recipes_path()
+    if output is None:
+        output = _get_output_path() if shard_size <= 0 else _get_output_path().with_suffix("")
+    writer = ShardWriter(output, shard_size, compress)
+    seen = SeenLines(dedup_bytes)
+    duplicates = 0
+    for line in iter_example_lines(iter_recipes(recipes_path), variants, seed, workers):
+        if not seen.add(hashlib.blake2b(line.encode("utf-8"), digest_size=16).digest()):
+            duplicates += 1
+            continue
+        writer.write(line)
+    return writer.close(
+        source=recipes_path.name,
+        variants=variants,
+        seed=seed,
+        duplicates_dropped=duplicates,
+        dedup="exact" if seen.exact else "bloom",
+    )
 
 
 if __name__ == "__main__":
-    path = main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build chat-format training data from recipes.json")
+    parser.add_argument("--recipes", default=None, help="Recipe file (JSON array or JSONL)")
+    parser.add_argument("--output", default=None, help="Output file, or directory when sharding")
+    parser.add_argument("--variants", type=int, default=0, help="Extra ingredient subsets/reorderings per recipe")
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating examples")
+    parser.add_argument("--shard-size", type=int, default=0, help="Examples per shard (0 = single file)")
+    parser.add_argument("--gzip", action="store_true", help="Compress the output")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dedup-mb", type=int, default=128, help="Memory for duplicate detection (exact until full, then a Bloom filter)")
+    args = parser.parse_args()
+    path = main(
+        recipes_path=Path(args.recipes) if args.recipes else None,
+        output=Path(args.output) if args.output else None,
+        variants=args.variants,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        compress=args.gzip,
+        seed=args.seed,
+        dedup_bytes=args.dedup_mb << 20,
+    )
     print("Training data written to:", path)
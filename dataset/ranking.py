@@ -0,0 +1,135 @@
+# idf/bm25-weighted ranking over a sparse recipe x ingredient matrix (needs numpy + scipy)
+
+from dataset.loader import RecipeIndex
+
+# bm25 with binary term frequency: k1 only shapes the length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+# bonus for the share of a recipe's ingredients the user already has
+COVERAGE_WEIGHT = 1.0
+
+
+def _import_sparse():
+    try:
+        import numpy as np
+        from scipy import sparse
+    except ImportError as e:
+        raise RuntimeError(
+            "Weighted ranking needs numpy and scipy. Run: pip install numpy scipy"
+        ) from e
+    return np, sparse
+
+
+class WeightedRanker:
+    """Scores every recipe for a query with one sparse mat-vec; many queries with one mat-mat."""
+
+    def __init__(
+        self,
+        index: RecipeIndex,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        coverage_weight: float = COVERAGE_WEIGHT,
+    ) -> None:
+        np, sparse = _import_sparse()
+        self._np = np
+        self._sparse = sparse
+        self.index = index
+        n_recipes = len(index.recipes)
+        n_terms = len(index.terms)
+
+        lengths = np.fromiter(
+            (len(tids) for tids in index.recipe_terms), dtype=np.int64, count=n_recipes
+        )
+        indptr = np.zeros(n_recipes + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.fromiter(
+            (tid for tids in index.recipe_terms for tid in tids),
+            dtype=np.int32,
+            count=int(indptr[-1]),
+        )
+        # binary incidence matrix, recipes x terms
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(n_recipes, n_terms),
+        )
+        df = np.fromiter((len(p) for p in index.postings), dtype=np.float64, count=n_terms)
+        self.idf = np.log1p((n_recipes - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = float(lengths.mean()) if n_recipes else 1.0
+        safe_len = np.maximum(lengths, 1).astype(np.float32)
+        # per-recipe bm25 factor (tf = 1) and 1/len for the coverage bonus
+        self.length_norm = ((k1 + 1) / (1 + k1 * (1 - b + b * safe_len / max(avg_len, 1e-9)))).astype(np.float32)
+        self.inv_len = (1.0 / safe_len).astype(np.float32)
+        self.coverage_weight = coverage_weight
+        self.name_rank = np.asarray(index.name_rank, dtype=np.int64)
+
+    def _query_matrix(self, queries: list[list[str]]):
+        np = self._np
+        rows: list[int] = []
+        cols: list[int] = []
+        for qi, ingredients in enumerate(queries):
+            for tid in self.index.lookup(ingredients):
+                rows.append(tid)
+                cols.append(qi)
+        data = np.ones(len(rows), dtype=np.float32)
+        return self._sparse.csc_matrix(
+            (data, (rows, cols)), shape=(len(self.index.terms), len(queries))
+        )
+
+    def score_many(self, queries: list[list[str]]):
+        """(weighted scores, overlap counts) as sparse recipes x queries matrices."""
+        q = self._query_matrix(queries)
+        overlap = (self.matrix @ q).tocsc()
+        weighted = self.matrix @ self._sparse.diags(self.idf) @ q
+        weighted = self._sparse.diags(self.length_norm) @ weighted
+        coverage = self._sparse.diags(self.inv_len * self.coverage_weight) @ overlap
+        return (weighted + coverage).tocsc(), overlap
+
+    def _top(self, rids, scores, overlap, max_results: int, min_matches: int) -> list[tuple[int, float]]:
+        np = self._np
+        keep = overlap >= min_matches
+        rids, scores = rids[keep], scores[keep]
+        if max_results <= 0 or not len(rids):
+            return []
+        if len(rids) > max_results:
+            # argpartition finds the k-th score; everything tied with it stays for the name tie-break
+            kth = np.argpartition(-scores, max_results - 1)[max_results - 1]
+            keep = scores >= scores[kth]
+            rids, scores = rids[keep], scores[keep]
+        order = np.lexsort((self.name_rank[rids], -scores))[:max_results]
+        return [(int(rids[i]), float(scores[i])) for i in order]
+
+    def rank_many(
+        self, queries: list[list[str]], max_results: int = 5, min_matches: int = 1
+    ) -> list[list[tuple[int, float]]]:
+        scores, overlap = self.score_many(queries)
+        # both share the sparsity pattern of the overlap product (idf is always > 0)
+        scores.sort_indices()
+        overlap.sort_indices()
+        out = []
+        for qi in range(len(queries)):
+            start, end = scores.indptr[qi], scores.indptr[qi + 1]
+            o_start, o_end = overlap.indptr[qi], overlap.indptr[qi + 1]
+            out.append(self._top(
+                scores.indices[start:end],
+                scores.data[start:end],
+                overlap.data[o_start:o_end],
+                max_results,
+                max(min_matches, 1),
+            ))
+        return out
+
+    def rank(
+        self, ingredients: list[str], max_results: int = 5, min_matches: int = 1
+    ) -> list[tuple[int, float]]:
+        np = self._np
+        tids = list(self.index.lookup(ingredients))
+        if not tids:
+            return []
+        q = np.zeros(len(self.index.terms), dtype=np.float32)
+        q[tids] = 1.0
+        overlap = self.matrix @ q
+        rids = np.flatnonzero(overlap)
+        weighted = (self.matrix @ (q * self.idf))[rids] * self.length_norm[rids]
+        scores = weighted + overlap[rids] * self.inv_len[rids] * self.coverage_weight
+        return self._top(rids, scores, overlap[rids], max_results, max(min_matches, 1))
+
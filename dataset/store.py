@@ -0,0 +1,250 @@
+# compiled binary recipe store: interned ingredients, offset tables and the search index in one
+# mmap-able file, so every API worker shares the same pages and decodes recipes only on demand
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+from dataset.loader import RecipeIndex, _get_recipes_path, load_recipes
+
+MAGIC = b"RCPSTOR1"
+# magic, recipe count, term count, source size, source mtime_ns, catalog version
+_HEADER = struct.Struct("<8sIIQq16s")
+# byte offset of each section: term offsets, term blob, posting offsets, posting ids,
+# recipe term offsets, recipe term ids, name ranks, record offsets, record blob, end
+_SECTIONS = 10
+_TABLE = struct.Struct(f"<{_SECTIONS}Q")
+
+
+def _get_store_path() -> Path:
+    return Path(__file__).resolve().parent / "recipes.bin"
+
+
+def delta_store_path(store_path: Path) -> Path:
+    # catalogs edited through the admin API; never loaded at startup, recipes.json stays the source
+    return store_path.with_name(store_path.stem + ".delta" + store_path.suffix)
+
+
+def _pad(buf: bytearray) -> None:
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def _ints(view: memoryview, typecode: str) -> Sequence[int]:
+    # the file is little-endian; only big-endian hosts pay for a copy
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+    out = array(typecode, view.tobytes())
+    out.byteswap()
+    return out
+
+
+class _Slices(Sequence[Sequence[int]]):
+    """offsets[i]:offsets[i+1] windows into a flat id array (posting lists, recipe terms)."""
+
+    def __init__(self, offsets: Sequence[int], ids: Sequence[int]) -> None:
+        self._offsets = offsets
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._ids[self._offsets[i]:self._offsets[i + 1]]
+
+
+class _Strings(Sequence[str]):
+    def __init__(self, offsets: Sequence[int], blob: memoryview) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class RecipeStore(Sequence[dict[str, Any]]):
+    """Read-only recipe list backed by the mmap; records are JSON-decoded on access."""
+
+    def __init__(
+        self, offsets: Sequence[int], blob: memoryview, cache_size: int = 4096
+    ) -> None:
+        self._raw = _Strings(offsets, blob)
+        self._cache: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self._cache_size = cache_size
+        # read from the event loop and the inference/batch worker threads at once
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        # hot recipes keep the same dict, so per-recipe caches keyed on it stay warm
+        with self._lock:
+            recipe = self._cache.get(i)
+            if recipe is not None:
+                self._cache.move_to_end(i)
+                return recipe
+        # decoded outside the lock; if another thread got there first its dict wins
+        decoded = json.loads(self._raw[i])
+        with self._lock:
+            recipe = self._cache.setdefault(i, decoded)
+            self._cache.move_to_end(i)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return recipe
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def compile_store(
+    recipes: Sequence[dict[str, Any]],
+    path: Path,
+    source: Path | None = None,
+    index: RecipeIndex | None = None,
+) -> Path:
+    """Write recipes plus their prebuilt index to path (atomically, via a temp file)."""
+    # an index already built over these recipes (e.g. a delta) is written as is
+    index = index or RecipeIndex(recipes)
+    terms = list(index.terms)
+    buf = bytearray(_HEADER.size + _TABLE.size)
+    sections: list[int] = []
+
+    def section(data: bytes) -> None:
+        _pad(buf)
+        sections.append(len(buf))
+        buf.extend(data)
+
+    term_bytes = [t.encode("utf-8") for t in terms]
+    offsets = array("I", [0])
+    for b in term_bytes:
+        offsets.append(offsets[-1] + len(b))
+    section(offsets.tobytes())
+    section(b"".join(term_bytes))
+
+    offsets = array("I", [0])
+    ids = array("I")
+    for posting in index.postings:
+        ids.extend(posting)
+        offsets.append(len(ids))
+    section(offsets.tobytes())
+    section(ids.tobytes())
+
+    offsets = array("I", [0])
+    ids = array("I")
+    for tids in index.recipe_terms:
+        ids.extend(tids)
+        offsets.append(len(ids))
+    section(offsets.tobytes())
+    section(ids.tobytes())
+
+    section(array("I", index.name_rank).tobytes())
+
+    records = [json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for r in recipes]
+    offsets = array("Q", [0])
+    for b in records:
+        offsets.append(offsets[-1] + len(b))
+    section(offsets.tobytes())
+    section(b"".join(records))
+    _pad(buf)
+    sections.append(len(buf))
+
+    if sys.byteorder != "little":
+        raise RuntimeError("Compiling the recipe store needs a little-endian host")
+    stat = source.stat() if source is not None and source.exists() else None
+    _HEADER.pack_into(
+        buf, 0, MAGIC, len(recipes), len(terms),
+        stat.st_size if stat else 0,
+        stat.st_mtime_ns if stat else 0,
+        index.version.encode("ascii"),
+    )
+    _TABLE.pack_into(buf, _HEADER.size, *sections)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(buf)
+    os.replace(tmp, path)
+    return path
+
+
+def _read_header(path: Path) -> tuple:
+    with open(path, "rb") as f:
+        head = f.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        raise ValueError(f"{path} is not a compiled recipe store")
+    fields = _HEADER.unpack(head)
+    if fields[0] != MAGIC:
+        raise ValueError(f"{path} is not a compiled recipe store")
+    return fields
+
+
+def is_fresh(path: Path, source: Path) -> bool:
+    """True if path was compiled from source as it is now (size + mtime)."""
+    if not path.exists():
+        return False
+    if not source.exists():
+        return True
+    try:
+        _, _, _, size, mtime_ns, _ = _read_header(path)
+    except ValueError:
+        return False
+    stat = source.stat()
+    return size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+
+def open_store(path: Path) -> RecipeIndex:
+    """Memory-map a compiled store and wrap it as a RecipeIndex without decoding any recipe."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    magic, n_recipes, n_terms, _, _, version = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compiled recipe store")
+    bounds = _TABLE.unpack_from(view, _HEADER.size)
+
+    def part(i: int) -> memoryview:
+        return view[bounds[i]:bounds[i + 1]]
+
+    term_offsets = _ints(part(0), "I")[: n_terms + 1]
+    terms = _Strings(term_offsets, part(1))
+    posting_offsets = _ints(part(2), "I")[: n_terms + 1]
+    postings = _Slices(posting_offsets, _ints(part(3), "I"))
+    name_rank = _ints(part(6), "I")[:n_recipes]
+    recipe_term_offsets = _ints(part(4), "I")[: n_recipes + 1]
+    recipe_terms = _Slices(recipe_term_offsets, _ints(part(5), "I"))
+    record_offsets = _ints(part(7), "Q")[: n_recipes + 1]
+    return RecipeIndex(
+        RecipeStore(record_offsets, part(8)),
+        terms=terms[:],
+        postings=postings,
+        name_rank=name_rank,
+        recipe_terms=recipe_terms,
+        version=version.decode("ascii"),
+        buffer=mm,
+    )
+
+
+def main() -> Path:
+    source = _get_recipes_path()
+    return compile_store(load_recipes(), _get_store_path(), source=source)
+
+
+if __name__ == "__main__":
+    path = main()
+    print("Compiled recipe store written to:", path)
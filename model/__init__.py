@@ -1,4 +1,17 @@
-from model.inference import RecipeInferenceEngine
+from model.cache import ResponseCache
+from model.circuit import CircuitBreaker
+from model.inference import RecipeInferenceEngine, Suggestion
+from model.limiter import InferenceBusyError, InferenceLimiter
 from model.prompt_builder import build_recipe_prompt
+from model.sessions import SessionStore
 
-__all__ = ["RecipeInferenceEngine", "build_recipe_prompt"]
+__all__ = [
+    "CircuitBreaker",
+    "InferenceBusyError",
+    "InferenceLimiter",
+    "RecipeInferenceEngine",
+    "ResponseCache",
+    "SessionStore",
+    "Suggestion",
+    "build_recipe_prompt",
+]
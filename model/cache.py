@@ -0,0 +1,159 @@
+# response cache so repeated ingredient sets don't pay for another generation
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+
+class _MemoryBackend:
+    def __init__(self) -> None:
+        # key -> (value, size, stored_at); order is LRU first
+        self._items: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        self._items.move_to_end(key)
+        return item[0], item[2]
+
+    def set(self, key: str, value: str, size: int, now: float) -> None:
+        self.delete(key)
+        self._items[key] = (value, size, now)
+        self.total_bytes += size
+
+    def delete(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.total_bytes -= item[1]
+
+    def pop_lru(self) -> None:
+        _, item = self._items.popitem(last=False)
+        self.total_bytes -= item[1]
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.total_bytes = 0
+
+
+class _SQLiteBackend:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at)")
+        self._db.commit()
+        row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self.total_bytes = int(row[0])
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        row = self._db.execute(
+            "SELECT value, stored_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+        )
+        self._db.commit()
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, size: int, now: float) -> None:
+        self.delete(key)
+        self._db.execute(
+            "INSERT INTO responses (key, value, size, stored_at, used_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now, now),
+        )
+        self._db.commit()
+        self.total_bytes += size
+
+    def delete(self, key: str) -> None:
+        row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            self.total_bytes -= row[0]
+
+    def pop_lru(self) -> None:
+        row = self._db.execute(
+            "SELECT key FROM responses ORDER BY used_at LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            self.delete(row[0])
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM responses")
+        self._db.commit()
+        self.total_bytes = 0
+
+
+class ResponseCache:
+    """LRU cache with a TTL and byte cap; pass a path to keep it in SQLite across restarts."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 3600.0,
+        path: str | Path | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._backend = _SQLiteBackend(Path(path)) if path else _MemoryBackend()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._backend.get(key)
+            if item is not None and self.ttl > 0 and time.time() - item[1] > self.ttl:
+                self._backend.delete(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: str) -> None:
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._backend.set(key, value, size, time.time())
+            while len(self._backend) > self.max_entries or self._backend.total_bytes > self.max_bytes:
+                self._backend.pop_lru()
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._backend.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._backend),
+                "bytes": self._backend.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,79 @@
+# circuit breaker so an ollama outage falls back to the dataset without waiting on connects
+
+import threading
+import time
+from typing import Any
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """closed -> open after repeated failures; half_open lets one trial through after reset_timeout."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self.last_error: str | None = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        now = time.monotonic()
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        elif (
+            self._state == HALF_OPEN
+            and self._trial_in_flight
+            and now - self._trial_started >= self.reset_timeout
+        ):
+            # the trial never reported back (e.g. cancelled stream), allow another
+            self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+            self.last_error = None
+
+    def record_failure(self, error: str | None = None) -> None:
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "last_error": self.last_error,
+            }
@@ -1,57 +1,409 @@
 # calls ollama with recipe context so we don't get random recipes
 
+import asyncio
+import hashlib
+import json
 import re
-from typing import Any
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, AsyncIterator, Iterator, NamedTuple
 
-from dataset.loader import RecipeLoader
-from model.prompt_builder import build_recipe_prompt, format_recipe_for_response
+from dataset.loader import RecipeIndex, RecipeLoader, canonical_ingredients
+from dataset.fuzzy import FuzzyResolver
+from dataset.matcher import IngredientMatcher
+from model.cache import ResponseCache
+from model.circuit import CLOSED, CircuitBreaker
+from model import metrics
+from model.limiter import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    DeadlineUnreachableError,
+    InferenceLimiter,
+)
+from model.pool import BackendPool, NoBackendError
+from model.prompt_builder import (
+    SYSTEM_PROMPT,
+    build_recipe_prompt,
+    format_recipe_for_response,
+    clear_render_cache,
+    pack_recipes,
+)
+from model.sessions import Session, SessionStore
+from model.singleflight import SingleFlight
 
+_END = object()
 
-def _parse_ingredients_from_message(message: str) -> list[str]:
-    # split on comma, "and", etc
+# which path produced a reply
+SOURCE_LLM = "llm"
+SOURCE_CACHE = "cache"
+SOURCE_FALLBACK = "fallback"
+SOURCE_DEADLINE = "deadline"
+
+
+_PUNCTUATION = ".;:!?\"()[]{}"
+
+
+def _parse_ingredients_from_message(
+    message: str,
+    matcher: IngredientMatcher | None = None,
+    resolver: FuzzyResolver | None = None,
+) -> list[str]:
+    # split on comma, "and", etc; with a matcher, known multi-word ingredients stay together
     message = message.strip().lower()
     for sep in [",", "/", " and ", " & "]:
         message = message.replace(sep, " ")
-    tokens = [t.strip() for t in re.split(r"\s+", message) if t.strip()]
+    tokens = [t.strip(_PUNCTUATION) for t in re.split(r"\s+", message)]
+    tokens = [t for t in tokens if t]
+    if resolver is not None:
+        # typos are fixed per word first so "chiken brest" can still match "chicken breast"
+        tokens = resolver.resolve_all(tokens)
+    if matcher is not None:
+        tokens = matcher.scan(tokens)
     return tokens if tokens else [message] if message else []
 
 
+class Suggestion(NamedTuple):
+    text: str
+    source: str
+
+
+class BatchItem(NamedTuple):
+    message: str
+    cache_key: str | None
+    matching: list[dict[str, Any]]
+    system: str
+    user_prompt: str
+
+
+class TokenStream:
+    """Async iterator over tokens produced by a worker thread; cancel() stops generation."""
+
+    def __init__(self, queue: asyncio.Queue, cancel_event: threading.Event) -> None:
+        self._queue = queue
+        self._cancel_event = cancel_event
+
+    def __aiter__(self) -> "TokenStream":
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self._queue.get()
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+
 class RecipeInferenceEngine:
     def __init__(
         self,
         model_name: str = "llama3.2:1b",
         recipe_loader: RecipeLoader | None = None,
         max_recipe_context: int = 5,
+        limiter: InferenceLimiter | None = None,
+        cache: ResponseCache | None = None,
+        breaker: CircuitBreaker | None = None,
+        deadline_ms: int = 0,
+        complete_in_background: bool = True,
+        max_background: int | None = None,
+        fuzzy_matching: bool = True,
+        prompt_token_budget: int = 0,
+        sessions: SessionStore | None = None,
+        keep_alive: str | None = None,
+        pool: BackendPool | None = None,
     ) -> None:
         self.model_name = model_name
         self.loader = recipe_loader or RecipeLoader()
         self.max_recipe_context = max_recipe_context
+        self.limiter = limiter or InferenceLimiter()
+        self.cache = cache
+        self.flights = SingleFlight()
+        self.breaker = breaker or CircuitBreaker()
+        # deadline_ms=0 waits for the model however long it takes
+        self.deadline_ms = deadline_ms
+        self.complete_in_background = complete_in_background
+        self.fuzzy_matching = fuzzy_matching
+        # 0 sends every retrieved recipe in full
+        self.prompt_token_budget = prompt_token_budget
+        self.sessions = sessions or SessionStore()
+        self.keep_alive = keep_alive
+        self._pool = pool
+        self._reload_lock = threading.Lock()
+        # timed-out generations left running to warm the cache; past the cap they are cancelled
+        self.max_background = self.limiter.max_concurrency if max_background is None else max_background
+        self._background_running = 0
+        self._background_lock = threading.Lock()
+        # threads for the in-deadline calls plus the ones left running, so neither waits on the other
+        self._background = ThreadPoolExecutor(
+            max_workers=self.limiter.max_concurrency + self.max_background, thread_name_prefix="generation"
+        )
 
-    def _call_ollama(self, system: str, user: str) -> str:
+    def _import_ollama(self):
         try:
             import ollama
         except ImportError as e:
             raise RuntimeError(
                 "Ollama Python client not installed. Run: pip install ollama"
             ) from e
+        return ollama
 
-        try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
+    def _ollama_error(self, e: Exception) -> RuntimeError:
+        msg = str(e).lower()
+        if isinstance(e, NoBackendError) or "connection" in msg or "refused" in msg or "not found" in msg:
+            metrics.ERRORS.inc("ollama_unavailable")
+            return RuntimeError(
+                "Ollama is not running or model not found. "
+                "Start Ollama and run: ollama run " + self.model_name
             )
-            return response["message"]["content"].strip()
-        except Exception as e:
-            msg = str(e).lower()
-            if "connection" in msg or "refused" in msg or "not found" in msg:
-                raise RuntimeError(
-                    "Ollama is not running or model not found. "
-                    "Start Ollama and run: ollama run " + self.model_name
-                ) from e
-            raise RuntimeError(f"Ollama request failed: {e}") from e
+        metrics.ERRORS.inc("ollama_failed")
+        return RuntimeError(f"Ollama request failed: {e}")
+
+    def _record_usage(self, response: Any) -> None:
+        # ollama reports token counts and durations (ns) on the final message
+        if not metrics.enabled():
+            return
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        completion_tokens = response.get("eval_count") or 0
+        if prompt_tokens:
+            metrics.TOKENS.inc("prompt", amount=prompt_tokens)
+        if completion_tokens:
+            metrics.TOKENS.inc("completion", amount=completion_tokens)
+
+    def _messages(self, system: str, user: str) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
+    def _chat_options(self) -> dict[str, Any]:
+        # keep_alive holds the model (and its prefix cache) in memory between turns
+        return {"keep_alive": self.keep_alive} if self.keep_alive else {}
+
+    @property
+    def pool(self) -> BackendPool:
+        # without a configured pool, one backend on the client's default host (OLLAMA_HOST)
+        if self._pool is None:
+            self._pool = BackendPool([None], lambda url: self._import_ollama().Client(host=url))
+        return self._pool
+
+    def _affinity(self, messages: list[dict[str, str]]) -> str | None:
+        # follow-up turns share their first exchange; keep them on the host that has it cached
+        if len(messages) <= 2:
+            return None
+        return self._flight_key(messages[:2])
+
+    def _call_ollama(self, messages: list[dict[str, str]]) -> str:
+        pool = self.pool
+        affinity = self._affinity(messages)
+        started = time.perf_counter()
+        tried: set[int] = set()
+        while True:
+            try:
+                with pool.lease(self.model_name, affinity, tried) as backend:
+                    tried.add(pool.index(backend))
+                    response = backend.client.chat(
+                        model=self.model_name,
+                        messages=messages,
+                        **self._chat_options(),
+                    )
+                text = response["message"]["content"].strip()
+                break
+            except NoBackendError as e:
+                raise self._ollama_error(e) from e
+            except Exception as e:
+                # a failed host is retried on the next one until every host has had a go
+                if len(tried) >= len(pool):
+                    raise self._ollama_error(e) from e
+        if metrics.enabled():
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "ollama_total")
+            # without streaming, first token ~ model load + prompt prefill
+            ttft_ns = (response.get("load_duration") or 0) + (response.get("prompt_eval_duration") or 0)
+            if ttft_ns:
+                metrics.STAGE_SECONDS.observe(ttft_ns / 1e9, "ollama_ttft")
+            self._record_usage(response)
+        return text
+
+    def _guarded_call(self, messages: list[dict[str, str]]) -> str:
+        try:
+            text = self._call_ollama(messages)
+        except RuntimeError as e:
+            self.breaker.record_failure(str(e))
+            raise
+        self.breaker.record_success()
+        return text
+
+    def _guarded_stream(
+        self, messages: list[dict[str, str]], cancel: threading.Event | None = None
+    ) -> Iterator[str]:
+        try:
+            started = False
+            for token in self._stream_ollama(messages, cancel=cancel):
+                if not started:
+                    started = True
+                    self.breaker.record_success()
+                yield token
+        except RuntimeError as e:
+            self.breaker.record_failure(str(e))
+            raise
+
+    def probe(self) -> bool:
+        """Health-check the backends; closes the breaker once any of them is reachable again."""
+        try:
+            # with the breaker tripped every host is re-checked, otherwise only the ejected ones
+            healthy = self.pool.check(force=self.breaker.state != CLOSED)
+        except RuntimeError as e:
+            healthy, error = False, str(e)
+        else:
+            error = "No healthy Ollama backend available"
+        if not healthy:
+            if self.breaker.state != CLOSED:
+                self.breaker.record_failure(error)
+            return False
+        self.breaker.record_success()
+        return True
+
+    def preload(self) -> None:
+        """Load the recipes and build everything a query touches, instead of on the first request."""
+        self._prepare_index(self.loader.index)
+        self.loader.find_by_ingredients(["egg"])
+
+    def _prepare_index(self, index: RecipeIndex) -> None:
+        # the content hash is part of every cache key, ETag and search cursor
+        index.version
+        index.matcher
+        if self.fuzzy_matching:
+            index.fuzzy
+        if self.loader.ranking == "bm25":
+            index.ranker
+
+    def reload_catalog(
+        self,
+        add: list[dict[str, Any]] | None = None,
+        remove: list[str] | None = None,
+        persist: bool = False,
+    ) -> RecipeIndex:
+        """Rebuild from disk, or apply a delta to the current catalog, then swap it in."""
+        with self._reload_lock:
+            if add is None and remove is None:
+                index = self.loader.build()
+            else:
+                index = self.loader.build_delta(add or (), remove or ())
+            # everything is built before the swap so no request pays for it
+            self._prepare_index(index)
+            old = self.loader.swap(index)
+            if persist:
+                # written under the lock so a concurrent delta can't be saved half-applied
+                self.loader.save()
+        if index.version != old.version:
+            # replies and rendered prompts of the old catalog would otherwise linger until evicted
+            if self.cache is not None:
+                self.cache.clear()
+            clear_render_cache()
+        return index
+
+    def warm_up(self) -> bool:
+        """Load the model on every host before the first request; True if one answered."""
+        # one token on the real system prompt loads the weights and leaves the shared prefix cached
+        messages = self._messages(SYSTEM_PROMPT, "Hello")
+        warmed = False
+        for backend in self.pool.backends:
+            try:
+                backend.client.chat(
+                    model=self.model_name,
+                    messages=messages,
+                    options={"num_predict": 1},
+                    **self._chat_options(),
+                )
+            except Exception:
+                continue
+            warmed = True
+        if warmed:
+            self.breaker.record_success()
+        return warmed
+
+    def keep_warm(self) -> int:
+        """Ping each healthy host so the model isn't unloaded while idle; returns how many answered."""
+        # a chat with no messages only (re)loads the model and resets its keep_alive timer
+        answered = 0
+        now = time.monotonic()
+        for backend in self.pool.backends:
+            if not backend.available(now):
+                continue
+            try:
+                backend.client.chat(model=self.model_name, messages=[], **self._chat_options())
+            except Exception:
+                continue
+            answered += 1
+        return answered
+
+    def _stream_ollama(
+        self, messages: list[dict[str, str]], cancel: threading.Event | None = None
+    ) -> Iterator[str]:
+        pool = self.pool
+        affinity = self._affinity(messages)
+        started = time.perf_counter()
+        first = True
+        tried: set[int] = set()
+        while True:
+            try:
+                with pool.lease(self.model_name, affinity, tried) as backend:
+                    tried.add(pool.index(backend))
+                    stream = backend.client.chat(
+                        model=self.model_name,
+                        messages=messages,
+                        stream=True,
+                        **self._chat_options(),
+                    )
+                    try:
+                        for chunk in stream:
+                            if cancel is not None and cancel.is_set():
+                                break
+                            if chunk.get("done"):
+                                self._record_usage(chunk)
+                                metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "ollama_total")
+                            token = chunk["message"]["content"]
+                            if token:
+                                if first:
+                                    first = False
+                                    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "ollama_ttft")
+                                yield token
+                    finally:
+                        # closing the generator drops the HTTP stream, which stops ollama generating
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            close()
+                return
+            except NoBackendError as e:
+                raise self._ollama_error(e) from e
+            except Exception as e:
+                # only a host that failed before sending anything can be swapped for another
+                if not first or len(tried) >= len(pool):
+                    raise self._ollama_error(e) from e
+
+    def _fallback(
+        self, matching: list[dict[str, Any]], user_message: str, reason: str
+    ) -> str:
+        metrics.FALLBACKS.inc(reason)
+        with metrics.STAGE_SECONDS.time("fallback"):
+            return self._fallback_response(matching, user_message)
+
+    def _cache_get(self, key: str | None) -> str | None:
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        metrics.CACHE.inc("miss" if cached is None else "hit")
+        return cached
+
+    def _parse(self, user_message: str) -> list[str]:
+        index = self.loader.index
+        resolver = index.fuzzy if self.fuzzy_matching else None
+        with metrics.STAGE_SECONDS.time("parse"):
+            return _parse_ingredients_from_message(user_message, index.matcher, resolver)
 
     def _fallback_response(
         self, matching: list[dict[str, Any]], user_message: str
@@ -73,20 +425,457 @@ class RecipeInferenceEngine:
             "Try different ingredients or ask for a general suggestion."
         )
 
-    def suggest_recipe(self, user_message: str) -> str:
-        ingredients = _parse_ingredients_from_message(user_message)
-        matching = self.loader.find_by_ingredients(
-            ingredients,
-            max_results=self.max_recipe_context,
-        )
-        all_recipes = self.loader.get_all() if not matching else None
-        system, user_prompt = build_recipe_prompt(
+    def _cache_key(self, ingredients: list[str]) -> str | None:
+        if self.cache is None or not ingredients:
+            return None
+        material = [self.model_name, self.loader.version, canonical_ingredients(ingredients)]
+        return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+    def _flight_key(self, messages: list[dict[str, str]]) -> str:
+        material = [self.model_name, [(m["role"], m["content"]) for m in messages]]
+        return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+    def _prepare(
+        self, user_message: str, ingredients: list[str] | None = None
+    ) -> tuple[list[dict[str, Any]], str, str]:
+        if ingredients is None:
+            ingredients = self._parse(user_message)
+        # one catalog snapshot, so prompt renders are cached under the version they came from
+        index = self.loader.index
+        with metrics.STAGE_SECONDS.time("retrieve"):
+            matching = self.loader.find_by_ingredients(
+                ingredients,
+                max_results=self.max_recipe_context,
+                index=index,
+            )
+        # only the first few are used, so pass the lazy sequence instead of copying it
+        all_recipes = index.recipes if not matching else None
+        with metrics.STAGE_SECONDS.time("prompt"):
+            system, user_prompt = build_recipe_prompt(
+                user_message,
+                matching_recipes=matching,
+                include_all_recipes=not matching,
+                all_recipes=all_recipes,
+                token_budget=self.prompt_token_budget,
+                catalog=index.version,
+            )
+        return matching, system, user_prompt
+
+    def _generate(
+        self,
+        cache_key: str | None,
+        messages: list[dict[str, str]],
+        cancel: threading.Event | None = None,
+    ) -> str:
+        flight_key = self._flight_key(messages)
+        if cancel is None:
+            text = self.flights.do(flight_key, lambda: self._guarded_call(messages))
+        else:
+            # streamed so a cancelled race actually stops the generation
+            tokens: list[str] = []
+            shared = self.flights.stream(
+                flight_key,
+                lambda abandoned: self._guarded_stream(messages, cancel=abandoned),
+            )
+            try:
+                for token in shared:
+                    if cancel.is_set():
+                        raise RuntimeError("Generation cancelled")
+                    tokens.append(token)
+            finally:
+                shared.close()
+            text = "".join(tokens).strip()
+        if cache_key is not None:
+            self.cache.set(cache_key, text)
+        return text
+
+    def suggest(
+        self,
+        user_message: str,
+        deadline_ms: int | None = None,
+        started_at: float | None = None,
+        session: Session | None = None,
+    ) -> Suggestion:
+        """Like suggest_recipe but also says which path answered (llm, cache, fallback, deadline)."""
+        if started_at is None:
+            started_at = time.monotonic()
+        if session is not None:
+            return self._suggest_in_session(session, user_message, deadline_ms, started_at)
+        ingredients = self._parse(user_message)
+        key = self._cache_key(ingredients)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return Suggestion(cached, SOURCE_CACHE)
+        matching, system, user_prompt = self._prepare(user_message, ingredients)
+        return self._answer(
             user_message,
-            matching_recipes=matching,
-            include_all_recipes=not matching,
-            all_recipes=all_recipes,
+            key,
+            matching,
+            self._messages(system, user_prompt),
+            deadline_ms,
+            started_at,
         )
+
+    def _session_turn(
+        self, session: Session, user_message: str
+    ) -> tuple[list[dict[str, Any]], list[dict[str, str]], str]:
+        """Matching recipes, messages to send and the user content to record for this turn."""
+        if not session.messages:
+            matching, system, user_prompt = self._prepare(user_message)
+            session.recipe_names.update(r.get("name", "") for r in matching)
+            return matching, self._messages(system, user_prompt), user_prompt
+        # follow-up: the earlier turns are resent byte for byte so ollama reuses their KV cache,
+        # and only recipes the model hasn't seen yet are added in front of the new message
+        ingredients = self._parse(user_message)
+        index = self.loader.index
+        with metrics.STAGE_SECONDS.time("retrieve"):
+            matching = self.loader.find_by_ingredients(
+                ingredients, max_results=self.max_recipe_context, index=index
+            )
+        new = [r for r in matching if r.get("name", "") not in session.recipe_names]
+        content = user_message
+        if new:
+            with metrics.STAGE_SECONDS.time("prompt"):
+                blocks = pack_recipes(new, self.prompt_token_budget or None, index.version)
+            content = (
+                "More recipes that match (use ONLY recipes from this conversation):\n\n"
+                + "\n\n".join(blocks)
+                + f"\n\n---\n\nUser message: {user_message}"
+            )
+            session.recipe_names.update(r.get("name", "") for r in new)
+        messages = session.messages + [{"role": "user", "content": content}]
+        return matching, messages, content
+
+    def _suggest_in_session(
+        self,
+        session: Session,
+        user_message: str,
+        deadline_ms: int | None,
+        started_at: float,
+    ) -> Suggestion:
+        with session.lock:
+            names = set(session.recipe_names)
+            matching, messages, content = self._session_turn(session, user_message)
+            # the reply depends on the history, so the ingredient-keyed cache is skipped
+            result = self._answer(
+                user_message, None, matching, messages, deadline_ms, started_at
+            )
+            if result.source == SOURCE_LLM:
+                if not session.messages:
+                    session.messages.append(messages[0])
+                self.sessions.record(session, content, result.text, session.recipe_names - names)
+            else:
+                # a dataset answer isn't part of the model's conversation; retry this turn next time
+                session.recipe_names = names
+            return result
+
+    def _answer(
+        self,
+        user_message: str,
+        key: str | None,
+        matching: list[dict[str, Any]],
+        messages: list[dict[str, str]],
+        deadline_ms: int | None = None,
+        started_at: float | None = None,
+    ) -> Suggestion:
+        if started_at is None:
+            started_at = time.monotonic()
+        if deadline_ms is None:
+            deadline_ms = self.deadline_ms
+        if not deadline_ms:
+            if not self.breaker.allow_request():
+                return Suggestion(self._fallback(matching, user_message, "circuit_open"), SOURCE_FALLBACK)
+            try:
+                return Suggestion(self._generate(key, messages), SOURCE_LLM)
+            except RuntimeError:
+                return Suggestion(self._fallback(matching, user_message, "error"), SOURCE_FALLBACK)
+
+        remaining = deadline_ms / 1000 - (time.monotonic() - started_at)
+        if remaining <= 0:
+            return Suggestion(self._fallback(matching, user_message, "deadline"), SOURCE_DEADLINE)
+        if not self.breaker.allow_request():
+            return Suggestion(self._fallback(matching, user_message, "circuit_open"), SOURCE_FALLBACK)
+        cancel = threading.Event()
+        future = self._background.submit(self._generate, key, messages, cancel)
         try:
-            return self._call_ollama(system, user_prompt)
+            return Suggestion(future.result(timeout=remaining), SOURCE_LLM)
+        except FutureTimeout:
+            # the generation keeps going to warm the cache unless told otherwise or the cap is reached
+            if not (self.complete_in_background and key is not None and self._keep_running(future)):
+                cancel.set()
+                future.cancel()
+            return Suggestion(self._fallback(matching, user_message, "deadline"), SOURCE_DEADLINE)
         except RuntimeError:
-            return self._fallback_response(matching, user_message)
+            return Suggestion(self._fallback(matching, user_message, "error"), SOURCE_FALLBACK)
+
+    def _keep_running(self, future: Future) -> bool:
+        with self._background_lock:
+            if self._background_running >= self.max_background:
+                metrics.BACKGROUND.inc("dropped")
+                return False
+            self._background_running += 1
+        metrics.BACKGROUND.inc("kept")
+        future.add_done_callback(self._background_done)
+        return True
+
+    def _background_done(self, future: Future) -> None:
+        with self._background_lock:
+            self._background_running -= 1
+
+    def _prepare_batch(self, messages: list[str]) -> list[Suggestion | BatchItem]:
+        # one retrieval pass for the whole batch; cache hits are answered right here
+        parsed = [self._parse(m) for m in messages]
+        keys = [self._cache_key(ingredients) for ingredients in parsed]
+        out: list[Suggestion | BatchItem | None] = [None] * len(messages)
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self._cache_get(key)
+            if cached is not None:
+                out[i] = Suggestion(cached, SOURCE_CACHE)
+            else:
+                pending.append(i)
+        index = self.loader.index
+        with metrics.STAGE_SECONDS.time("retrieve"):
+            matches = self.loader.find_by_ingredients_many(
+                [parsed[i] for i in pending], max_results=self.max_recipe_context, index=index
+            )
+        all_recipes = index.recipes if not all(matches) else None
+        for i, matching in zip(pending, matches):
+            with metrics.STAGE_SECONDS.time("prompt"):
+                system, user_prompt = build_recipe_prompt(
+                    messages[i],
+                    matching_recipes=matching,
+                    include_all_recipes=not matching,
+                    all_recipes=all_recipes if not matching else None,
+                    token_budget=self.prompt_token_budget,
+                    catalog=index.version,
+                )
+            out[i] = BatchItem(messages[i], keys[i], matching, system, user_prompt)
+        return out
+
+    async def suggest_batch_async(
+        self,
+        messages: list[str],
+        deadlines_ms: list[int | None] | None = None,
+        concurrency: int = 2,
+        priority: int = PRIORITY_BULK,
+    ) -> AsyncIterator[tuple[int, Suggestion | Exception]]:
+        """Yield (index, Suggestion or the error) in input order; identical prompts run once."""
+        prepared = await asyncio.to_thread(self._prepare_batch, messages)
+        if deadlines_ms is None:
+            deadlines_ms = [None] * len(messages)
+        gate = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item: BatchItem, deadline_ms: int | None) -> Suggestion:
+            async with gate:
+                return await self.limiter.run(
+                    self._answer,
+                    item.message,
+                    item.cache_key,
+                    item.matching,
+                    self._messages(item.system, item.user_prompt),
+                    deadline_ms,
+                    priority=priority,
+                )
+
+        shared: dict[tuple[Any, int | None], asyncio.Task] = {}
+        tasks: list[asyncio.Task | Suggestion] = []
+        for item, deadline_ms in zip(prepared, deadlines_ms):
+            if isinstance(item, Suggestion):
+                tasks.append(item)
+                continue
+            # same cache key means same normalized ingredients, so one answer serves both
+            dedupe_key = (item.cache_key or (item.system, item.user_prompt), deadline_ms)
+            if dedupe_key not in shared:
+                shared[dedupe_key] = asyncio.create_task(run(item, deadline_ms))
+            tasks.append(shared[dedupe_key])
+        try:
+            for i, task in enumerate(tasks):
+                if isinstance(task, Suggestion):
+                    yield i, task
+                    continue
+                try:
+                    yield i, await task
+                except Exception as e:
+                    yield i, e
+        finally:
+            for task in shared.values():
+                task.cancel()
+
+    def search(
+        self,
+        ingredients: list[str],
+        include: list[str] = (),
+        exclude: list[str] = (),
+        limit: int = 20,
+        min_matches: int = 1,
+        after: tuple[float, int, int] | None = None,
+        index: RecipeIndex | None = None,
+    ) -> tuple[list[tuple[int, float, int]], bool]:
+        """RecipeLoader.search with typo correction; straight from the index, no prompt and no model."""
+        index = index or self.loader.index
+        if self.fuzzy_matching:
+            resolver = index.fuzzy
+            ingredients, include, exclude = (
+                [" ".join(resolver.resolve_all(i.split())) for i in items]
+                for items in (ingredients, include, exclude)
+            )
+        with metrics.STAGE_SECONDS.time("retrieve"):
+            return self.loader.search(
+                ingredients, include, exclude, limit, min_matches, after, index
+            )
+
+    def suggest_recipe(self, user_message: str) -> str:
+        return self.suggest(user_message).text
+
+    def stream_recipe(
+        self,
+        user_message: str,
+        cancel: threading.Event | None = None,
+        session: Session | None = None,
+    ) -> Iterator[str]:
+        """Yield the reply token by token; falls back to the dataset if ollama fails up front."""
+        if session is not None:
+            with session.lock:
+                yield from self._stream_in_session(session, user_message, cancel)
+            return
+        ingredients = self._parse(user_message)
+        key = self._cache_key(ingredients)
+        cached = self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
+        matching, system, user_prompt = self._prepare(user_message, ingredients)
+        if not self.breaker.allow_request():
+            yield self._fallback(matching, user_message, "circuit_open")
+            return
+        tokens: list[str] = []
+        for token in self._stream_tokens(self._messages(system, user_prompt), matching, user_message, cancel, tokens):
+            yield token
+        # a cancelled stream is only a prefix of the answer, don't cache it
+        if key is not None and tokens and not (cancel is not None and cancel.is_set()):
+            self.cache.set(key, "".join(tokens).strip())
+
+    def _stream_tokens(
+        self,
+        messages: list[dict[str, str]],
+        matching: list[dict[str, Any]],
+        user_message: str,
+        cancel: threading.Event | None,
+        tokens: list[str],
+    ) -> Iterator[str]:
+        # model tokens are also collected into tokens; a dataset fallback is yielded but not collected
+        shared = self.flights.stream(
+            self._flight_key(messages),
+            lambda abandoned: self._guarded_stream(messages, cancel=abandoned),
+        )
+        try:
+            for token in shared:
+                if cancel is not None and cancel.is_set():
+                    break
+                tokens.append(token)
+                yield token
+        except RuntimeError:
+            if tokens:
+                raise
+            yield self._fallback(matching, user_message, "error")
+        finally:
+            shared.close()
+
+    def _stream_in_session(
+        self, session: Session, user_message: str, cancel: threading.Event | None
+    ) -> Iterator[str]:
+        names = set(session.recipe_names)
+        recorded = False
+        try:
+            matching, messages, content = self._session_turn(session, user_message)
+            if not self.breaker.allow_request():
+                yield self._fallback(matching, user_message, "circuit_open")
+                return
+            tokens: list[str] = []
+            yield from self._stream_tokens(messages, matching, user_message, cancel, tokens)
+            if tokens and not (cancel is not None and cancel.is_set()):
+                if not session.messages:
+                    session.messages.append(messages[0])
+                self.sessions.record(
+                    session, content, "".join(tokens).strip(), session.recipe_names - names
+                )
+                recorded = True
+        finally:
+            # an unfinished turn leaves the session as it was
+            if not recorded:
+                session.recipe_names = names
+
+    async def suggest_async(
+        self,
+        user_message: str,
+        deadline_ms: int | None = None,
+        session: Session | None = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Suggestion:
+        """Run suggest on the bounded worker pool without blocking the loop."""
+        # the deadline clock starts before queueing for a slot
+        started_at = time.monotonic()
+        budget = self.deadline_ms if deadline_ms is None else deadline_ms
+        deadline = started_at + budget / 1000 if budget else None
+        try:
+            return await self.limiter.run(
+                self.suggest,
+                user_message,
+                deadline_ms,
+                started_at,
+                session,
+                priority=priority,
+                deadline=deadline,
+            )
+        except DeadlineUnreachableError:
+            # no point queueing for a generation that can't finish in time
+            return await asyncio.to_thread(self._shed_answer, user_message)
+
+    def _shed_answer(self, user_message: str) -> Suggestion:
+        ingredients = self._parse(user_message)
+        cached = self._cache_get(self._cache_key(ingredients))
+        if cached is not None:
+            return Suggestion(cached, SOURCE_CACHE)
+        with metrics.STAGE_SECONDS.time("retrieve"):
+            matching = self.loader.find_by_ingredients(
+                ingredients, max_results=self.max_recipe_context
+            )
+        return Suggestion(self._fallback(matching, user_message, "shed"), SOURCE_DEADLINE)
+
+    async def suggest_recipe_async(self, user_message: str) -> str:
+        return (await self.suggest_async(user_message)).text
+
+    async def stream_recipe_async(
+        self,
+        user_message: str,
+        session: Session | None = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> TokenStream:
+        # the slot is taken here so a full queue surfaces before any bytes are sent
+        await self.limiter.acquire(priority)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancel = threading.Event()
+
+        def produce() -> None:
+            try:
+                for token in self.stream_recipe(user_message, cancel=cancel, session=session):
+                    loop.call_soon_threadsafe(queue.put_nowait, token)
+                    if cancel.is_set():
+                        break
+                loop.call_soon_threadsafe(queue.put_nowait, _END)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        try:
+            future = self.limiter.submit(produce)
+        except BaseException:
+            self.limiter.release()
+            raise
+        future.add_done_callback(lambda _: self.limiter.release())
+        return TokenStream(queue, cancel)
+
+    def close(self) -> None:
+        self.limiter.shutdown()
+        self._background.shutdown(wait=False, cancel_futures=True)
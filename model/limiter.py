@@ -0,0 +1,207 @@
+# bounded worker pool for the blocking ollama calls so the event loop stays free;
+# waiting requests are admitted by priority class and shed early when they can't make their deadline
+
+import asyncio
+import functools
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from model import metrics
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+# header / config names for the classes; lower value is served first
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+_PRIORITY_NAMES = {v: k for k, v in PRIORITIES.items()}
+
+
+def priority_name(priority: int) -> str:
+    return _PRIORITY_NAMES.get(priority, str(priority))
+
+
+class InferenceBusyError(RuntimeError):
+    """Raised when no inference slot frees up in time; carries a Retry-After hint."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class DeadlineUnreachableError(InferenceBusyError):
+    """The queue ahead is long enough that the request would miss its deadline anyway."""
+
+
+class InferenceLimiter:
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="inference"
+        )
+        # (priority, arrival order, future); release() hands the slot to the head
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._running = 0
+        # moving average of how long a slot is held, for deadline shedding; None until measured
+        self._service_time: float | None = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def depth(self) -> dict[tuple[str], int]:
+        counts = {(name,): 0 for name in PRIORITIES}
+        for priority, _, _ in self._waiters:
+            key = (priority_name(priority),)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def expected_wait(self, priority: int = PRIORITY_INTERACTIVE) -> float | None:
+        """Rough time until a new request of this class would get a slot."""
+        if self._running < self.max_concurrency and not self._waiters:
+            return 0.0
+        if self._service_time is None:
+            return None
+        ahead = sum(1 for p, _, _ in self._waiters if p <= priority)
+        return (ahead + 1) / self.max_concurrency * self._service_time
+
+    def _shed(self, reason: str, priority: int) -> None:
+        metrics.SHED.inc(reason, priority_name(priority))
+
+    async def acquire(
+        self, priority: int = PRIORITY_INTERACTIVE, deadline: float | None = None
+    ) -> None:
+        """Wait for a slot; deadline is a time.monotonic() instant the request is useless after."""
+        arrived = time.monotonic()
+        if self._running < self.max_concurrency and not self._waiters:
+            self._running += 1
+            metrics.QUEUE_WAIT_SECONDS.observe(0.0, priority_name(priority))
+            return
+        if deadline is not None:
+            expected = self.expected_wait(priority)
+            if expected is not None and arrived + expected > deadline:
+                self._shed("deadline", priority)
+                raise DeadlineUnreachableError(
+                    "Inference queue too long to meet the deadline", expected
+                )
+        if len(self._waiters) >= self.max_queue:
+            # a full queue makes room by dropping its newest lowest-priority entry, if that ranks below us
+            worst = max(self._waiters, default=None)
+            if worst is None or worst[0] <= priority:
+                self._shed("queue_full", priority)
+                raise InferenceBusyError(
+                    "Inference queue is full, try again shortly", self.queue_timeout
+                )
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            self._shed("displaced", worst[0])
+            worst[2].set_exception(
+                InferenceBusyError(
+                    "Displaced from the inference queue by higher-priority requests",
+                    self.queue_timeout,
+                )
+            )
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - arrived, 0.0))
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._order), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except BaseException:
+            self._abandon(entry)
+            raise
+        if not future.done():
+            self._abandon(entry)
+            if deadline is not None and deadline - arrived <= self.queue_timeout:
+                self._shed("deadline", priority)
+                raise DeadlineUnreachableError(
+                    "Deadline passed while waiting for an inference slot", self.queue_timeout
+                )
+            self._shed("timeout", priority)
+            raise InferenceBusyError(
+                "Timed out waiting for an inference slot", self.queue_timeout
+            )
+        # raises if we were displaced; otherwise release() already counted us as running
+        future.result()
+        metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - arrived, priority_name(priority))
+
+    def _abandon(self, entry: tuple[int, int, asyncio.Future]) -> None:
+        future = entry[2]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # the slot was handed over just as we gave up; pass it on
+            self.release()
+            return
+        future.cancel()
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _observe_service(self, seconds: float) -> None:
+        if self._service_time is None:
+            self._service_time = seconds
+        else:
+            self._service_time += 0.2 * (seconds - self._service_time)
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+        # caller must already hold a slot
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(
+        self,
+        fn: Callable[..., T],
+        *args: Any,
+        priority: int = PRIORITY_INTERACTIVE,
+        deadline: float | None = None,
+        **kwargs: Any,
+    ) -> T:
+        await self.acquire(priority, deadline)
+        started = time.monotonic()
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.release()
+            raise
+
+        def done(_: "asyncio.Future[T]") -> None:
+            self._observe_service(time.monotonic() - started)
+            self.release()
+
+        # the slot is held until fn returns, even if the awaiting request is cancelled first
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,398 @@
+# the fine-tuned LoRA model served in-process: adapter merged once at load, concurrent requests
+# decoded together in shared forward passes (continuous batching), answers shaped like ollama's
+
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+# turn markers from training.train.format_prompt; the reply ends where the model starts a new turn
+_STOP_MARKERS = ("<|user|>", "<|assistant|>", "<|system|>")
+_END = object()
+
+
+def _import_transformers():
+    try:
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache
+    except ImportError as e:
+        raise RuntimeError(
+            "Local model backend needs torch and transformers. Run: pip install torch transformers peft"
+        ) from e
+    return torch, AutoModelForCausalLM, AutoTokenizer, DynamicCache
+
+
+def render_prompt(messages: list[dict[str, str]]) -> str:
+    # same layout the adapter was trained on, plus a system turn, ending where the reply begins
+    parts = []
+    for m in messages:
+        role = m.get("role", "")
+        if role in ("system", "user", "assistant"):
+            parts.append(f"<|{role}|>\n{m.get('content', '')}\n")
+    parts.append("<|assistant|>\n")
+    return "".join(parts)
+
+
+def _held_back(text: str) -> int:
+    # trailing characters that might be a half-decoded character or the start of a stop marker
+    hold = len(text) - len(text.rstrip("\ufffd"))
+    for marker in _STOP_MARKERS:
+        for n in range(len(marker) - 1, 0, -1):
+            if text.endswith(marker[:n]):
+                hold = max(hold, n)
+                break
+    return hold
+
+
+class GenerationRequest:
+    """One prompt in the batch; text pieces arrive on events, then _END or the exception."""
+
+    def __init__(self, prompt_ids: list[int], max_new_tokens: int, temperature: float) -> None:
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.output_ids: list[int] = []
+        self.events: queue.Queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.sent = 0
+        self.done_reason: str | None = None
+        self.prompt_eval_ns = 0
+        self.eval_ns = 0
+
+    def emit(self, text: str) -> None:
+        if len(text) > self.sent:
+            self.events.put(text[self.sent:])
+            self.sent = len(text)
+
+    def finish(self, reason: str) -> None:
+        self.done_reason = reason
+        self.events.put(_END)
+
+    def fail(self, error: BaseException) -> None:
+        self.done_reason = "error"
+        self.events.put(error)
+
+
+class LocalModel:
+    """Base model with the adapter merged in, driven by one decoding thread shared by all requests."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        base_model: str | None = None,
+        device: str = "cpu",
+        max_batch: int = 4,
+        max_new_tokens: int = 256,
+        temperature: float = 0.7,
+    ) -> None:
+        self.path = Path(path)
+        self.base_model = base_model
+        self.device = device
+        self.max_batch = max(1, max_batch)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.name = self.path.name
+        self._load_lock = threading.Lock()
+        self._model: Any = None
+        self._tokenizer: Any = None
+        self._pending: queue.Queue[GenerationRequest] = queue.Queue()
+        # batch state, only touched by the decoding thread: per-layer (keys, values) with the
+        # prompts left-padded to a common length, the matching attention mask and the next input token
+        self._active: list[GenerationRequest] = []
+        self._kv: list[tuple[Any, Any]] | None = None
+        self._mask: Any = None
+        self._next: Any = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            torch, AutoModelForCausalLM, AutoTokenizer, DynamicCache = _import_transformers()
+            adapter_config = self.path / "adapter_config.json"
+            if adapter_config.exists():
+                try:
+                    from peft import PeftModel
+                except ImportError as e:
+                    raise RuntimeError("Loading a LoRA adapter needs peft. Run: pip install peft") from e
+                base = self.base_model or json.loads(adapter_config.read_text(encoding="utf-8"))[
+                    "base_model_name_or_path"
+                ]
+                model = AutoModelForCausalLM.from_pretrained(base, trust_remote_code=True)
+                # merged once here, so every forward pass is a plain model call without the LoRA matmuls
+                model = PeftModel.from_pretrained(model, str(self.path)).merge_and_unload()
+                has_tokenizer = (self.path / "tokenizer_config.json").exists()
+                tokenizer = AutoTokenizer.from_pretrained(str(self.path) if has_tokenizer else base)
+            else:
+                model = AutoModelForCausalLM.from_pretrained(str(self.path), trust_remote_code=True)
+                tokenizer = AutoTokenizer.from_pretrained(str(self.path))
+            model.to(self.device).eval()
+            self._torch = torch
+            self._cache_class = DynamicCache
+            self._tokenizer = tokenizer
+            eos = model.generation_config.eos_token_id
+            if eos is None:
+                eos = tokenizer.eos_token_id
+            self._eos_ids = set(eos if isinstance(eos, list) else [eos] if eos is not None else [])
+            self._max_positions = getattr(model.config, "max_position_embeddings", None) or 2048
+            self._model = model
+            threading.Thread(target=self._loop, name="local-llm", daemon=True).start()
+
+    def submit(self, messages: list[dict[str, str]], options: dict[str, Any]) -> GenerationRequest:
+        self.load()
+        max_new = int(options.get("num_predict") or self.max_new_tokens)
+        max_new = max(1, min(max_new, self._max_positions - 1))
+        ids = self._tokenizer(render_prompt(messages))["input_ids"]
+        # an over-long prompt keeps its end, where the question is
+        ids = ids[-(self._max_positions - max_new):]
+        request = GenerationRequest(ids, max_new, float(options.get("temperature", self.temperature)))
+        self._pending.put(request)
+        return request
+
+    def _loop(self) -> None:
+        while True:
+            # block only when there is nothing to decode; otherwise join whoever is waiting
+            admitted = [] if self._active else [self._pending.get()]
+            while len(self._active) + len(admitted) < self.max_batch:
+                try:
+                    admitted.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            for request in admitted:
+                if request.cancelled.is_set():
+                    request.finish("cancelled")
+                    continue
+                try:
+                    self._prefill(request)
+                except Exception as e:
+                    request.fail(e)
+            if not self._active:
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                for request in self._active:
+                    request.fail(e)
+                self._reset()
+
+    def _prefill(self, request: GenerationRequest) -> None:
+        torch = self._torch
+        started = time.perf_counter_ns()
+        with torch.no_grad():
+            out = self._model(
+                input_ids=torch.tensor([request.prompt_ids], device=self.device), use_cache=True
+            )
+        request.prompt_eval_ns = time.perf_counter_ns() - started
+        token = self._sample(out.logits[:, -1], [request])[0]
+        if not self._advance(request, token):
+            return
+        layers = _cache_layers(out.past_key_values)
+        mask = torch.ones((1, len(request.prompt_ids)), dtype=torch.long, device=self.device)
+        nxt = torch.tensor([token], device=self.device)
+        if self._kv is None:
+            self._kv, self._mask, self._next = layers, mask, nxt
+        else:
+            # left-pad whichever side is shorter so every row ends at the same cache position
+            width, length = self._mask.shape[1], mask.shape[1]
+            if length < width:
+                layers = [(_left_pad(k, width - length), _left_pad(v, width - length)) for k, v in layers]
+                mask = torch.nn.functional.pad(mask, (width - length, 0))
+            elif length > width:
+                self._kv = [(_left_pad(k, length - width), _left_pad(v, length - width)) for k, v in self._kv]
+                self._mask = torch.nn.functional.pad(self._mask, (length - width, 0))
+            self._kv = [
+                (torch.cat([k0, k1]), torch.cat([v0, v1])) for (k0, v0), (k1, v1) in zip(self._kv, layers)
+            ]
+            self._mask = torch.cat([self._mask, mask])
+            self._next = torch.cat([self._next, nxt])
+        self._active.append(request)
+
+    def _step(self) -> None:
+        """One forward pass for every active request, each getting its next token."""
+        torch = self._torch
+        cache = self._cache_class()
+        for i, (k, v) in enumerate(self._kv):
+            cache.update(k, v, i)
+        # padding doesn't count toward positions, so each row continues from its own prompt length
+        positions = self._mask.sum(dim=1, keepdim=True)
+        mask = torch.nn.functional.pad(self._mask, (0, 1), value=1)
+        started = time.perf_counter_ns()
+        with torch.no_grad():
+            out = self._model(
+                input_ids=self._next[:, None],
+                attention_mask=mask,
+                position_ids=positions,
+                past_key_values=cache,
+                use_cache=True,
+            )
+        elapsed = time.perf_counter_ns() - started
+        self._kv = _cache_layers(out.past_key_values)
+        self._mask = mask
+        tokens = self._sample(out.logits[:, -1], self._active)
+        keep = []
+        for i, (request, token) in enumerate(zip(self._active, tokens)):
+            request.eval_ns += elapsed
+            if request.cancelled.is_set():
+                request.finish("cancelled")
+            elif self._advance(request, token):
+                keep.append(i)
+        self._next = torch.tensor(tokens, device=self.device)
+        if len(keep) < len(self._active):
+            self._retain(keep)
+
+    def _retain(self, keep: list[int]) -> None:
+        if not keep:
+            self._reset()
+            return
+        torch = self._torch
+        index = torch.tensor(keep, device=self.device)
+        mask = self._mask.index_select(0, index)
+        # columns that are padding in every remaining row are dropped
+        start = int(mask.any(dim=0).nonzero()[0])
+        self._mask = mask[:, start:]
+        self._kv = [
+            (k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+            for k, v in self._kv
+        ]
+        self._next = self._next.index_select(0, index)
+        self._active = [self._active[i] for i in keep]
+
+    def _reset(self) -> None:
+        self._active = []
+        self._kv = self._mask = self._next = None
+
+    def _sample(self, logits: Any, requests: list[GenerationRequest]) -> list[int]:
+        torch = self._torch
+        greedy = logits.argmax(dim=-1).tolist()
+        tokens = []
+        for i, request in enumerate(requests):
+            if request.temperature <= 0:
+                tokens.append(greedy[i])
+                continue
+            probs = torch.softmax(logits[i].float() / request.temperature, dim=-1)
+            tokens.append(int(torch.multinomial(probs, 1)))
+        return tokens
+
+    def _advance(self, request: GenerationRequest, token: int) -> bool:
+        """Record a sampled token and stream the text it completes; False once the request is done."""
+        if token in self._eos_ids:
+            request.finish("stop")
+            return False
+        request.output_ids.append(token)
+        text = self._tokenizer.decode(request.output_ids, skip_special_tokens=True)
+        cuts = [i for i in (text.find(m) for m in _STOP_MARKERS) if i >= 0]
+        if cuts:
+            request.emit(text[: min(cuts)].rstrip())
+            request.finish("stop")
+            return False
+        total = len(request.prompt_ids) + len(request.output_ids)
+        if len(request.output_ids) >= request.max_new_tokens or total >= self._max_positions:
+            request.emit(text)
+            request.finish("length")
+            return False
+        request.emit(text[: len(text) - _held_back(text)])
+        return True
+
+
+def _cache_layers(cache: Any) -> list[tuple[Any, Any]]:
+    # DynamicCache keeps layers[i].keys/.values on transformers 5, key_cache/value_cache lists before that
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        return [(layer.keys, layer.values) for layer in layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(k, v) for k, v in cache]
+
+
+def _left_pad(tensor: Any, n: int) -> Any:
+    import torch
+
+    # (batch, heads, seq, dim): zeros in front of the sequence axis
+    return torch.nn.functional.pad(tensor, (0, 0, n, 0))
+
+
+class LocalChatClient:
+    """Stands in for ollama.Client (chat and list) so the engine and BackendPool work unchanged."""
+
+    def __init__(self, model: LocalModel) -> None:
+        self.model = model
+
+    def chat(
+        self,
+        model: str | None = None,
+        messages: list[dict[str, str]] | None = None,
+        stream: bool = False,
+        options: dict[str, Any] | None = None,
+        **_: Any,
+    ) -> Any:
+        if not messages:
+            # like ollama, an empty chat just makes sure the model is loaded
+            self.model.load()
+            response = {
+                "model": self.model.name,
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "load",
+            }
+            return iter([response]) if stream else response
+        request = self.model.submit(messages, options or {})
+        chunks = self._chunks(request)
+        if stream:
+            return chunks
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk["message"]["content"])
+        return {**chunk, "message": {"role": "assistant", "content": "".join(parts)}}
+
+    # defined after chat so the name doesn't shadow the builtin in its annotations
+    def list(self) -> dict[str, Any]:
+        self.model.load()
+        return {"models": [{"model": self.model.name}]}
+
+    def _chunks(self, request: GenerationRequest) -> Iterator[dict[str, Any]]:
+        try:
+            while True:
+                item = request.events.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield {
+                    "model": self.model.name,
+                    "message": {"role": "assistant", "content": item},
+                    "done": False,
+                }
+            yield {
+                "model": self.model.name,
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": request.done_reason,
+                "prompt_eval_count": len(request.prompt_ids),
+                "eval_count": len(request.output_ids),
+                "prompt_eval_duration": request.prompt_eval_ns,
+                "eval_duration": request.eval_ns,
+            }
+        finally:
+            # closing the stream early (client gone, cancelled race) stops the decoding for it
+            request.cancelled.set()
+
+
+def local_client(
+    path: str | None,
+    base_model: str | None = None,
+    device: str = "cpu",
+    max_batch: int = 4,
+    max_new_tokens: int = 256,
+    temperature: float = 0.7,
+) -> LocalChatClient:
+    """client_factory for BackendPool; the backend "url" is the adapter (or merged model) directory."""
+    if path is None:
+        raise RuntimeError("Local model backend needs a model path (LOCAL_MODEL_PATH)")
+    return LocalChatClient(
+        LocalModel(path, base_model, device, max_batch, max_new_tokens, temperature)
+    )
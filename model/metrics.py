@@ -0,0 +1,211 @@
+# tiny prometheus-style metrics; everything is a no-op until enable() is called
+
+import contextlib
+import threading
+import time
+from typing import Any, Callable
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_enabled = False
+_NOOP = contextlib.nullcontext()
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback, so the hot path never touches it."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._fn: Callable[[], Any] | None = None
+
+    def set_function(self, fn: Callable[[], Any] | None) -> None:
+        # with labels, fn returns {label values tuple: value}
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        if self._fn is None:
+            return []
+        if not self.label_names:
+            return [f"{self.name} {_num(self._fn())}"]
+        items = sorted(self._fn().items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def time(self, *labels: str):
+        if not _enabled:
+            return _NOOP
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for labels, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = _labels(self.label_names, labels, f'le="{_num(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {_num(cumulative)}")
+            le = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {_num(row[-1])}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_num(row[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {_num(row[-1])}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_start")
+
+    def __init__(self, hist: Histogram, labels: tuple[str, ...]) -> None:
+        self._hist = hist
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._hist.observe(time.perf_counter() - self._start, *self._labels)
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in REGISTRY:
+        body = metric.render()
+        if body:
+            lines.extend(metric.header())
+            lines.extend(body)
+    return "\n".join(lines) + "\n"
+
+
+# pipeline metrics shared by the engine and the API
+STAGE_SECONDS = Histogram(
+    "recipe_stage_seconds",
+    "Time spent in each request stage (parse, retrieve, prompt, ollama_ttft, ollama_total, fallback)",
+    labels=("stage",),
+)
+REQUESTS = Counter("recipe_requests_total", "Replies by answering path", labels=("source",))
+FALLBACKS = Counter("recipe_fallbacks_total", "Dataset fallbacks by reason", labels=("reason",))
+ERRORS = Counter("recipe_errors_total", "Inference errors by kind", labels=("kind",))
+SEARCHES = Counter("recipe_search_requests_total", "/recipes/search responses", labels=("result",))
+BACKGROUND = Counter(
+    "recipe_background_generations_total",
+    "Generations past their deadline, kept running for the cache or dropped at the cap",
+    labels=("result",),
+)
+CACHE = Counter("recipe_cache_requests_total", "Response cache lookups", labels=("result",))
+TOKENS = Counter("recipe_tokens_total", "Tokens reported by ollama", labels=("type",))
+QUEUE_WAITING = Gauge("recipe_inference_waiting", "Requests waiting for an inference slot")
+QUEUE_RUNNING = Gauge("recipe_inference_running", "Requests holding an inference slot")
+QUEUE_DEPTH = Gauge(
+    "recipe_inference_queue_depth", "Requests waiting for a slot by priority class", labels=("priority",)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "recipe_inference_queue_wait_seconds",
+    "Time from arrival to getting an inference slot",
+    labels=("priority",),
+)
+SHED = Counter(
+    "recipe_shed_total",
+    "Requests turned away before inference (queue_full, displaced, timeout, deadline, rate_limited)",
+    labels=("reason", "priority"),
+)
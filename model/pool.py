@@ -0,0 +1,209 @@
+# several ollama hosts behind one engine: least-outstanding routing, ejection and health checks
+
+import itertools
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Protocol
+
+
+class ChatClient(Protocol):
+    """What a backend's client provides: the chat() and list() of ollama.Client (see model.local_llm)."""
+
+    def chat(
+        self,
+        model: str,
+        messages: list[dict[str, str]],
+        stream: bool = False,
+        options: dict[str, Any] | None = None,
+        keep_alive: str | None = None,
+    ) -> Any: ...
+
+    # after chat, so the name doesn't shadow the builtin in its annotations
+    def list(self) -> Any: ...
+
+
+class NoBackendError(RuntimeError):
+    pass
+
+
+def ollama_client(url: str | None) -> ChatClient:
+    try:
+        import ollama
+    except ImportError as e:
+        raise RuntimeError(
+            "Ollama Python client not installed. Run: pip install ollama"
+        ) from e
+    return ollama.Client(host=url)
+
+
+class Backend:
+    def __init__(self, url: str | None, client_factory: Callable[[str | None], ChatClient]) -> None:
+        # url None means the client's own default (OLLAMA_HOST or localhost)
+        self.url = url
+        self._client_factory = client_factory
+        self._client: ChatClient | None = None
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        # models the host reported on its last health check; None until checked
+        self.models: frozenset[str] | None = None
+
+    @property
+    def client(self) -> ChatClient:
+        # created on first use; each client keeps its own connection pool to this host
+        if self._client is None:
+            self._client = self._client_factory(self.url)
+        return self._client
+
+    @property
+    def name(self) -> str:
+        return self.url or "default"
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class BackendPool:
+    """Routes each call to the available backend with the fewest requests in flight."""
+
+    def __init__(
+        self,
+        urls: list[str | None],
+        client_factory: Callable[[str | None], ChatClient] = ollama_client,
+        failure_threshold: int = 2,
+        eject_seconds: float = 10.0,
+        model_affinity: bool = False,
+    ) -> None:
+        if not urls:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = [Backend(url, client_factory) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.model_affinity = model_affinity
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def _pick(
+        self, model: str | None, affinity: str | None, exclude: set[int]
+    ) -> Backend:
+        now = time.monotonic()
+        candidates = [
+            b for i, b in enumerate(self.backends) if i not in exclude and b.available(now)
+        ]
+        if not candidates:
+            raise NoBackendError("No healthy Ollama backend available")
+        if self.model_affinity and model is not None:
+            model = _tag(model)
+            # hosts that don't report the model are only used when none does
+            serving = [b for b in candidates if b.models is None or model in b.models]
+            if any(b.models is not None for b in serving):
+                serving = [b for b in serving if b.models is not None]
+            candidates = serving or candidates
+        least = min(b.outstanding for b in candidates)
+        if affinity is not None:
+            # same prompt prefix -> same host, whose KV cache already holds it, unless it's clearly busier
+            home = self.backends[zlib.crc32(affinity.encode("utf-8")) % len(self.backends)]
+            if home in candidates and home.outstanding <= least + 1:
+                return home
+        idle = [b for b in candidates if b.outstanding == least]
+        return idle[next(self._turn) % len(idle)]
+
+    @contextmanager
+    def lease(
+        self,
+        model: str | None = None,
+        affinity: str | None = None,
+        exclude: set[int] | None = None,
+    ) -> Iterator[Backend]:
+        """Hold a backend for one request; an exception marks it failed before re-raising."""
+        with self._lock:
+            backend = self._pick(model, affinity, exclude or set())
+            backend.outstanding += 1
+        try:
+            yield backend
+        except BaseException as e:
+            self._release(backend, failed=isinstance(e, Exception))
+            raise
+        self._release(backend, failed=False)
+
+    def _release(self, backend: Backend, failed: bool) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if not failed:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    def index(self, backend: Backend) -> int:
+        return self.backends.index(backend)
+
+    def has_ejected(self) -> bool:
+        now = time.monotonic()
+        return any(not b.available(now) for b in self.backends)
+
+    def needs_check(self) -> bool:
+        """True while a host is ejected or, with model affinity, hasn't reported its models yet."""
+        if self.has_ejected():
+            return True
+        return self.model_affinity and any(b.models is None for b in self.backends)
+
+    def check(self, force: bool = False) -> bool:
+        """Ping ejected backends (all of them if force) and bring back the ones that answer."""
+        now = time.monotonic()
+        for backend in self.backends:
+            needs_models = self.model_affinity and backend.models is None
+            if not force and backend.available(now) and not needs_models:
+                continue
+            try:
+                listing = backend.client.list()
+            except Exception:
+                with self._lock:
+                    backend.failures = max(backend.failures, self.failure_threshold)
+                    backend.ejected_until = time.monotonic() + self.eject_seconds
+                continue
+            models = frozenset(_model_names(listing))
+            with self._lock:
+                backend.models = models
+                backend.failures = 0
+                backend.ejected_until = 0.0
+        now = time.monotonic()
+        return any(b.available(now) for b in self.backends)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": b.name,
+                    "healthy": b.available(now),
+                    "outstanding": b.outstanding,
+                    "failures": b.failures,
+                    "models": sorted(b.models) if b.models is not None else None,
+                }
+                for b in self.backends
+            ]
+
+
+def _model_names(listing: Any) -> list[str]:
+    # ollama returns {"models": [{"model": ..} or {"name": ..}]}, as dicts or typed objects
+    models = listing.get("models", []) if isinstance(listing, dict) else getattr(listing, "models", [])
+    names = []
+    for m in models or []:
+        if isinstance(m, dict):
+            name = m.get("model") or m.get("name")
+        else:
+            name = getattr(m, "model", None) or getattr(m, "name", None)
+        if name:
+            names.append(_tag(name))
+    return names
+
+
+def _tag(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
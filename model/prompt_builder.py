@@ -1,18 +1,130 @@
 # build the prompt we send to the model (recipe list + user message)
 
-from typing import Any
+import threading
+from collections import OrderedDict
+from typing import Any, Sequence
 
 
 SYSTEM_PROMPT = """You are a helpful recipe assistant. You suggest recipes ONLY from the provided recipe list. Do not invent or hallucinate recipes. If the user's ingredients match one or more recipes below, recommend the best match(es) and briefly explain why. If no recipe matches well, say so politely and suggest they try different ingredients from the list. Keep responses concise and structured."""
 
 
-def format_recipe_for_prompt(recipe: dict[str, Any]) -> str:
+# rough but stable: llama-style tokenizers average about 4 characters per token on English text
+CHARS_PER_TOKEN = 4
+# below this many tokens a truncated instruction is useless, so the recipe is left out instead
+MIN_INSTRUCTION_TOKENS = 24
+FALLBACK_RECIPES = 15
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, preferring a sentence or word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[: max(limit - 1, 0)]
+    end = cut.rfind(". ")
+    if end >= limit // 2:
+        return cut[: end + 1]
+    space = cut.rfind(" ")
+    if space > 0:
+        cut = cut[:space]
+    return cut.rstrip(",;:") + "…"
+
+
+def format_recipe_for_prompt(
+    recipe: dict[str, Any], max_instruction_tokens: int | None = None
+) -> str:
     name = recipe.get("name", "Unknown")
     ingredients = recipe.get("ingredients", [])
     instructions = recipe.get("instructions", "")
+    if max_instruction_tokens is not None:
+        instructions = truncate_to_tokens(instructions, max_instruction_tokens)
     return f"- **{name}**\n  Ingredients: {', '.join(ingredients)}\n  Instructions: {instructions}"
 
 
+class _RenderCache:
+    """Full prompt text per recipe, keyed by catalog version and recipe name.
+
+    Store-backed recipes come back as fresh dicts once the store's decode cache evicts them, so
+    the key can't be object identity.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._items: OrderedDict[tuple[str, str], tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, recipe: dict[str, Any], catalog: str | None) -> tuple[str, int]:
+        # without a catalog version there is nothing stable to key on
+        key = (catalog, recipe.get("name", "")) if catalog is not None else None
+        if key is not None:
+            with self._lock:
+                entry = self._items.get(key)
+                if entry is not None:
+                    self._items.move_to_end(key)
+                    return entry
+        text = format_recipe_for_prompt(recipe)
+        entry = (text, estimate_tokens(text))
+        if key is not None:
+            with self._lock:
+                self._items[key] = entry
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_rendered = _RenderCache()
+
+
+def clear_render_cache() -> None:
+    _rendered.clear()
+
+
+_USER_SUFFIX = "Respond with a helpful recipe suggestion based only on the recipes above."
+# headers and separators around the recipe list, counted against the budget up front
+_FRAME_TOKENS = estimate_tokens(
+    "No recipes matched the user's ingredients exactly. "
+    "Here is a subset of available recipes for reference:\n\n"
+    "\n\n---\n\nUser message: \n\n" + _USER_SUFFIX
+)
+
+
+def pack_recipes(
+    recipes: Sequence[dict[str, Any]], budget: int | None, catalog: str | None = None
+) -> list[str]:
+    """Rendered recipes in rank order until the token budget runs out; the one that overflows is truncated."""
+    # catalog is the version the recipes came from; renders are cached per (catalog, name)
+    blocks: list[str] = []
+    remaining = budget
+    for recipe in recipes:
+        text, tokens = _rendered.get(recipe, catalog)
+        # blocks are joined by a blank line
+        cost = tokens + (1 if blocks else 0)
+        if remaining is None or cost <= remaining:
+            blocks.append(text)
+            if remaining is not None:
+                remaining -= cost
+            continue
+        instructions = recipe.get("instructions", "")
+        header = cost - estimate_tokens(instructions)
+        room = remaining - header
+        if not blocks:
+            # the best match always goes in, even if that overshoots a tiny budget
+            room = max(room, MIN_INSTRUCTION_TOKENS)
+        if room >= MIN_INSTRUCTION_TOKENS:
+            blocks.append(format_recipe_for_prompt(recipe, max_instruction_tokens=room))
+        break
+    return blocks
+
+
 def format_recipe_for_response(recipe: dict[str, Any]) -> str:
     """Single recipe as plain text for fallback response."""
     name = recipe.get("name", "Unknown")
@@ -29,21 +141,26 @@ def build_recipe_prompt(
     user_message: str,
     matching_recipes: list[dict[str, Any]],
     include_all_recipes: bool = False,
-    all_recipes: list[dict[str, Any]] | None = None,
+    all_recipes: Sequence[dict[str, Any]] | None = None,
+    token_budget: int | None = None,
+    catalog: str | None = None,
 ) -> tuple[str, str]:
+    # token_budget caps the whole prompt (system + user); recipes get what the fixed text leaves
     system = SYSTEM_PROMPT
+    budget = None
+    if token_budget:
+        fixed = estimate_tokens(system) + estimate_tokens(user_message) + _FRAME_TOKENS
+        budget = max(token_budget - fixed, 0)
 
     if matching_recipes:
-        recipe_text = "\n\n".join(format_recipe_for_prompt(r) for r in matching_recipes)
+        recipe_text = "\n\n".join(pack_recipes(matching_recipes, budget, catalog))
         context = (
             "Here are the recipes that match the user's ingredients (use ONLY these):\n\n"
             + recipe_text
         )
     else:
         if include_all_recipes and all_recipes:
-            recipe_text = "\n\n".join(
-                format_recipe_for_prompt(r) for r in all_recipes[:15]
-            )
+            recipe_text = "\n\n".join(pack_recipes(all_recipes[:FALLBACK_RECIPES], budget, catalog))
             context = (
                 "No recipes matched the user's ingredients exactly. "
                 "Here is a subset of available recipes for reference:\n\n"
@@ -55,6 +172,6 @@ def build_recipe_prompt(
                 "Politely tell the user and suggest they try different ingredients."
             )
 
-    user_prompt = f"{context}\n\n---\n\nUser message: {user_message}\n\nRespond with a helpful recipe suggestion based only on the recipes above."
+    user_prompt = f"{context}\n\n---\n\nUser message: {user_message}\n\n{_USER_SUFFIX}"
 
     return system, user_prompt
@@ -0,0 +1,52 @@
+# per-client token buckets so one caller can't take every inference slot
+
+import time
+from collections import OrderedDict
+
+from model.limiter import InferenceBusyError
+
+
+class RateLimitedError(InferenceBusyError):
+    status_code = 429
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self.tokens = tokens
+        self.updated = now
+
+
+class ClientRateLimiter:
+    """Each client refills at rate_per_minute up to burst; only touched from the event loop."""
+
+    def __init__(
+        self, rate_per_minute: float, burst: int = 10, max_clients: int = 10000
+    ) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        # least recently seen clients are forgotten first (a forgotten client starts full)
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def check(self, client: str, cost: int = 1) -> None:
+        """Take cost tokens from the client's bucket or raise RateLimitedError."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        cost = min(max(cost, 1), self.burst)
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.burst, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens < cost:
+            raise RateLimitedError(
+                "Rate limit exceeded, slow down", (cost - bucket.tokens) / self.rate
+            )
+        bucket.tokens -= cost
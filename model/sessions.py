@@ -0,0 +1,124 @@
+# multi-turn chat sessions: message history kept server side, evicted by LRU, TTL and total size
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class Session:
+    """One conversation. History grows at the end so the prompt prefix stays identical between turns.
+
+    Past max_turns the oldest follow-up is cut out of the middle; the turn after a trim only
+    reuses the cached prefix up to the first exchange and pays to re-read the rest once.
+    """
+
+    def __init__(self, session_id: str) -> None:
+        self.id = session_id
+        self.messages: list[dict[str, str]] = []
+        # recipes already put in front of the model, so follow-ups only add new ones
+        self.recipe_names: set[str] = set()
+        # recipes each turn added to the conversation, so a trimmed turn takes its recipes with it
+        self.turn_recipes: list[set[str]] = []
+        self.turns = 0
+        self.size = 0
+        self.last_used = time.time()
+        # one turn at a time; a second request for the same session waits its turn
+        self.lock = threading.Lock()
+
+    def append_turn(
+        self, user: str, assistant: str, max_turns: int = 0, recipes: set[str] | None = None
+    ) -> None:
+        self.messages.append({"role": "user", "content": user})
+        self.messages.append({"role": "assistant", "content": assistant})
+        self.turn_recipes.append(set(recipes or ()))
+        self.turns += 1
+        # keep the system prompt and first exchange (the recipe context), drop the oldest follow-ups;
+        # recipes only that follow-up showed are forgotten too, so a later turn sends them again
+        while max_turns and self.turns > max_turns and len(self.messages) > 5:
+            del self.messages[3:5]
+            self.recipe_names -= self.turn_recipes.pop(1)
+            self.turns -= 1
+        self.size = sum(len(m["content"].encode("utf-8")) for m in self.messages)
+
+
+class SessionStore:
+    """Sessions by id; least recently used go first once max_sessions or max_bytes is exceeded."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: float = 1800.0,
+        max_turns: int = 20,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def create(self) -> Session:
+        session = Session(secrets.token_urlsafe(16))
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: str) -> Session | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self.ttl > 0 and time.time() - session.last_used > self.ttl:
+                self._remove(session_id)
+                return None
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def record(
+        self, session: Session, user: str, assistant: str, recipes: set[str] | None = None
+    ) -> None:
+        """Append a finished turn (with the recipe names it added) and re-apply the size cap."""
+        with self._lock:
+            # an evicted session still answers its in-flight turn, it just isn't counted anymore
+            stored = self._sessions.get(session.id) is session
+            if stored:
+                self.total_bytes -= session.size
+            session.append_turn(user, assistant, self.max_turns, recipes)
+            session.last_used = time.time()
+            if stored:
+                self.total_bytes += session.size
+                self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id)
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.total_bytes -= session.size
+        return True
+
+    def _evict(self) -> None:
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            session_id = next(iter(self._sessions))
+            self._remove(session_id)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,144 @@
+# collapse identical concurrent generations into one call shared by every waiter
+
+import threading
+from typing import Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class _StreamCall:
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.tokens: list[str] = []
+        self.finished = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        # set once nobody is listening any more, tells the source to stop generating
+        self.abandoned = threading.Event()
+
+
+class SingleFlight:
+    """Callers with the same key share the leader's result instead of repeating the work."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._streams: dict[str, _StreamCall] = {}
+        self.shared = 0
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(
+        self, key: str, source: Callable[[threading.Event], Iterator[str]]
+    ) -> Iterator[str]:
+        """Fan one token stream out to every concurrent caller; late joiners replay the prefix."""
+        with self._lock:
+            call = self._streams.get(key)
+            leader = call is None or call.abandoned.is_set()
+            if leader:
+                call = self._streams[key] = _StreamCall()
+            else:
+                self.shared += 1
+            with call.cond:
+                call.subscribers += 1
+        if leader:
+            yield from self._lead(key, call, source)
+        else:
+            yield from self._follow(call)
+
+    def _unsubscribe(self, call: _StreamCall) -> int:
+        with call.cond:
+            call.subscribers -= 1
+            if call.subscribers == 0:
+                call.abandoned.set()
+            return call.subscribers
+
+    def _publish(self, call: _StreamCall, token: str) -> None:
+        with call.cond:
+            call.tokens.append(token)
+            call.cond.notify_all()
+
+    def _lead(
+        self, key: str, call: _StreamCall, source: Callable[[threading.Event], Iterator[str]]
+    ) -> Iterator[str]:
+        tokens = source(call.abandoned)
+        listening = True
+        try:
+            for token in tokens:
+                self._publish(call, token)
+                if listening:
+                    try:
+                        yield token
+                    except GeneratorExit:
+                        # our caller left; keep generating while followers still read
+                        listening = False
+                        if self._unsubscribe(call) == 0:
+                            return
+                elif call.abandoned.is_set():
+                    return
+        except BaseException as e:
+            call.error = e
+            if listening:
+                raise
+        finally:
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._streams.get(key) is call:
+                    del self._streams[key]
+            with call.cond:
+                call.finished = True
+                call.cond.notify_all()
+            if listening:
+                self._unsubscribe(call)
+
+    def _follow(self, call: _StreamCall) -> Iterator[str]:
+        seen = 0
+        try:
+            while True:
+                with call.cond:
+                    while seen >= len(call.tokens) and not call.finished:
+                        call.cond.wait()
+                    chunk = call.tokens[seen:]
+                    seen = len(call.tokens)
+                    if not chunk:
+                        if call.error is not None:
+                            raise call.error
+                        return
+                yield from chunk
+        finally:
+            self._unsubscribe(call)
@@ -0,0 +1,88 @@
+# make the project packages importable when pytest runs from anywhere,
+# and share the fake ollama clients and engine factory the tests build on
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dataset.loader import RecipeLoader  # noqa: E402
+from model.inference import RecipeInferenceEngine  # noqa: E402
+from model.pool import BackendPool  # noqa: E402
+
+RECIPES = [
+    {"name": "Omelette", "ingredients": ["egg", "butter"], "instructions": "Whisk and fry."},
+    {"name": "Fried Rice", "ingredients": ["rice", "soy sauce"], "instructions": "Fry the rice."},
+    {"name": "Toast", "ingredients": ["bread", "butter"], "instructions": "Toast the bread."},
+    {"name": "Salad", "ingredients": ["lettuce", "tomato"], "instructions": "Toss."},
+]
+
+
+class FakeClient:
+    """Answers every chat at once with a numbered reply and records the messages it got."""
+
+    def __init__(self) -> None:
+        self.calls: list[list[dict[str, str]]] = []
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        self.calls.append([dict(m) for m in messages])
+        reply = {"message": {"content": f"reply {len(self.calls)}"}, "done": True}
+        return iter([reply]) if stream else reply
+
+    def list(self):
+        return {"models": []}
+
+
+class SlowClient:
+    """Streams one token, then holds the rest of the reply until released."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        def chunks():
+            yield {"message": {"content": "slow "}, "done": False}
+            self.release.wait(5)
+            yield {"message": {"content": "reply"}, "done": True}
+
+        return chunks()
+
+    def list(self):
+        return {"models": []}
+
+
+@pytest.fixture
+def fake_client() -> FakeClient:
+    return FakeClient()
+
+
+@pytest.fixture
+def slow_client():
+    client = SlowClient()
+    yield client
+    client.release.set()
+
+
+@pytest.fixture
+def make_engine():
+    """Engine factory over RECIPES (or the given catalog), talking to a fake client if one is given."""
+    engines: list[RecipeInferenceEngine] = []
+
+    def make(client=None, recipes: list[dict] | None = None, **kwargs) -> RecipeInferenceEngine:
+        kwargs.setdefault("fuzzy_matching", False)
+        if client is not None:
+            kwargs["pool"] = BackendPool([None], client_factory=lambda url: client)
+        engine = RecipeInferenceEngine(
+            recipe_loader=RecipeLoader(recipes=RECIPES if recipes is None else recipes), **kwargs
+        )
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
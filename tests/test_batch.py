@@ -0,0 +1,60 @@
+# /chat/batch: answers in input order, duplicates generated once, NDJSON streaming
+
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from api import main
+from model.cache import ResponseCache
+from model.inference import SOURCE_LLM
+from model.ratelimit import ClientRateLimiter
+
+MESSAGES = ["eggs and rice", "bread", "Rice, EGG", "lettuce"]
+
+
+@pytest.fixture
+def engine(monkeypatch, make_engine, fake_client):
+    engine = make_engine(fake_client, cache=ResponseCache())
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "rate_limiter", ClientRateLimiter(0))
+    return engine
+
+
+def _post(path: str, payload: dict) -> httpx.Response:
+    async def post() -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=payload)
+
+    return asyncio.run(post())
+
+
+def _batch(*messages: str) -> dict:
+    return {"requests": [{"message": m} for m in messages]}
+
+
+def test_batch_answers_in_order_and_shares_duplicates(engine, fake_client):
+    response = _post("/chat/batch", _batch(*MESSAGES))
+    assert response.status_code == 200
+    items = response.json()
+    assert [item["index"] for item in items] == [0, 1, 2, 3]
+    assert all(item["source"] == SOURCE_LLM and item["error"] is None for item in items)
+    # the first and third are the same ingredients, so one generation answers both
+    assert len(fake_client.calls) == 3
+    assert items[0]["response"] == items[2]["response"]
+    assert any("Toast" in call[-1]["content"] for call in fake_client.calls)
+
+
+def test_batch_streams_ndjson_in_order(engine):
+    response = _post("/chat/batch?stream=true", _batch(*MESSAGES))
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+
+
+def test_batch_rejects_sessions(engine):
+    payload = {"requests": [{"message": "egg", "session_id": "s"}]}
+    assert _post("/chat/batch", payload).status_code == 400
@@ -0,0 +1,40 @@
+# benchmark harness: the stub speaks the ollama chat API, percentiles are nearest-rank
+
+import pytest
+
+from benchmarks.load import percentile, summarize
+from benchmarks.stub_ollama import StubSettings, start_stub
+
+ollama = pytest.importorskip("ollama")
+
+
+@pytest.fixture
+def stub():
+    server = start_stub(settings=StubSettings(prefill_ms=0, tokens_per_sec=0, completion_tokens=5))
+    yield ollama.Client(host=f"http://127.0.0.1:{server.server_port}")
+    server.shutdown()
+
+
+def test_stub_answers_like_ollama(stub):
+    messages = [{"role": "user", "content": "eggs?"}]
+    reply = stub.chat(model="stub", messages=messages, options={"num_predict": 3})
+    assert reply["message"]["content"] == "Try the Scrambled "
+    assert reply["done"] and reply["eval_count"] == 3
+    chunks = list(stub.chat(model="stub", messages=messages, stream=True))
+    assert [c["done"] for c in chunks] == [False] * 5 + [True]
+    assert "".join(c["message"]["content"] for c in chunks).split() == ["Try", "the", "Scrambled", "Eggs", "with"]
+    assert chunks[-1]["prompt_eval_count"] >= 1
+    assert [m["model"] for m in stub.list()["models"]] == ["stub"]
+
+
+def test_stub_preload_is_a_load_only_request(stub):
+    reply = stub.chat(model="stub", messages=[])
+    assert reply["done_reason"] == "load" and reply["message"]["content"] == ""
+
+
+def test_percentiles_are_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 99) == 0.0
+    assert summarize([0.001, 0.003]) == {"p50_ms": 1.0, "p95_ms": 3.0, "p99_ms": 3.0, "mean_ms": 2.0}
@@ -0,0 +1,71 @@
+# response cache: TTL, entry and byte caps for both backends, and the normalized engine key
+
+import pytest
+
+from model import cache as cache_module
+from model.cache import ResponseCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**kwargs) -> ResponseCache:
+        path = tmp_path / "responses.db" if request.param == "sqlite" else None
+        return ResponseCache(path=path, **kwargs)
+
+    return make
+
+
+def test_entries_expire_after_ttl(make_cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = make_cache(ttl=60)
+    cache.set("k", "v")
+    now[0] += 59
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 0, 0)
+
+
+def test_byte_cap_evicts_least_recently_used(make_cache, monkeypatch):
+    now = [1000.0]
+    # sqlite orders by used_at, so every call needs its own timestamp
+    monkeypatch.setattr(cache_module.time, "time", lambda: now.append(now[-1] + 1) or now[-1])
+    cache = make_cache(max_bytes=30)
+    for key in ("a", "b", "c"):
+        cache.set(key, "x" * 9)  # 10 bytes each with the key
+    assert cache.get("a") == "x" * 9
+    cache.set("d", "x" * 9)
+    # b was the least recently used once a was read
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in ("a", "c", "d")] == ["x" * 9] * 3
+    assert cache.stats()["bytes"] == 30 and cache.evictions == 1
+    # a value bigger than the whole cache is not stored and evicts nothing
+    cache.set("huge", "x" * 100)
+    assert cache.get("huge") is None and len(cache._backend) == 3
+
+
+def test_entry_cap(make_cache):
+    cache = make_cache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    assert cache.stats()["entries"] == 2
+    assert cache.evictions == 1
+
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = tmp_path / "responses.db"
+    ResponseCache(path=path).set("k", "v")
+    reopened = ResponseCache(path=path)
+    assert reopened.get("k") == "v"
+    assert reopened.stats()["bytes"] == len("k") + len("v")
+
+
+def test_engine_key_ignores_order_case_and_plurals(make_engine):
+    engine = make_engine(cache=ResponseCache())
+    key = engine._cache_key(engine._parse("eggs and rice"))
+    assert key is not None
+    assert engine._cache_key(engine._parse("Rice, EGG")) == key
+    assert engine._cache_key(engine._parse("rice and butter")) != key
+    assert engine._cache_key([]) is None
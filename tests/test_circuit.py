@@ -0,0 +1,67 @@
+# circuit breaker: opening, the single half-open trial, and the engine's instant fallback
+
+import pytest
+
+from model import circuit
+from model.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from model.inference import SOURCE_FALLBACK, SOURCE_LLM
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _tripped(clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure("refused")
+    assert breaker.state == CLOSED
+    breaker.record_failure("refused")
+    assert breaker.state == OPEN and not breaker.allow_request()
+    return breaker
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = _tripped(clock)
+    clock[0] += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    # only one trial at a time
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+    assert breaker.snapshot() == {"state": CLOSED, "failures": 0, "last_error": None}
+
+
+def test_failed_trial_reopens(clock):
+    breaker = _tripped(clock)
+    clock[0] += 10
+    assert breaker.allow_request()
+    breaker.record_failure("still refused")
+    assert breaker.state == OPEN and not breaker.allow_request()
+    # and waits a full reset_timeout again
+    clock[0] += 9
+    assert breaker.state == OPEN
+    clock[0] += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_trial_that_never_reports_back_is_replaced(clock):
+    breaker = _tripped(clock)
+    clock[0] += 10
+    assert breaker.allow_request()
+    clock[0] += 5
+    assert not breaker.allow_request()
+    clock[0] += 5
+    assert breaker.allow_request()
+
+
+def test_open_breaker_skips_the_backend(make_engine, fake_client):
+    engine = make_engine(fake_client, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    assert engine.suggest("egg").source == SOURCE_LLM
+    engine.breaker.record_failure("refused")
+    result = engine.suggest("rice")
+    assert result.source == SOURCE_FALLBACK and "Fried Rice" in result.text
+    assert len(fake_client.calls) == 1
@@ -0,0 +1,18 @@
+# deadline mode: timed-out generations left running in the background are capped
+
+from model.cache import ResponseCache
+from model.inference import SOURCE_DEADLINE
+
+
+def test_background_completions_are_capped(make_engine, slow_client):
+    engine = make_engine(slow_client, cache=ResponseCache(), deadline_ms=50, max_background=1)
+    first = engine.suggest("egg")
+    second = engine.suggest("rice")
+    assert first.source == second.source == SOURCE_DEADLINE
+    # the first keeps running to warm the cache, the second is over the cap and cancelled
+    assert engine._background_running == 1
+    slow_client.release.set()
+    engine._background.shutdown(wait=True)
+    assert engine._background_running == 0
+    cached = [engine._cache_get(engine._cache_key(engine._parse(m))) for m in ("egg", "rice")]
+    assert cached == ["slow reply", None]
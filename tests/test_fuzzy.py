@@ -0,0 +1,71 @@
+# typo resolution: the pruned candidate search against a full scan of the vocabulary
+
+import random
+import time
+
+from benchmarks.micro import _typos, synthetic_words
+from dataset.fuzzy import STOPWORDS, FuzzyResolver, bounded_distance, max_edits
+from dataset.loader import RecipeIndex
+
+
+def _brute_force(resolver: FuzzyResolver, token: str) -> str:
+    if token in resolver.known or token in STOPWORDS:
+        return token
+    limit = max_edits(token)
+    if limit == 0:
+        return token
+    for i in range(len(token) - 1):
+        swapped = token[:i] + token[i + 1] + token[i] + token[i + 2:]
+        if swapped in resolver.known:
+            return swapped
+    best = None
+    for wid, word in enumerate(resolver.words):
+        d = bounded_distance(token, word, limit)
+        if d <= limit:
+            key = (d, -resolver.weights[wid], word)
+            best = key if best is None or key < best else best
+    return best[2] if best is not None else token
+
+
+def test_resolve_matches_full_scan():
+    rng = random.Random(0)
+    words = synthetic_words(1500, seed=1)
+    resolver = FuzzyResolver((w, rng.randint(1, 5)) for w in words)
+    typos = _typos(words, 150, seed=2)
+    # two edits apart, so the limit-2 path (long tokens) gets exercised too
+    typos += _typos(_typos(words, 150, seed=3), 150, seed=4)
+    for token in typos:
+        assert resolver._resolve(token) == _brute_force(resolver, token), token
+
+
+def test_few_edits_matches_the_full_table():
+    rng = random.Random(5)
+    for _ in range(3000):
+        # a two-letter alphabet makes swaps and repeated letters common
+        a = "".join(rng.choice("ab") for _ in range(rng.randint(0, 8)))
+        b = "".join(rng.choice("ab") for _ in range(rng.randint(0, 8)))
+        exact = bounded_distance(a, b, 8)
+        for limit in (0, 1, 2):
+            assert bounded_distance(a, b, limit) == min(exact, limit + 1), (a, b, limit)
+
+
+def test_resolve_is_sub_millisecond_on_a_large_vocabulary():
+    rng = random.Random(0)
+    words = synthetic_words(50000, seed=0)
+    resolver = FuzzyResolver((w, rng.randint(1, 100)) for w in words)
+    typos = [t for t in _typos(words, 500, seed=0) if t not in resolver.known]
+    started = time.perf_counter()
+    for token in typos:
+        resolver._resolve(token)
+    assert (time.perf_counter() - started) / len(typos) < 1e-3
+
+
+def test_fuzzy_vocabulary_has_no_junk_plurals():
+    index = RecipeIndex([
+        {"name": "Omelette", "ingredients": ["eggs", "green beans"]},
+        {"name": "Salad", "ingredients": ["tomato"]},
+    ])
+    vocabulary = set(index.fuzzy.words)
+    assert {"eggs", "egg", "beans", "bean", "tomato", "tomatos"} <= vocabulary
+    assert not {"eggss", "beanss"} & vocabulary
+    assert index.fuzzy.resolve("eggss") == "eggs"
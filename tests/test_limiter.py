@@ -0,0 +1,111 @@
+# inference limiter: slot accounting, priority order and cancellation while a call runs
+
+import asyncio
+import threading
+
+import pytest
+
+from model.limiter import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    InferenceBusyError,
+    InferenceLimiter,
+)
+
+
+def test_cancelled_caller_keeps_slot_until_fn_returns():
+    limiter = InferenceLimiter(max_concurrency=1, max_queue=4)
+    started = threading.Event()
+    finish = threading.Event()
+    seen = []
+
+    def blocking() -> str:
+        started.set()
+        finish.wait(5)
+        return "done"
+
+    async def scenario() -> None:
+        first = asyncio.create_task(limiter.run(blocking))
+        await asyncio.to_thread(started.wait, 5)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # fn is still running in its thread, so the slot is still taken
+        assert limiter.running == 1
+        second = asyncio.create_task(limiter.run(lambda: seen.append(limiter.running)))
+        await asyncio.sleep(0.05)
+        assert limiter.waiting == 1 and not seen
+        finish.set()
+        await second
+        assert seen == [1]
+        assert limiter.running == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        finish.set()
+        limiter.shutdown()
+
+
+def test_slots_are_handed_out_by_priority():
+    limiter = InferenceLimiter(max_concurrency=1, max_queue=4)
+    order = []
+
+    async def scenario() -> None:
+        await limiter.acquire()
+        bulk = asyncio.create_task(limiter.acquire(PRIORITY_BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        assert limiter.depth() == {("interactive",): 1, ("bulk",): 1}
+        for task, name in ((bulk, "bulk"), (interactive, "interactive")):
+            task.add_done_callback(lambda _, name=name: order.append(name))
+        limiter.release()
+        await interactive
+        limiter.release()
+        await bulk
+        limiter.release()
+        assert limiter.running == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+    limiter.shutdown()
+    assert order == ["interactive", "bulk"]
+
+
+def test_full_queue_displaces_bulk_for_interactive():
+    limiter = InferenceLimiter(max_concurrency=1, max_queue=1)
+
+    async def scenario() -> None:
+        await limiter.acquire()
+        bulk = asyncio.create_task(limiter.acquire(PRIORITY_BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceBusyError):
+            await bulk
+        # and a second bulk request can't displace anyone
+        with pytest.raises(InferenceBusyError):
+            await limiter.acquire(PRIORITY_BULK)
+        limiter.release()
+        await interactive
+        limiter.release()
+        assert limiter.running == 0
+
+    asyncio.run(scenario())
+    limiter.shutdown()
+
+
+def test_queue_timeout_gives_up_without_leaking():
+    limiter = InferenceLimiter(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+
+    async def scenario() -> None:
+        await limiter.acquire()
+        with pytest.raises(InferenceBusyError) as caught:
+            await limiter.acquire()
+        assert caught.value.retry_after_header == "1"
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.running == 0
+
+    asyncio.run(scenario())
+    limiter.shutdown()
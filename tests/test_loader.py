@@ -0,0 +1,55 @@
+# ingredient lookup: the inverted index against the linear scan it replaced
+
+import random
+
+from dataset.loader import RecipeLoader, _ingredients_match
+
+INGREDIENTS = [
+    "egg", "eggs", "butter", "rice", "soy sauce", "tomato", "tomatoes", "bean", "green beans",
+    "onion", "garlic", "milk", "flour", "sugar", "salt", "Pepper", " basil ",
+]
+
+
+def _catalog(n: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            # repeated names, so ties fall back to catalog order
+            "name": f"Recipe {rng.randrange(n // 2):03d}",
+            "ingredients": rng.sample(INGREDIENTS, rng.randint(1, 6)),
+            "instructions": "Cook.",
+        }
+        for _ in range(n)
+    ]
+
+
+def _scan(recipes: list[dict], ingredients: list[str], max_results: int, min_matches: int) -> list[dict]:
+    scored = []
+    for recipe in recipes:
+        has_match, count = _ingredients_match(recipe.get("ingredients", []), ingredients)
+        if has_match and count >= min_matches:
+            scored.append((count, recipe))
+    scored.sort(key=lambda x: (-x[0], x[1]["name"]))
+    return [r for _, r in scored[:max_results]]
+
+
+def test_find_by_ingredients_matches_linear_scan():
+    recipes = _catalog(300, seed=0)
+    loader = RecipeLoader(recipes=recipes)
+    rng = random.Random(1)
+    queries = [rng.sample(INGREDIENTS + ["EGGS", "Tomatoes", "saffron"], rng.randint(1, 4)) for _ in range(200)]
+    for ingredients in queries:
+        for max_results, min_matches in ((5, 1), (20, 2), (3, 3)):
+            expected = _scan(recipes, ingredients, max_results, min_matches)
+            assert loader.find_by_ingredients(ingredients, max_results, min_matches) == expected, ingredients
+    # the batched form gives the same answers
+    assert loader.find_by_ingredients_many(queries) == [loader.find_by_ingredients(q) for q in queries]
+
+
+def test_find_by_ingredients_edge_cases():
+    loader = RecipeLoader(recipes=_catalog(20, seed=2))
+    assert loader.find_by_ingredients([]) == []
+    assert loader.find_by_ingredients(["saffron"]) == []
+    assert loader.find_by_ingredients_many([[], ["saffron"]]) == [[], []]
+    # singular and plural find the same recipes
+    assert loader.find_by_ingredients(["egg"], 50) == loader.find_by_ingredients(["eggs"], 50)
@@ -0,0 +1,121 @@
+# local model batching: concurrent requests share forward passes and answer as if run alone
+
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+from model.local_llm import LocalChatClient, LocalModel
+
+PROMPTS = [
+    "eggs",
+    "I have rice, soy sauce, eggs and green beans left over from yesterday",
+    "bread and butter please",
+    "milk",
+]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    # a randomly initialised two-layer llama with its own small byte-level tokenizer
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+
+    path = tmp_path_factory.mktemp("tiny")
+    tok = Tokenizer(models.BPE(unk_token=None))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=300, special_tokens=["<s>", "</s>"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tok.train_from_iterator(PROMPTS * 10, trainer)
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=tok, bos_token="<s>", eos_token="</s>")
+    tokenizer.save_pretrained(path)
+    config = transformers.LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=256, bos_token_id=0, eos_token_id=1,
+    )
+    torch.manual_seed(0)
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+    return path
+
+
+def _chat(client: LocalChatClient, prompt: str, num_predict: int) -> dict:
+    messages = [{"role": "user", "content": prompt}]
+    return client.chat(messages=messages, options={"temperature": 0, "num_predict": num_predict})
+
+
+def _gated(model: LocalModel) -> tuple[threading.Event, list[int]]:
+    # holds the first decoding step until every request is queued, and records each step's batch size
+    gate, sizes = threading.Event(), []
+    step = model._step
+
+    def gated_step() -> None:
+        gate.wait(10)
+        sizes.append(len(model._active))
+        step()
+
+    model._step = gated_step
+    return gate, sizes
+
+
+def _concurrent(client: LocalChatClient, jobs: list[tuple[str, int]]) -> tuple[list[dict], list[int]]:
+    gate, sizes = _gated(client.model)
+    client.model.load()
+    results: list[dict | None] = [None] * len(jobs)
+
+    def run(i: int) -> None:
+        results[i] = _chat(client, *jobs[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(jobs))]
+    for thread in threads:
+        thread.start()
+    while client.model._pending.qsize() + len(client.model._active) < len(jobs):
+        threading.Event().wait(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(60)
+    return results, sizes
+
+
+def test_batched_answers_match_running_alone(model_dir):
+    alone = LocalChatClient(LocalModel(model_dir, max_batch=1))
+    # different prompt lengths and budgets, so rows are padded and leave the batch at different steps
+    jobs = [(prompt, 6 + 3 * i) for i, prompt in enumerate(PROMPTS)]
+    expected = [_chat(alone, *job) for job in jobs]
+    results, sizes = _concurrent(LocalChatClient(LocalModel(model_dir, max_batch=4)), jobs)
+    assert max(sizes) == len(jobs)
+    for got, want in zip(results, expected):
+        assert got["message"] == want["message"]
+        assert got["eval_count"] == want["eval_count"] and got["done_reason"] == want["done_reason"]
+        assert got["prompt_eval_count"] == want["prompt_eval_count"]
+
+
+def test_batch_never_exceeds_max_batch(model_dir):
+    client = LocalChatClient(LocalModel(model_dir, max_batch=2))
+    results, sizes = _concurrent(client, [(prompt, 8) for prompt in PROMPTS])
+    assert max(sizes) == 2
+    assert all(r["done"] for r in results)
+
+
+def test_closing_a_stream_cancels_its_row(model_dir):
+    model = LocalModel(model_dir, max_batch=2)
+    client = LocalChatClient(model)
+    requests = []
+    submit = model.submit
+
+    def recording_submit(messages, options):
+        requests.append(submit(messages, options))
+        return requests[-1]
+
+    model.submit = recording_submit
+    messages = [{"role": "user", "content": PROMPTS[1]}]
+    chunks = client.chat(messages=messages, stream=True, options={"temperature": 0, "num_predict": 200})
+    next(chunks)
+    chunks.close()
+    assert requests[0].cancelled.is_set()
+    # the decoding thread drops it and keeps serving
+    assert _chat(client, PROMPTS[2], 4)["done"]
+    assert requests[0].done_reason in ("cancelled", "stop")
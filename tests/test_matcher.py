@@ -0,0 +1,39 @@
+# phrase matching: multi-word ingredients stay whole, longest match wins, typos fixed first
+
+from dataset.loader import RecipeIndex
+from dataset.matcher import IngredientMatcher
+from model.inference import _parse_ingredients_from_message
+
+
+def test_longest_phrase_wins():
+    matcher = IngredientMatcher(["soy", "soy sauce", "dark soy sauce", "sauce", "egg"])
+    assert matcher.size == 5
+    assert matcher.scan("dark soy sauce and egg".split()) == ["dark soy sauce", "and", "egg"]
+    assert matcher.scan("soy sauce sauce".split()) == ["soy sauce", "sauce"]
+    # a phrase cut short falls back to the longest complete one inside it
+    assert matcher.scan("dark soy".split()) == ["dark", "soy"]
+    assert "soy" in matcher and "dark" not in matcher
+
+
+def test_duplicate_and_blank_phrases():
+    matcher = IngredientMatcher(["egg", "egg", "  ", "green  beans"])
+    assert matcher.size == 2
+    assert matcher.scan(["green", "beans"]) == ["green  beans"]
+
+
+def test_message_parsing_keeps_catalog_phrases():
+    index = RecipeIndex([
+        {"name": "Stir Fry", "ingredients": ["soy sauce", "chicken breast", "green beans"]},
+        {"name": "Omelette", "ingredients": ["eggs", "butter"]},
+    ])
+
+    def parse(message: str) -> list[str]:
+        return _parse_ingredients_from_message(message, index.matcher, index.fuzzy)
+
+    assert parse("Chicken breast, soy sauce & egg") == ["chicken breast", "soy sauce", "egg"]
+    # plural forms come from the index's variant keys
+    assert parse("green bean and butter") == ["green bean", "butter"]
+    # typos are fixed word by word before phrases are matched
+    assert parse("chiken brest with soy sauce") == ["chicken breast", "with", "soy sauce"]
+    # without a matcher every word stands alone
+    assert _parse_ingredients_from_message("soy sauce") == ["soy", "sauce"]
@@ -0,0 +1,76 @@
+# prometheus metrics: histogram exposition, the no-op default and the /metrics endpoint
+
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from api import main
+from model import metrics
+from model.ratelimit import ClientRateLimiter
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", True)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # metrics made by a test register here instead of next to the real ones
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_histogram_renders_cumulative_buckets(enabled, registry):
+    hist = metrics.Histogram("t_seconds", "test", labels=("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        hist.observe(value, "parse")
+    assert metrics.render().splitlines() == [
+        "# HELP t_seconds test",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{stage="parse",le="0.1"} 1',
+        't_seconds_bucket{stage="parse",le="1"} 3',
+        't_seconds_bucket{stage="parse",le="+Inf"} 4',
+        't_seconds_sum{stage="parse"} 4.25',
+        't_seconds_count{stage="parse"} 4',
+    ]
+
+
+def test_disabled_metrics_record_nothing(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    counter = metrics.Counter("t_total", "test", labels=("source",))
+    counter.inc("llm")
+    with metrics.Histogram("t_seconds", "test").time():
+        pass
+    assert counter.value("llm") == 0
+    assert metrics.render() == "\n"
+
+
+def _call(method: str, path: str, **kwargs) -> httpx.Response:
+    async def call() -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(call())
+
+
+def test_metrics_endpoint_reports_stages(enabled, monkeypatch, make_engine, fake_client):
+    monkeypatch.setattr(main, "engine", make_engine(fake_client))
+    monkeypatch.setattr(main, "rate_limiter", ClientRateLimiter(0))
+    before = metrics.REQUESTS.value("llm")
+    assert _call("POST", "/chat", json={"message": "egg"}).status_code == 200
+    response = _call("GET", "/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for stage in ("parse", "retrieve", "prompt"):
+        assert f'recipe_stage_seconds_count{{stage="{stage}"}}' in response.text
+    assert metrics.REQUESTS.value("llm") == before + 1
+    assert f'recipe_requests_total{{source="llm"}} {int(before + 1)}' in response.text
+
+
+def test_metrics_endpoint_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    assert _call("GET", "/metrics").status_code == 404
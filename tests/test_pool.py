@@ -0,0 +1,112 @@
+# backend pool: least-outstanding routing, ejection/readmission and model affinity
+
+import asyncio
+
+import pytest
+
+from model.pool import BackendPool, NoBackendError
+
+
+class HostClient:
+    """One fake host: lists its models, or raises while down."""
+
+    def __init__(self, models: list[str]) -> None:
+        self.models = models
+        self.down = False
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        return {"message": {"content": "ok"}, "done": True}
+
+    def list(self):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return {"models": [{"model": m} for m in self.models]}
+
+
+def _pool(hosts: dict[str, list[str]], **kwargs) -> tuple[BackendPool, dict[str, HostClient]]:
+    clients = {url: HostClient(models) for url, models in hosts.items()}
+    return BackendPool(list(hosts), client_factory=lambda url: clients[url], **kwargs), clients
+
+
+def test_routes_to_least_outstanding():
+    pool, _ = _pool({"a": [], "b": [], "c": []})
+    with pool.lease() as first, pool.lease() as second:
+        assert first is not second
+        with pool.lease() as third:
+            assert third not in (first, second)
+            # everything busy once; a fourth goes to one of them, never past two in flight
+            with pool.lease() as fourth:
+                assert fourth.outstanding == 2
+    assert [b.outstanding for b in pool.backends] == [0, 0, 0]
+
+
+def test_ejects_after_failures_and_readmits_on_check():
+    pool, clients = _pool({"a": [], "b": []}, failure_threshold=2, eject_seconds=60)
+    bad = pool.backends[0]
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            with pool.lease(exclude={1}):
+                raise ConnectionError("refused")
+    assert pool.has_ejected() and bad.failures == 2
+    assert pool.needs_check()
+    for _ in range(4):
+        with pool.lease() as backend:
+            assert backend is pool.backends[1]
+    # a host that still doesn't answer stays out
+    clients["a"].down = True
+    pool.check()
+    assert pool.has_ejected()
+    clients["a"].down = False
+    assert pool.check()
+    assert not pool.has_ejected() and bad.failures == 0
+    with pool.lease(exclude={1}) as backend:
+        assert backend is bad
+
+
+def test_all_ejected_raises():
+    pool, _ = _pool({"a": []}, failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        with pool.lease():
+            raise RuntimeError("boom")
+    with pytest.raises(NoBackendError):
+        with pool.lease():
+            pass
+
+
+def test_model_affinity_needs_a_check_then_routes_by_model():
+    pool, _ = _pool({"a": ["llama3.2:1b"], "b": ["mistral:latest"]}, model_affinity=True)
+    # before any check the model lists are unknown, so the probe loop must keep checking
+    assert pool.needs_check()
+    pool.check()
+    assert not pool.needs_check()
+    assert pool.backends[1].models == frozenset({"mistral:latest"})
+    for _ in range(4):
+        with pool.lease("llama3.2:1b") as backend:
+            assert backend.url == "a"
+        # an untagged name means :latest
+        with pool.lease("mistral") as backend:
+            assert backend.url == "b"
+    # a model nobody reports still gets served somewhere
+    with pool.lease("qwen:0.5b") as backend:
+        assert backend.url in ("a", "b")
+
+
+def test_without_affinity_models_are_not_required():
+    pool, _ = _pool({"a": [], "b": []})
+    assert not pool.needs_check()
+
+
+def test_lifespan_checks_models_before_serving(monkeypatch):
+    from api import main
+
+    pool, _ = _pool({"a": ["llama3.2:1b"], "b": []}, model_affinity=True)
+    monkeypatch.setattr(main, "_build_pool", lambda: pool)
+    monkeypatch.setattr(main.config, "WARMUP_ENABLED", False)
+    monkeypatch.setattr(main.config, "KEEP_ALIVE_PING_INTERVAL", 0)
+    monkeypatch.setattr(main.config, "DATASET_WATCH_INTERVAL", 0)
+
+    async def serve() -> None:
+        async with main.lifespan(main.app):
+            assert [b.models for b in pool.backends] == [frozenset({"llama3.2:1b"}), frozenset()]
+
+    asyncio.run(serve())
@@ -0,0 +1,57 @@
+# training data generation: incremental recipe reading and bounded duplicate detection
+
+import hashlib
+import json
+
+import pytest
+
+from dataset import prepare_training_data as prep
+
+RECIPES = [
+    {"name": f"Recipe {i}", "ingredients": ["egg", f"item {i}", "salt"], "instructions": "Cook. " * i}
+    for i in range(40)
+]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # records straddle many buffer refills
+    monkeypatch.setattr(prep, "_READ_CHUNK", 37)
+
+
+def test_iter_recipes_json_array(tmp_path, small_chunks):
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps(RECIPES, indent=2), encoding="utf-8")
+    assert list(prep.iter_recipes(path)) == RECIPES
+
+
+def test_iter_recipes_jsonl(tmp_path, small_chunks):
+    path = tmp_path / "recipes.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in RECIPES) + "\n\n", encoding="utf-8")
+    assert list(prep.iter_recipes(path)) == RECIPES
+
+
+def test_iter_recipes_truncated(tmp_path, small_chunks):
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps(RECIPES)[:-30], encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(prep.iter_recipes(path))
+
+
+def test_seen_lines_switches_to_bloom_filter():
+    digests = [hashlib.blake2b(str(i).encode(), digest_size=16).digest() for i in range(5000)]
+    seen = prep.SeenLines(max_bytes=100 * 1000)
+    assert all(seen.add(d) for d in digests[:1000])
+    assert seen.exact
+    assert all(seen.add(d) for d in digests[1000:])
+    assert not seen.exact
+    # everything recorded before and after the switch is still reported as seen
+    assert not any(seen.add(d) for d in digests)
+
+
+def test_main_drops_duplicates(tmp_path):
+    path = tmp_path / "recipes.json"
+    path.write_text(json.dumps(RECIPES + RECIPES[:5]), encoding="utf-8")
+    out = prep.main(recipes_path=path, output=tmp_path / "train.jsonl", dedup_bytes=2000)
+    lines = out.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == len(set(lines)) == 2 * len(RECIPES)
@@ -0,0 +1,44 @@
+# admission: only mapped API keys can raise a request's priority, rate limits answer 429
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from api import main
+from model.limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE
+from model.ratelimit import ClientRateLimiter
+
+
+def _request(**headers: str) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw, "client": ("10.0.0.1", 1234)})
+
+
+def test_header_cannot_raise_batch_priority(monkeypatch):
+    monkeypatch.setattr(main.config, "API_KEY_PRIORITIES", {})
+    assert main._admit(_request(x_priority="interactive"), PRIORITY_BULK) == PRIORITY_BULK
+    assert main._admit(_request(), PRIORITY_BULK) == PRIORITY_BULK
+
+
+def test_header_can_lower_chat_priority(monkeypatch):
+    monkeypatch.setattr(main.config, "API_KEY_PRIORITIES", {})
+    assert main._admit(_request(x_priority="bulk"), PRIORITY_INTERACTIVE) == PRIORITY_BULK
+    assert main._admit(_request(x_priority="bogus"), PRIORITY_INTERACTIVE) == PRIORITY_INTERACTIVE
+
+
+def test_mapped_key_decides(monkeypatch):
+    monkeypatch.setattr(main.config, "API_KEY_PRIORITIES", {"k1": "interactive", "k2": "bulk"})
+    assert main._admit(_request(x_api_key="k1"), PRIORITY_BULK) == PRIORITY_INTERACTIVE
+    assert main._admit(_request(x_api_key="k2", x_priority="interactive"), PRIORITY_INTERACTIVE) == PRIORITY_BULK
+
+
+def test_rate_limited_caller_gets_429(monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", ClientRateLimiter(rate_per_minute=6, burst=1))
+    monkeypatch.setattr(main.config, "API_KEY_PRIORITIES", {})
+    main._admit(_request(), PRIORITY_INTERACTIVE)
+    with pytest.raises(HTTPException) as caught:
+        main._admit(_request(), PRIORITY_INTERACTIVE)
+    assert caught.value.status_code == 429
+    assert caught.value.headers == {"Retry-After": "10"}
+    # an api key is its own client, whatever address it comes from
+    main._admit(_request(x_api_key="k1"), PRIORITY_INTERACTIVE)
@@ -0,0 +1,60 @@
+# prompt building: token budget on the single and batch paths, and the per-recipe render cache
+
+from dataset.store import compile_store, open_store
+from model import prompt_builder
+from model.inference import BatchItem
+from model.prompt_builder import estimate_tokens, pack_recipes
+
+
+def _recipes(n: int) -> list[dict]:
+    return [
+        {
+            "name": f"Recipe {i}",
+            "ingredients": ["egg", f"spice{i}", "salt"],
+            "instructions": "Stir the pot slowly and keep tasting as you go. " * 40,
+        }
+        for i in range(n)
+    ]
+
+
+def test_batch_items_respect_token_budget(make_engine):
+    budget = 600
+    engine = make_engine(recipes=_recipes(40), prompt_token_budget=budget)
+    # a match, and nothing matching (the fallback sends a slice of the whole catalog)
+    items = engine._prepare_batch(["egg and salt", "unobtainium"])
+    assert all(isinstance(item, BatchItem) for item in items)
+    assert not items[1].matching
+    for item in items:
+        assert estimate_tokens(item.system) + estimate_tokens(item.user_prompt) <= budget
+
+
+def test_batch_and_single_prompts_match(make_engine):
+    engine = make_engine(recipes=_recipes(40), prompt_token_budget=600)
+    _, system, user_prompt = engine._prepare("egg and salt")
+    (item,) = engine._prepare_batch(["egg and salt"])
+    assert (item.system, item.user_prompt) == (system, user_prompt)
+
+
+def test_render_cache_survives_store_eviction(tmp_path, monkeypatch):
+    index = open_store(compile_store(_recipes(40), tmp_path / "recipes.bin"))
+    store = index.recipes
+    store._cache_size = 4
+    rendered = []
+    render = prompt_builder.format_recipe_for_prompt
+
+    def counting(recipe, max_instruction_tokens=None):
+        rendered.append(recipe["name"])
+        return render(recipe, max_instruction_tokens)
+
+    monkeypatch.setattr(prompt_builder, "format_recipe_for_prompt", counting)
+    prompt_builder.clear_render_cache()
+    first = pack_recipes([store[0], store[1]], None, index.version)
+    # reading the rest evicts 0 and 1, so the next read decodes brand new dicts
+    for i in range(2, 40):
+        store[i]
+    assert pack_recipes([store[0], store[1]], None, index.version) == first
+    assert rendered == ["Recipe 0", "Recipe 1"]
+    # another catalog version renders again
+    pack_recipes([store[0]], None, "other")
+    assert rendered[-1] == "Recipe 0" and len(rendered) == 3
+    assert len(prompt_builder._rendered._items) == 3
@@ -0,0 +1,89 @@
+# weighted ranking: bm25 scores against the formula, rare ingredients first, batched = single
+
+import math
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from dataset.loader import RecipeIndex, RecipeLoader
+from dataset.ranking import BM25_B, BM25_K1, COVERAGE_WEIGHT
+
+INGREDIENTS = ["egg", "butter", "rice", "salt", "saffron", "milk", "flour", "tomato", "basil", "garlic"]
+
+
+def _catalog(n: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    # salt everywhere, saffron almost nowhere
+    return [
+        {
+            "name": f"Recipe {i:03d}",
+            "ingredients": ["salt"] + rng.sample(INGREDIENTS[:4] + INGREDIENTS[5:], rng.randint(1, 5))
+            + (["saffron"] if i % 25 == 0 else []),
+        }
+        for i in range(n)
+    ]
+
+
+def _reference(index: RecipeIndex, ingredients: list[str]) -> dict[int, float]:
+    n = len(index.recipes)
+    lengths = [len(tids) for tids in index.recipe_terms]
+    avg = sum(lengths) / n
+    query = index.lookup(ingredients)
+    scores = {}
+    for rid, tids in enumerate(index.recipe_terms):
+        shared = query & set(tids)
+        if not shared:
+            continue
+        norm = (BM25_K1 + 1) / (1 + BM25_K1 * (1 - BM25_B + BM25_B * lengths[rid] / avg))
+        idf = sum(math.log1p((n - len(index.postings[t]) + 0.5) / (len(index.postings[t]) + 0.5)) for t in shared)
+        scores[rid] = idf * norm + COVERAGE_WEIGHT * len(shared) / lengths[rid]
+    return scores
+
+
+def test_scores_follow_the_bm25_formula():
+    index = RecipeIndex(_catalog(200, seed=0))
+    for ingredients in (["egg"], ["saffron", "rice"], ["salt", "basil", "eggs"]):
+        expected = _reference(index, ingredients)
+        ranked = index.ranker.rank(ingredients, max_results=len(expected))
+        assert {rid for rid, _ in ranked} == set(expected)
+        for rid, score in ranked:
+            assert score == pytest.approx(expected[rid], rel=1e-5)
+        # best first, ties by name
+        keys = [(-score, index.name_rank[rid]) for rid, score in ranked]
+        assert keys == sorted(keys)
+
+
+def test_rare_ingredient_outranks_common_one():
+    index = RecipeIndex([
+        {"name": "A", "ingredients": ["salt", "egg"]},
+        {"name": "B", "ingredients": ["saffron", "egg"]},
+        {"name": "C", "ingredients": ["salt", "rice"]},
+        {"name": "D", "ingredients": ["salt", "milk"]},
+    ])
+    # both match two of the query's ingredients, but saffron is in one recipe and salt in three
+    assert [rid for rid, _ in index.ranker.rank(["salt", "saffron", "egg"], 2)] == [1, 0]
+
+
+def test_batched_ranking_matches_single_queries():
+    index = RecipeIndex(_catalog(150, seed=1))
+    rng = random.Random(2)
+    queries = [rng.sample(INGREDIENTS, rng.randint(1, 3)) for _ in range(30)] + [[], ["unobtainium"]]
+    for min_matches in (1, 2):
+        batched = index.ranker.rank_many(queries, 7, min_matches)
+        for query, hits in zip(queries, batched):
+            single = index.ranker.rank(query, 7, min_matches)
+            assert [rid for rid, _ in hits] == [rid for rid, _ in single]
+            assert [s for _, s in hits] == pytest.approx([s for _, s in single], rel=1e-5)
+
+
+def test_loader_ranking_mode():
+    recipes = _catalog(50, seed=3)
+    loader = RecipeLoader(recipes=recipes, ranking="bm25")
+    ranked = loader.index.ranker.rank(["saffron", "egg"], 3)
+    assert loader.find_by_ingredients(["saffron", "egg"], 3) == [recipes[rid] for rid, _ in ranked]
+    assert loader.find_by_ingredients_many([["saffron", "egg"]], 3) == [loader.find_by_ingredients(["saffron", "egg"], 3)]
+    with pytest.raises(ValueError):
+        RecipeLoader(recipes=recipes, ranking="tfidf")
@@ -0,0 +1,62 @@
+# per-client token buckets: burst, refill, batch cost and forgetting idle clients
+
+import pytest
+
+from model import ratelimit
+from model.ratelimit import ClientRateLimiter, RateLimitedError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_refill(clock):
+    limiter = ClientRateLimiter(rate_per_minute=60, burst=3)
+    for _ in range(3):
+        limiter.check("a")
+    with pytest.raises(RateLimitedError) as caught:
+        limiter.check("a")
+    assert caught.value.status_code == 429
+    assert caught.value.retry_after == pytest.approx(1.0)
+    # clients have their own buckets
+    limiter.check("b")
+    clock[0] += 1
+    limiter.check("a")
+    with pytest.raises(RateLimitedError):
+        limiter.check("a")
+    # refills stop at the burst
+    clock[0] += 600
+    for _ in range(3):
+        limiter.check("a")
+    with pytest.raises(RateLimitedError):
+        limiter.check("a")
+
+
+def test_batch_cost_is_capped_at_the_burst(clock):
+    limiter = ClientRateLimiter(rate_per_minute=60, burst=5)
+    # a batch bigger than the burst still gets in from a full bucket, it just drains it
+    limiter.check("a", cost=50)
+    with pytest.raises(RateLimitedError) as caught:
+        limiter.check("a", cost=50)
+    assert caught.value.retry_after == pytest.approx(5.0)
+
+
+def test_idle_clients_are_forgotten(clock):
+    limiter = ClientRateLimiter(rate_per_minute=60, burst=1, max_clients=2)
+    limiter.check("a")
+    limiter.check("b")
+    limiter.check("c")
+    # "a" was least recently seen and starts over with a full bucket
+    limiter.check("a")
+    with pytest.raises(RateLimitedError):
+        limiter.check("c")
+
+
+def test_zero_rate_disables_limiting(clock):
+    limiter = ClientRateLimiter(rate_per_minute=0, burst=1)
+    for _ in range(100):
+        limiter.check("a")
+
@@ -0,0 +1,122 @@
+# hot reload: deltas match a full rebuild, swaps drop stale caches, admin endpoints and file watching
+
+import asyncio
+import json
+import os
+import random
+
+import pytest
+
+from dataset import loader as loader_module
+from dataset.loader import RecipeIndex, RecipeLoader
+from model import prompt_builder
+from model.cache import ResponseCache
+
+httpx = pytest.importorskip("httpx")
+
+from api import main
+
+INGREDIENTS = ["egg", "eggs", "butter", "rice", "soy sauce", "bread", "milk", "saffron", "green beans"]
+
+
+def _catalog(n: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {"name": f"Recipe {i:03d}", "ingredients": rng.sample(INGREDIENTS, rng.randint(1, 4)), "instructions": "Cook."}
+        for i in range(n)
+    ]
+
+
+def _semantics(index: RecipeIndex) -> dict:
+    # term ids differ between a delta and a rebuild; what each term finds must not
+    names = [r["name"] for r in index.recipes]
+    return {
+        "recipes": list(index.recipes),
+        "postings": {term: sorted(names[rid] for rid in index.postings[tid]) for tid, term in enumerate(index.terms)},
+        "recipe_terms": [sorted(index.terms[tid] for tid in tids) for tids in index.recipe_terms],
+        "name_rank": list(index.name_rank),
+        "variants": {key: sorted(index.terms[tid] for tid in tids) for key, tids in index.variants.items()},
+        "fuzzy": sorted(zip(index.fuzzy.words, index.fuzzy.weights)),
+        "version": index.version,
+    }
+
+
+def test_with_changes_matches_a_full_rebuild():
+    rng = random.Random(1)
+    index = RecipeIndex(_catalog(60, seed=0))
+    for step in range(20):
+        names = [r["name"] for r in index.recipes]
+        remove = rng.sample(names, rng.randint(0, 5))
+        # some adds replace an existing recipe by name
+        add = [
+            {"name": rng.choice(names + [f"New {step}-{i}"]), "ingredients": rng.sample(INGREDIENTS, 2), "instructions": "Mix."}
+            for i in range(rng.randint(0, 4))
+        ]
+        add = list({r["name"]: r for r in add}.values())
+        if step == 10:
+            # drop every recipe with saffron, so the term itself has to go
+            remove = [r["name"] for r in index.recipes if "saffron" in r["ingredients"]]
+        index = index.with_changes(add, remove)
+        if step == 10:
+            assert "saffron" not in index.term_ids and "saffron" not in index.fuzzy.known
+        assert _semantics(index) == _semantics(RecipeIndex(list(index.recipes)))
+
+
+def test_reload_drops_caches_and_keeps_old_snapshot(make_engine, fake_client):
+    engine = make_engine(fake_client, cache=ResponseCache())
+    engine.suggest("egg")
+    old = engine.loader.index
+    assert engine.cache.stats()["entries"] == 1
+    index = engine.reload_catalog(add=[{"name": "Boiled Egg", "ingredients": ["egg"], "instructions": "Boil."}])
+    assert engine.loader.index is index and index.version != old.version
+    assert engine.cache.stats()["entries"] == 0
+    assert not prompt_builder._rendered._items
+    # a query that started on the old catalog still reads it consistently
+    assert "Boiled Egg" not in [r["name"] for r in old.recipes]
+    assert engine.loader.find_by_ingredients(["egg"], 10, index=old) == [old.recipes[0]]
+    # a delta that changes nothing keeps the cache
+    engine.suggest("egg")
+    engine.reload_catalog(remove=["No Such Recipe"])
+    assert engine.cache.stats()["entries"] == 1
+
+
+def test_watched_file_reloads(tmp_path, monkeypatch, make_engine):
+    source = tmp_path / "recipes.json"
+    source.write_text(json.dumps(_catalog(5, seed=2)), encoding="utf-8")
+    monkeypatch.setattr(loader_module, "_get_recipes_path", lambda: source)
+    engine = make_engine()
+    engine.loader = RecipeLoader(store_path=tmp_path / "recipes.bin")
+    assert len(engine.loader.recipes) == 5 and not engine.loader.is_stale()
+    source.write_text(json.dumps(_catalog(7, seed=2)), encoding="utf-8")
+    # make sure the mtime moves even on coarse filesystem clocks
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert engine.loader.is_stale()
+    assert len(engine.reload_catalog().recipes) == 7
+    assert not engine.loader.is_stale()
+
+
+def _post(path: str, token: str | None, payload: dict | None = None) -> httpx.Response:
+    async def post() -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.app)
+        headers = {"X-Admin-Token": token} if token else {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=payload, headers=headers)
+
+    return asyncio.run(post())
+
+
+def test_admin_delta_endpoint(monkeypatch, make_engine):
+    engine = make_engine()
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main.config, "ADMIN_TOKEN", "")
+    delta = {"add": [{"name": "Rice Bowl", "ingredients": ["rice"]}], "remove": ["Toast"]}
+    assert _post("/admin/recipes", "secret", delta).status_code == 404
+    monkeypatch.setattr(main.config, "ADMIN_TOKEN", "secret")
+    assert _post("/admin/recipes", "wrong", delta).status_code == 403
+    assert _post("/admin/recipes", None, delta).status_code == 403
+    response = _post("/admin/recipes", "secret", delta)
+    assert response.status_code == 200
+    assert response.json() == {"version": engine.loader.version, "recipes": 4}
+    assert [r["name"] for r in engine.loader.recipes][-1] == "Rice Bowl"
+    assert "Toast" not in [r["name"] for r in engine.loader.recipes]
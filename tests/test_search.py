@@ -0,0 +1,54 @@
+# /recipes/search: catalog version computed ahead of requests, paging through the API
+
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from api import main
+
+RECIPES = [
+    {"name": f"Recipe {i:02d}", "ingredients": ["egg", "salt"] + (["rice"] if i % 2 else []), "instructions": "Cook."}
+    for i in range(12)
+]
+
+
+def test_version_is_computed_before_requests(make_engine):
+    engine = make_engine(recipes=RECIPES)
+    engine.preload()
+    assert engine.loader.index._version is not None
+
+    swapped = []
+    swap = engine.loader.swap
+    engine.loader.swap = lambda index: swapped.append(index._version) or swap(index)
+    engine.reload_catalog(add=[{"name": "Rice Bowl", "ingredients": ["rice"], "instructions": "Steam."}])
+    # hashed while the old catalog was still serving, not by the first request after the swap
+    assert swapped[0] is not None
+
+
+def test_search_pages_through_the_api(monkeypatch, make_engine):
+    engine = make_engine(recipes=RECIPES)
+    engine.preload()
+    monkeypatch.setattr(main, "engine", engine)
+
+    async def pages() -> tuple[list[str], int]:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            query = "/recipes/search?ingredients=egg,rice&limit=5"
+            names: list[str] = []
+            response = await client.get(query)
+            etag = response.headers["etag"]
+            while True:
+                body = response.json()
+                names += [r["name"] for r in body["results"]]
+                if not body["next_cursor"]:
+                    break
+                response = await client.get(query + "&cursor=" + body["next_cursor"])
+            again = await client.get(query, headers={"If-None-Match": etag})
+            return names, again.status_code
+
+    names, status = asyncio.run(pages())
+    # both ingredients first, then egg only; ties by name
+    assert names == [f"Recipe {i:02d}" for i in range(1, 12, 2)] + [f"Recipe {i:02d}" for i in range(0, 12, 2)]
+    assert status == 304
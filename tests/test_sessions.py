@@ -0,0 +1,49 @@
+# session history trimming and the recipe context that goes with it
+
+from model.sessions import Session, SessionStore
+
+
+def test_append_turn_trims_oldest_follow_up_and_its_recipes():
+    session = Session("s")
+    session.messages.append({"role": "system", "content": "sys"})
+    session.recipe_names = {"first", "second", "third"}
+    session.append_turn("u1", "a1", max_turns=2, recipes={"first"})
+    session.append_turn("u2", "a2", max_turns=2, recipes={"second"})
+    session.append_turn("u3", "a3", max_turns=2, recipes={"third"})
+    assert [m["content"] for m in session.messages] == ["sys", "u1", "a1", "u3", "a3"]
+    assert session.turns == 2
+    # the first exchange keeps its recipes, the dropped follow-up loses them
+    assert session.recipe_names == {"first", "third"}
+    assert session.turn_recipes == [{"first"}, {"third"}]
+
+
+def test_trimmed_recipes_are_sent_again(make_engine, fake_client):
+    engine = make_engine(fake_client, sessions=SessionStore(max_turns=2))
+    session = engine.sessions.create()
+    engine.suggest("egg", session=session)
+    engine.suggest("rice", session=session)
+    assert "Fried Rice" in session.recipe_names
+    assert "More recipes that match" in fake_client.calls[-1][-1]["content"]
+    engine.suggest("bread", session=session)
+    # the rice turn was trimmed away, so Fried Rice is no longer in front of the model
+    assert "Fried Rice" not in session.recipe_names
+    assert not any("Fried Rice" in m["content"] for m in session.messages)
+    engine.suggest("rice", session=session)
+    assert "Fried Rice" in fake_client.calls[-1][-1]["content"]
+    assert "Fried Rice" in session.recipe_names
+
+
+def test_follow_ups_resend_the_history_byte_for_byte(make_engine, fake_client):
+    engine = make_engine(fake_client)
+    session = engine.sessions.create()
+    engine.suggest("egg", session=session)
+    engine.suggest("eggs", session=session)
+    engine.suggest("rice", session=session)
+    first, second, third = fake_client.calls
+    # each call extends the previous one plus its reply, so ollama can reuse the KV cache
+    assert second[:len(first)] == first
+    assert second[len(first)] == {"role": "assistant", "content": "reply 1"}
+    assert third[:len(second)] == second
+    # the omelette is already in the conversation, so the follow-up is the bare message
+    assert second[-1]["content"] == "eggs"
+    assert "Fried Rice" in third[-1]["content"]
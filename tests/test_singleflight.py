@@ -0,0 +1,127 @@
+# request coalescing: one call per key, results and errors fanned out to every waiter
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from model.singleflight import SingleFlight
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _share(flight: SingleFlight, fn, callers: int):
+    # the leader's fn blocks until every other caller has joined it
+    release = threading.Event()
+    calls = []
+
+    def leader_fn():
+        calls.append(1)
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            return flight.do("key", leader_fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(call) for _ in range(callers)]
+        _wait_for(lambda: flight.shared == callers - 1)
+        release.set()
+        results = [f.result() for f in futures]
+    return results, len(calls)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    results, calls = _share(flight, lambda: "reply", callers=5)
+    assert results == ["reply"] * 5 and calls == 1
+    assert flight.in_flight() == 0
+    # finished keys aren't remembered, the next caller runs again
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_error_fans_out_to_every_waiter():
+    flight = SingleFlight()
+
+    def fail():
+        raise ConnectionError("ollama down")
+
+    results, calls = _share(flight, fail, callers=4)
+    # each waiter gets the leader's exception
+    assert calls == 1
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert flight.in_flight() == 0
+    # the error isn't remembered either
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_stream_followers_replay_the_prefix():
+    flight = SingleFlight()
+    more = threading.Event()
+
+    def source(abandoned):
+        yield "a"
+        yield "b"
+        more.wait(5)
+        yield "c"
+
+    leader = flight.stream("key", source)
+    assert [next(leader), next(leader)] == ["a", "b"]
+    follower = flight.stream("key", source)
+    got = []
+    reader = threading.Thread(target=lambda: got.extend(follower))
+    reader.start()
+    _wait_for(lambda: flight.shared == 1)
+    more.set()
+    assert list(leader) == ["c"]
+    reader.join(5)
+    assert got == ["a", "b", "c"]
+    assert flight.shared == 1 and flight.in_flight() == 0
+
+
+def test_stream_error_reaches_followers_and_abandon_stops_source():
+    flight = SingleFlight()
+    fail = threading.Event()
+    seen = {}
+
+    def source(abandoned):
+        seen["abandoned"] = abandoned
+        yield "a"
+        fail.wait(5)
+        raise ConnectionError("stream broke")
+
+    leader = flight.stream("key", source)
+    assert next(leader) == "a"
+    follower = flight.stream("key", source)
+    errors = []
+
+    def read():
+        try:
+            list(follower)
+        except ConnectionError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    _wait_for(lambda: flight.shared == 1)
+    fail.set()
+    with pytest.raises(ConnectionError):
+        list(leader)
+    reader.join(5)
+    assert len(errors) == 1
+
+    # once every reader has left, the source is told to stop
+    lonely = flight.stream("other", source)
+    assert next(lonely) == "a"
+    lonely.close()
+    assert seen["abandoned"].is_set()
+    assert flight.in_flight() == 0
@@ -0,0 +1,89 @@
+# compiled recipe store: concurrent reads through the decode cache, deltas on a mapped catalog
+
+import sys
+import threading
+
+from dataset.loader import RecipeIndex, RecipeLoader
+from dataset.store import RecipeStore, compile_store, is_fresh, open_store
+
+
+def _recipes(n: int) -> list[dict]:
+    return [
+        {"name": f"Recipe {i}", "ingredients": [f"item{i % 7}", "salt"], "instructions": f"Step {i}."}
+        for i in range(n)
+    ]
+
+
+def test_store_round_trip(tmp_path):
+    recipes = _recipes(50)
+    index = open_store(compile_store(recipes, tmp_path / "recipes.bin"))
+    assert list(index.recipes) == recipes
+    assert index.recipes[-1] == recipes[-1]
+
+
+def test_store_matches_in_memory_index_and_tracks_its_source(tmp_path):
+    recipes = _recipes(30)
+    source = tmp_path / "recipes.json"
+    source.write_text("[]", encoding="utf-8")
+    path = compile_store(recipes, tmp_path / "recipes.bin", source=source)
+    index, built = open_store(path), RecipeIndex(recipes)
+    assert index.mapped and not built.mapped
+    assert list(index.terms) == list(built.terms)
+    assert [list(p) for p in index.postings] == [list(p) for p in built.postings]
+    assert list(index.name_rank) == list(built.name_rank)
+    assert index.version == built.version
+    assert index.score(["item2", "salt"]) == built.score(["item2", "salt"])
+    assert is_fresh(path, source)
+    # any change to recipes.json makes the store stale
+    source.write_text("[ ]", encoding="utf-8")
+    assert not is_fresh(path, source)
+    assert not is_fresh(tmp_path / "missing.bin", source)
+
+
+def test_concurrent_reads_with_eviction(tmp_path):
+    recipes = _recipes(200)
+    index = open_store(compile_store(recipes, tmp_path / "recipes.bin"))
+    store = index.recipes
+    assert isinstance(store, RecipeStore)
+    # a tiny cache so nearly every read evicts
+    store._cache_size = 8
+    errors: list[BaseException] = []
+
+    def read(offset: int) -> None:
+        try:
+            for n in range(3000):
+                i = (n * 7 + offset) % len(recipes)
+                assert store[i]["name"] == f"Recipe {i}"
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(k,)) for k in range(8)]
+    # switch threads as often as possible so the get/evict/move sequences interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
+    assert len(store._cache) <= 8
+
+
+def test_delta_on_store_stays_mapped(tmp_path):
+    recipes = _recipes(50)
+    store_path = tmp_path / "recipes.bin"
+    loader = RecipeLoader(recipes=[], store_path=store_path)
+    loader.swap(open_store(compile_store(recipes, store_path)))
+    added = {"name": "Recipe new", "ingredients": ["item3", "pepper"], "instructions": "Stir."}
+    index = loader.build_delta(add=[added], remove=["Recipe 0", "Recipe 7"])
+    assert index.mapped
+    assert isinstance(index.recipes, RecipeStore)
+    expected = [r for r in recipes if r["name"] not in ("Recipe 0", "Recipe 7")] + [added]
+    assert list(index.recipes) == expected
+    rebuilt = RecipeIndex(expected)
+    for query in (["item3"], ["salt", "pepper"], ["item0"]):
+        assert index.score(query) == rebuilt.score(query)
+    assert index.version == rebuilt.version
@@ -0,0 +1,76 @@
+# /chat/stream: a client that leaves before the body starts still stops its generation
+
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from api import main
+from api.schemas import ChatRequest
+
+
+async def _disconnected() -> dict:
+    return {"type": "http.disconnect"}
+
+
+async def _connected() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def _request(receive) -> Request:
+    return Request({"type": "http", "method": "POST", "headers": [], "client": ("10.0.0.1", 1234)}, receive)
+
+
+@pytest.fixture
+def streams(monkeypatch, make_engine, slow_client):
+    """Serve /chat/stream from an engine on the slow client; yields the token streams it hands out."""
+    engine = make_engine(slow_client)
+    handed_out = []
+    stream = engine.stream_recipe_async
+
+    async def recording(*args):
+        tokens = await stream(*args)
+        handed_out.append(tokens)
+        return tokens
+
+    monkeypatch.setattr(engine, "stream_recipe_async", recording)
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main.config, "API_KEY_PRIORITIES", {})
+    return engine, handed_out
+
+
+async def _slot_freed(engine, slow_client) -> None:
+    slow_client.release.set()
+    for _ in range(100):
+        if engine.limiter.running == 0:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("inference slot was never released")
+
+
+def test_disconnect_while_queued_cancels(streams, slow_client):
+    engine, handed_out = streams
+
+    async def scenario() -> None:
+        response = await main.chat_stream(ChatRequest(message="egg"), _request(_disconnected))
+        assert response.status_code == 499
+        assert handed_out[0]._cancel_event.is_set()
+        await _slot_freed(engine, slow_client)
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_before_body_cancels(streams, slow_client):
+    engine, handed_out = streams
+
+    async def send(message: dict) -> None:
+        await asyncio.sleep(0)
+
+    async def scenario() -> None:
+        response = await main.chat_stream(ChatRequest(message="egg"), _request(_connected))
+        # the disconnect wins before events() is ever iterated
+        await response({"type": "http"}, _disconnected, send)
+        assert handed_out[0]._cancel_event.is_set()
+        await _slot_freed(engine, slow_client)
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+# fine-tuning data path on CPU: packing, the padded/packed batch masks and the tokenization
+# cache key, with a toy word-level tokenizer
+
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("datasets")
+pytest.importorskip("peft")
+tokenizers = pytest.importorskip("tokenizers")
+transformers = pytest.importorskip("transformers")
+
+from datasets import Dataset
+
+from training import train
+from training.train import PaddingCollator, pack_examples
+
+
+def _tokenized(lengths: list[int]) -> Dataset:
+    # example i is the token id i + 1 repeated, labels masked on the first half
+    rows = {"input_ids": [], "labels": [], "length": []}
+    for i, n in enumerate(lengths):
+        ids = [i + 1] * n
+        rows["input_ids"].append(ids)
+        rows["labels"].append([-100] * (n // 2) + ids[n // 2:])
+        rows["length"].append(n)
+    return Dataset.from_dict(rows)
+
+
+def test_pack_examples_best_fit():
+    lengths = [7, 5, 4, 3, 3, 2, 1]
+    packed = pack_examples(_tokenized(lengths), max_length=8)
+    # longest first, each into the tightest bin that fits; the 2 finds only room 0 or 1 and opens a bin
+    assert packed["segment_lengths"] == [[7, 1], [5, 3], [4, 3], [2]]
+    assert all(n <= 8 for n in packed["length"])
+    assert sorted(n for seg in packed["segment_lengths"] for n in seg) == sorted(lengths)
+    for ids, labels, segments in zip(packed["input_ids"], packed["labels"], packed["segment_lengths"]):
+        assert len(ids) == len(labels) == sum(segments)
+        start = 0
+        for n in segments:
+            # each segment stays contiguous and its first token is never a target
+            assert len(set(ids[start:start + n])) == 1
+            assert labels[start] == -100
+            start += n
+
+
+def test_collator_pads_to_multiple_of_8():
+    collator = PaddingCollator(pad_token_id=0)
+    batch = collator([
+        {"input_ids": [5, 6, 7], "labels": [-100, 6, 7]},
+        {"input_ids": [5] * 9, "labels": [5] * 9},
+    ])
+    assert batch["input_ids"].shape == (2, 16)
+    assert batch["attention_mask"].tolist()[0] == [1] * 3 + [0] * 13
+    assert batch["labels"][0, 3:].eq(-100).all()
+    assert collator.real_tokens == 12 and collator.padded_tokens == 32
+
+
+def test_collator_packed_block_mask():
+    collator = PaddingCollator(pad_token_id=0, pad_to_multiple_of=8)
+    batch = collator([{"input_ids": [1, 1, 1, 2, 2], "labels": [-100, 1, 1, -100, 2], "segment_lengths": [3, 2]}])
+    mask = batch["attention_mask"]
+    assert mask.shape == (1, 1, 8, 8)
+    assert mask.dtype == torch.float32
+    assert batch["position_ids"].tolist() == [[0, 1, 2, 0, 1, 0, 0, 0]]
+    allowed = mask[0, 0] == 0
+    blocked = mask[0, 0] == torch.finfo(torch.float32).min
+    assert (allowed | blocked).all()
+    expected = torch.zeros(8, 8, dtype=torch.bool)
+    expected[:3, :3] = torch.ones(3, 3, dtype=torch.bool).tril()
+    expected[3:5, 3:5] = torch.ones(2, 2, dtype=torch.bool).tril()
+    # padding positions only see themselves
+    expected[5:, 5:] = torch.eye(3, dtype=torch.bool)
+    assert torch.equal(allowed, expected)
+
+
+WORDS = "<pad> <s> </s> <unk> i have egg rice salt recipe omelette fry".split()
+
+
+def toy_tokenizer(words: list[str] = WORDS):
+    model = tokenizers.models.WordLevel({w: i for i, w in enumerate(words)}, unk_token="<unk>")
+    tok = tokenizers.Tokenizer(model)
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    return transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tok, pad_token="<pad>", bos_token="<s>", eos_token="</s>", unk_token="<unk>"
+    )
+
+
+def _write_data(path, replies: list[str]) -> None:
+    path.write_text(
+        "".join(
+            json.dumps({"messages": [
+                {"role": "user", "content": "i have egg"},
+                {"role": "assistant", "content": reply},
+            ]}) + "\n"
+            for reply in replies
+        ),
+        encoding="utf-8",
+    )
+
+
+def test_cache_key_invalidation(tmp_path, monkeypatch):
+    data = tmp_path / "train.jsonl"
+    _write_data(data, ["recipe omelette", "fry egg"])
+    tok = toy_tokenizer()
+    key = train.tokenization_cache_key(data, tok, 64)
+    assert train.tokenization_cache_key(data, toy_tokenizer(), 64) == key
+
+    assert train.tokenization_cache_key(data, tok, 32) != key
+    # same name, different vocabulary
+    assert train.tokenization_cache_key(data, toy_tokenizer(WORDS + ["salt"]), 64) != key
+
+    _write_data(data, ["recipe omelette", "fry rice"])
+    changed = train.tokenization_cache_key(data, tok, 64)
+    assert changed != key
+
+    def format_prompt(messages):
+        return " ".join(m["content"] for m in messages)
+
+    monkeypatch.setattr(train, "format_prompt", format_prompt)
+    assert train.tokenization_cache_key(data, tok, 64) != changed
+
+
+def test_load_tokenized_reuses_cache(tmp_path):
+    data = tmp_path / "train.jsonl"
+    _write_data(data, ["recipe omelette", "fry egg"])
+    cache = tmp_path / "cache"
+    first = train.load_tokenized(data, toy_tokenizer(), 64, cache)
+    assert [p.name for p in cache.iterdir()] == [train.tokenization_cache_key(data, toy_tokenizer(), 64)]
+    second = train.load_tokenized(data, toy_tokenizer(), 64, cache)
+    assert second["input_ids"] == first["input_ids"]
+    assert second["labels"] == first["labels"]
+    train.load_tokenized(data, toy_tokenizer(), 16, cache)
+    assert len(list(cache.iterdir())) == 2
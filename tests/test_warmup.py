@@ -0,0 +1,80 @@
+# model warm-up and keep-alive: every host is loaded at startup, idle hosts are pinged
+
+import asyncio
+import threading
+
+from api import main
+from model.circuit import CLOSED, OPEN, CircuitBreaker
+from model.pool import BackendPool
+
+
+class RecordingClient:
+    """Records each chat call's arguments; raises while down, blocks while held."""
+
+    def __init__(self) -> None:
+        self.calls: list[dict] = []
+        self.down = False
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        self.hold.wait(5)
+        if self.down:
+            raise ConnectionError("connection refused")
+        self.calls.append({"model": model, "messages": messages, **kwargs})
+        return {"message": {"content": "Hi"}, "done": True}
+
+    def list(self):
+        return {"models": []}
+
+
+def _hosts(make_engine, n: int, **kwargs):
+    clients = {f"h{i}": RecordingClient() for i in range(n)}
+    pool = BackendPool(list(clients), client_factory=lambda url: clients[url])
+    return make_engine(pool=pool, keep_alive="30m", **kwargs), list(clients.values())
+
+
+def test_warm_up_loads_every_host(make_engine):
+    engine, (up, down) = _hosts(make_engine, 2, breaker=CircuitBreaker(failure_threshold=1))
+    engine.breaker.record_failure("refused")
+    assert engine.breaker.state == OPEN
+    down.down = True
+    assert engine.warm_up()
+    (call,) = up.calls
+    assert call["options"] == {"num_predict": 1} and call["keep_alive"] == "30m"
+    assert call["messages"][0]["role"] == "system"
+    # one host answering is enough to trust the backend again
+    assert engine.breaker.state == CLOSED
+    up.down = True
+    assert not engine.warm_up()
+
+
+def test_keep_warm_pings_only_healthy_hosts(make_engine):
+    engine, (first, second) = _hosts(make_engine, 2)
+    engine.pool.backends[1].ejected_until = float("inf")
+    assert engine.keep_warm() == 1
+    # an empty chat only reloads the model and resets its timer
+    assert first.calls == [{"model": engine.model_name, "messages": [], "keep_alive": "30m"}]
+    assert second.calls == []
+
+
+def test_not_ready_until_warm_up_finishes(monkeypatch):
+    client = RecordingClient()
+    client.hold.clear()
+    monkeypatch.setattr(main, "_build_pool", lambda: BackendPool([None], client_factory=lambda url: client))
+    monkeypatch.setattr(main.config, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(main.config, "KEEP_ALIVE_PING_INTERVAL", 0)
+    monkeypatch.setattr(main.config, "DATASET_WATCH_INTERVAL", 0)
+
+    async def serve() -> None:
+        async with main.lifespan(main.app):
+            await asyncio.sleep(0.05)
+            assert not main.ready.is_set()
+            client.hold.set()
+            await asyncio.wait_for(main.ready.wait(), 5)
+            assert client.calls and client.calls[0]["options"] == {"num_predict": 1}
+
+    try:
+        asyncio.run(serve())
+    finally:
+        client.hold.set()
@@ -1,33 +1,54 @@
 # LoRA fine-tune on recipe data (ingredients -> recipe text). Uses TinyLlama by default.
 
+import bisect
+import gzip
+import hashlib
+import inspect
 import json
+import os
+import shutil
 import sys
+import time
 from pathlib import Path
+from typing import Any
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from datasets import Dataset
+import torch
+from datasets import Dataset, load_from_disk
 from peft import LoraConfig, get_peft_model, TaskType
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
-    DataCollatorForSeq2Seq,
+    TrainerCallback,
     TrainingArguments,
     Trainer,
     BitsAndBytesConfig,
 )
 
 
+def _training_files(path: Path) -> list[Path]:
+    # a sharded output directory (or its manifest.json) lists its shards; anything else is one file
+    if path.is_dir():
+        path = path / "manifest.json"
+    if path.name == "manifest.json":
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        return [path.parent / shard["path"] for shard in manifest["shards"]]
+    return [path]
+
+
 def load_training_data(path: Path) -> list[dict]:
     data = []
-    with open(path, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            data.append(json.loads(line))
+    for file in _training_files(path):
+        opener = gzip.open if file.suffix == ".gz" else open
+        with opener(file, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                data.append(json.loads(line))
     return data
 
 
@@ -44,31 +65,241 @@ def format_prompt(messages: list[dict]) -> str:
 
 
 def tokenize(examples: dict, tokenizer, max_length: int) -> dict:
-    texts = []
-    for messages in examples["messages"]:
-        texts.append(format_prompt(messages))
+    # no padding here: the collator pads each batch to its own longest example
+    texts = [format_prompt(messages) for messages in examples["messages"]]
     out = tokenizer(
         texts,
         truncation=True,
         max_length=max_length,
-        padding="max_length",
         return_tensors=None,
     )
-    out["labels"] = [list(ids) for ids in out["input_ids"]]
-    # only train on assistant reply, mask the user part
-    for i in range(len(out["labels"])):
-        user_only = format_prompt(examples["messages"][i][:-1])
-        prompt_ids = tokenizer(
-            user_only,
-            return_tensors=None,
-            add_special_tokens=False,
-        )["input_ids"]
-        prompt_len = min(len(prompt_ids), len(out["labels"][i]))
-        for j in range(prompt_len):
-            out["labels"][i][j] = -100
+    # only train on assistant reply, mask the user part; prefixes go through the tokenizer in one call
+    # (with special tokens, so a leading BOS is masked along with the prompt)
+    prefixes = tokenizer(
+        [format_prompt(messages[:-1]) for messages in examples["messages"]],
+        return_tensors=None,
+    )["input_ids"]
+    out["labels"] = [
+        [-100] * min(len(prefix), len(ids)) + list(ids[len(prefix):])
+        for ids, prefix in zip(out["input_ids"], prefixes)
+    ]
+    out["length"] = [len(ids) for ids in out["input_ids"]]
     return out
 
 
+# bump when the cached columns change shape
+TOKENIZED_CACHE_FORMAT = 1
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tokenizer_fingerprint(tokenizer) -> str:
+    # the vocab/merges/normalizer themselves, so a changed tokenizer under the same name still misses
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        content = backend.to_str()
+    else:
+        content = json.dumps(sorted(tokenizer.get_vocab().items()))
+    special = json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str)
+    return hashlib.sha256(f"{type(tokenizer).__name__}\0{content}\0{special}".encode("utf-8")).hexdigest()
+
+
+def _source_digest(*fns) -> str:
+    digest = hashlib.sha256()
+    for fn in fns:
+        try:
+            digest.update(inspect.getsource(fn).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(fn.__code__.co_code)
+    return digest.hexdigest()
+
+
+def tokenization_cache_key(data_path: Path, tokenizer, max_length: int) -> str:
+    material = {
+        "format": TOKENIZED_CACHE_FORMAT,
+        # a manifest carries its shards' hashes, so hashing it covers them
+        "data": _file_digest(data_path / "manifest.json" if data_path.is_dir() else data_path),
+        "tokenizer": _tokenizer_fingerprint(tokenizer),
+        "tokenizer_name": getattr(tokenizer, "name_or_path", ""),
+        "revision": (getattr(tokenizer, "init_kwargs", None) or {}).get("revision") or "",
+        "max_length": max_length,
+        # the prompt template and label masking decide what the tokens are
+        "prompt": _source_digest(format_prompt, tokenize),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def load_tokenized(
+    data_path: Path, tokenizer, max_length: int, cache_dir: Path | None = None
+) -> Dataset:
+    """Tokenized dataset, memory-mapped from cache_dir when nothing it depends on has changed."""
+    path = None
+    if cache_dir is not None:
+        path = cache_dir / tokenization_cache_key(data_path, tokenizer, max_length)
+        if path.exists():
+            try:
+                tokenized = load_from_disk(str(path))
+                print(f"Loaded tokenized dataset from {path}")
+                return tokenized
+            except Exception as e:
+                print(f"Ignoring unreadable tokenization cache {path}: {e}")
+                shutil.rmtree(path, ignore_errors=True)
+
+    dataset = Dataset.from_list(load_training_data(data_path))
+
+    def tokenize_fn(examples):
+        return tokenize(examples, tokenizer, max_length)
+
+    tokenized = dataset.map(
+        tokenize_fn,
+        batched=True,
+        remove_columns=dataset.column_names,
+        desc="Tokenizing",
+    )
+    if path is not None:
+        # written next to the final name and renamed, so an interrupted run never leaves a half cache
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        tokenized.save_to_disk(str(tmp))
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # another run finished the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+        tokenized = load_from_disk(str(path))
+    return tokenized
+
+
+def pack_examples(tokenized: Dataset, max_length: int) -> Dataset:
+    """Concatenate short examples into sequences of up to max_length tokens (best fit, longest first)."""
+    lengths = tokenized["length"]
+    all_ids = tokenized["input_ids"]
+    all_labels = tokenized["labels"]
+    bins: list[list[int]] = []
+    # (free room, bin) kept sorted so the tightest bin that fits is a bisect away
+    room: list[tuple[int, int]] = []
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        n = lengths[i]
+        pos = bisect.bisect_left(room, (n, -1))
+        if pos < len(room):
+            free, b = room.pop(pos)
+            bins[b].append(i)
+        else:
+            free, b = max_length, len(bins)
+            bins.append([i])
+        bisect.insort(room, (free - n, b))
+    packed: dict[str, list] = {"input_ids": [], "labels": [], "segment_lengths": [], "length": []}
+    for members in bins:
+        input_ids: list[int] = []
+        labels: list[int] = []
+        for i in members:
+            input_ids.extend(all_ids[i])
+            # the first token of each segment has nothing of its own to predict from
+            labels.extend([-100] + list(all_labels[i][1:]))
+        packed["input_ids"].append(input_ids)
+        packed["labels"].append(labels)
+        packed["segment_lengths"].append([lengths[i] for i in members])
+        packed["length"].append(len(input_ids))
+    return Dataset.from_dict(packed)
+
+
+class PaddingCollator:
+    """Pads each batch to its longest sequence and counts real vs padded tokens for reporting.
+
+    Packed batches (with segment_lengths) get position ids that restart per example and a
+    block-diagonal causal mask, so packed examples can't attend to each other.
+    """
+
+    def __init__(
+        self, pad_token_id: int, pad_to_multiple_of: int | None = 8, mask_dtype: torch.dtype = torch.float32
+    ) -> None:
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.mask_dtype = mask_dtype
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features: list[dict[str, Any]]) -> dict[str, torch.Tensor]:
+        longest = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        batch = len(features)
+        input_ids = torch.full((batch, longest), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch, longest), -100, dtype=torch.long)
+        attention = torch.zeros((batch, longest), dtype=torch.long)
+        for row, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[row, :n] = torch.tensor(f["input_ids"], dtype=torch.long)
+            labels[row, :n] = torch.tensor(f["labels"], dtype=torch.long)
+            attention[row, :n] = 1
+            self.real_tokens += n
+        self.padded_tokens += batch * longest
+        out = {"input_ids": input_ids, "labels": labels, "attention_mask": attention}
+        if "segment_lengths" in features[0]:
+            out.update(self._packed_masks(features, longest))
+        return out
+
+    def _packed_masks(self, features: list[dict[str, Any]], longest: int) -> dict[str, torch.Tensor]:
+        batch = len(features)
+        position_ids = torch.zeros((batch, longest), dtype=torch.long)
+        allowed = torch.zeros((batch, 1, longest, longest), dtype=torch.bool)
+        causal = torch.ones((longest, longest), dtype=torch.bool).tril()
+        for row, f in enumerate(features):
+            start = 0
+            for n in f["segment_lengths"]:
+                end = start + n
+                position_ids[row, start:end] = torch.arange(n)
+                allowed[row, 0, start:end, start:end] = causal[:n, :n]
+                start = end
+            # padding rows still attend to themselves so softmax never sees an all-masked row
+            idx = torch.arange(start, longest)
+            allowed[row, 0, idx, idx] = True
+        # transformers takes custom 4D masks in additive form: 0 to attend, dtype min to block
+        mask = torch.zeros(allowed.shape, dtype=self.mask_dtype)
+        mask.masked_fill_(~allowed, torch.finfo(self.mask_dtype).min)
+        return {"position_ids": position_ids, "attention_mask": mask}
+
+    def reset(self) -> None:
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    @property
+    def padding_ratio(self) -> float:
+        return 1 - self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0
+
+
+class ThroughputCallback(TrainerCallback):
+    """Adds tokens/sec and padding ratio to the training logs."""
+
+    def __init__(self, collator: PaddingCollator) -> None:
+        self.collator = collator
+        self.started = 0.0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.collator.reset()
+        self.started = time.perf_counter()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        elapsed = time.perf_counter() - self.started
+        if logs is not None and elapsed > 0:
+            logs["tokens_per_sec"] = round(self.collator.real_tokens / elapsed, 1)
+            logs["padding_ratio"] = round(self.collator.padding_ratio, 4)
+
+    def on_train_end(self, args, state, control, **kwargs):
+        elapsed = time.perf_counter() - self.started
+        if elapsed > 0:
+            print(
+                f"Trained on {self.collator.real_tokens} tokens in {elapsed:.1f}s "
+                f"({self.collator.real_tokens / elapsed:.1f} tokens/sec, "
+                f"padding ratio {self.collator.padding_ratio:.1%})"
+            )
+
+
 def main(
     model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
     training_data_path: Path | None = None,
@@ -77,6 +308,10 @@ def main(
     batch_size: int = 2,
     max_length: int = 512,
     use_4bit: bool = True,
+    packing: bool = False,
+    group_by_length: bool = True,
+    max_steps: int = -1,
+    cache_dir: Path | None = PROJECT_ROOT / ".cache" / "tokenized",
 ) -> None:
     if training_data_path is None:
         training_data_path = PROJECT_ROOT / "dataset" / "training_data.jsonl"
@@ -86,25 +321,18 @@ def main(
             "Run: python -m dataset.prepare_training_data"
         )
 
-    raw = load_training_data(training_data_path)
-    dataset = Dataset.from_list(raw)
-
     tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
-    def tokenize_fn(examples):
-        return tokenize(examples, tokenizer, max_length)
-
-    tokenized = dataset.map(
-        tokenize_fn,
-        batched=True,
-        remove_columns=dataset.column_names,
-        desc="Tokenizing",
-    )
+    tokenized = load_tokenized(training_data_path, tokenizer, max_length, cache_dir)
+    if packing:
+        tokenized = pack_examples(tokenized, max_length)
 
+    # no GPU: full precision, no 4-bit (bitsandbytes needs CUDA), so a tiny model trains on CPU
+    use_cuda = torch.cuda.is_available()
     load_kwargs = {}
-    if use_4bit:
+    if use_4bit and use_cuda:
         load_kwargs["quantization_config"] = BitsAndBytesConfig(
             load_in_4bit=True,
             bnb_4bit_compute_dtype="float16",
@@ -130,24 +358,35 @@ def main(
     out_path = PROJECT_ROOT / output_dir
     out_path.mkdir(parents=True, exist_ok=True)
 
+    sampling: dict[str, Any] = {}
+    # batches of similar length need little padding; packed rows are already near max_length
+    if group_by_length and not packing:
+        # transformers 5 replaced the group_by_length flag with train_sampling_strategy
+        if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+            sampling["train_sampling_strategy"] = "group_by_length"
+        else:
+            sampling["group_by_length"] = True
+
     training_args = TrainingArguments(
         output_dir=str(out_path),
         num_train_epochs=num_epochs,
+        max_steps=max_steps,
         per_device_train_batch_size=batch_size,
         gradient_accumulation_steps=4,
         learning_rate=2e-5,
-        fp16=True,
+        fp16=use_cuda,
+        use_cpu=not use_cuda,
         logging_steps=5,
         save_strategy="epoch",
         save_total_limit=1,
         remove_unused_columns=False,
+        **sampling,
     )
 
-    data_collator = DataCollatorForSeq2Seq(
-        tokenizer=tokenizer,
-        model=model,
-        padding=True,
-        label_pad_token_id=-100,
+    # the packed-sequence mask is added to attention scores, so it has to match the compute dtype
+    data_collator = PaddingCollator(
+        tokenizer.pad_token_id,
+        mask_dtype=torch.float16 if use_cuda else torch.float32,
     )
 
     trainer = Trainer(
@@ -155,6 +394,7 @@ def main(
         args=training_args,
         train_dataset=tokenized,
         data_collator=data_collator,
+        callbacks=[ThroughputCallback(data_collator)],
     )
     trainer.train()
     trainer.save_model(str(out_path))
@@ -165,12 +405,17 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Fine-tune recipe model")
     parser.add_argument("--model", default="TinyLlama/TinyLlama-1.1B-Chat-v1.0", help="Base model")
-    parser.add_argument("--data", default=None, help="Path to training_data.jsonl")
+    parser.add_argument("--data", default=None, help="training_data.jsonl, or a sharded output dir / manifest.json")
     parser.add_argument("--output", default="recipe_model", help="Output dir")
     parser.add_argument("--epochs", type=int, default=3)
     parser.add_argument("--batch-size", type=int, default=2)
     parser.add_argument("--max-length", type=int, default=512)
     parser.add_argument("--no-4bit", action="store_true", help="No 4bit quant (needs more VRAM)")
+    parser.add_argument("--packing", action="store_true", help="Pack several short examples per sequence")
+    parser.add_argument("--no-group-by-length", action="store_true", help="Shuffle without length grouping")
+    parser.add_argument("--max-steps", type=int, default=-1, help="Stop after this many steps (quick CPU checks)")
+    parser.add_argument("--cache-dir", default=str(PROJECT_ROOT / ".cache" / "tokenized"), help="Tokenized dataset cache")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-tokenize")
     args = parser.parse_args()
     main(
         model_name=args.model,
@@ -180,4 +425,8 @@ if __name__ == "__main__":
         batch_size=args.batch_size,
         max_length=args.max_length,
         use_4bit=not args.no_4bit,
+        packing=args.packing,
+        group_by_length=not args.no_group_by_length,
+        max_steps=args.max_steps,
+        cache_dir=None if args.no_cache else Path(args.cache_dir),
     )